@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Convert and package many apps in one run on a process pool.
+
+Usage:
+    python batch_package.py traces/ --output-root D:\\Portables
+    python batch_package.py batch.json --output-root D:\\Portables --workers 8 --per-volume 2
+
+The input is either a directory (every *.xml trace is converted, every *.json
+config is packaged as is) or a batch manifest:
+
+    {"apps": [
+        {"xml": "traces/app1.xml", "app_name": "App1"},
+        {"procmon": "logs/app2.csv", "process": ["setup.exe"]},
+        {"config": "configs/app3.json", "output": "E:\\\\Portables\\\\App3"}
+    ]}
+
+Relative paths are resolved against the manifest's folder. Conversions are
+CPU-bound and start as soon as a process is free; a package only starts when
+every volume it reads from or writes to has fewer than --per-volume packages
+running, so several disks are kept busy without thrashing any one of them.
+Each app logs to <output-root>/logs/<app>.log; a failure is recorded in the
+report and does not stop the other apps. The consolidated report is written
+to <output-root>/batch_report.json.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Set, Tuple
+
+import package_events
+import portable_packager
+import procmon_to_config
+import trace_xml_to_config
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_PER_VOLUME = 2
+# Each package copies with its own thread pool; keep it modest since several packages run at once.
+DEFAULT_BATCH_COPY_WORKERS = 8
+REPORT_NAME = "batch_report.json"
+
+
+def load_batch(source: Path) -> List[Dict[str, Any]]:
+    """Return batch items ({"xml"|"procmon"|"config": Path, ...}) from a directory or manifest."""
+    if source.is_dir():
+        items: List[Dict[str, Any]] = []
+        for path in sorted(source.iterdir()):
+            suffix = path.suffix.lower()
+            if suffix == ".xml":
+                items.append({"xml": path})
+            elif suffix == ".json":
+                items.append({"config": path})
+        return items
+    with source.open("r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    entries = manifest["apps"] if isinstance(manifest, dict) else manifest
+    items = []
+    for entry in entries:
+        item = dict(entry)
+        for key in ("xml", "procmon", "config", "output"):
+            if key in item:
+                item[key] = (source.parent / os.path.expandvars(item[key])).resolve()
+        if not any(key in item for key in ("xml", "procmon", "config")):
+            raise ValueError(f"Batch entry needs 'xml', 'procmon' or 'config': {entry}")
+        items.append(item)
+    return items
+
+
+def assign_names(items: List[Dict[str, Any]]) -> None:
+    """Give every item a unique, filesystem-safe name (app_name, else the input file stem)."""
+    seen: Counter[str] = Counter()
+    for item in items:
+        source = item.get("config") or item.get("xml") or item.get("procmon")
+        base = portable_packager.sanitize_name(item.get("app_name") or Path(source).stem)
+        seen[base] += 1
+        item["name"] = base if seen[base] == 1 else f"{base}_{seen[base]}"
+
+
+def volume_key(path: Path) -> str:
+    """Identify the volume holding ``path``: drive or UNC share on Windows, device number elsewhere."""
+    drive = os.path.splitdrive(str(path))[0]
+    if drive:
+        return drive.upper()
+    probe = path
+    while not probe.exists() and probe != probe.parent:
+        probe = probe.parent
+    try:
+        return f"dev{probe.stat().st_dev}"
+    except OSError:
+        return str(probe)
+
+
+def package_volumes(config_path: Path, output_dir: Path) -> Set[str]:
+    """Volumes a package reads from (directories, files, shortcuts) or writes to."""
+    volumes = {volume_key(output_dir)}
+    try:
+        config = portable_packager.load_config(config_path)
+    except (OSError, ValueError):
+        return volumes
+    sources = [entry["path"] for entry in config.get("directories", []) if "path" in entry]
+    sources += config.get("files", []) + config.get("shortcuts", [])
+    for source in sources:
+        volumes.add(volume_key(portable_packager.expand_path(source)))
+    return volumes
+
+
+def run_convert(item: Dict[str, Any], config_path: Path, log_path: Path) -> Dict[str, Any]:
+    """Worker: turn a trace or ProcMon log into a config JSON."""
+    result: Dict[str, Any] = {"app": item["name"], "stage": "convert", "config": str(config_path), "log": str(log_path)}
+    started = time.perf_counter()
+    with log_path.open("w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            if "procmon" in item:
+                config = procmon_to_config.build_procmon_config(
+                    item["procmon"], item.get("app_name"), processes=item.get("process"), pids=item.get("pid")
+                )
+            else:
+                config = trace_xml_to_config.build_config(item["xml"], item.get("app_name"))
+            config_path.parent.mkdir(parents=True, exist_ok=True)
+            with config_path.open("w", encoding="utf-8") as handle:
+                json.dump(config, handle, indent=2)
+            result["status"] = "ok"
+        except Exception as exc:  # reported, never raised: one bad trace must not stop the batch
+            traceback.print_exc()
+            result.update(status="failed", error=str(exc))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_package(config_path: Path, output_dir: Path, log_path: Path, name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker: run portable_packager.main for one app, logging to ``log_path``."""
+    result: Dict[str, Any] = {"app": name, "stage": "package", "output": str(output_dir), "log": str(log_path)}
+    events = package_events.EventBus()
+    started = time.perf_counter()
+    with log_path.open("a", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            portable_packager.main(config_path, output_dir, events=events, **options)
+            result["status"] = "ok"
+        except Exception as exc:  # reported, never raised: one bad app must not stop the batch
+            traceback.print_exc()
+            result.update(status="failed", error=str(exc))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    result["stages"] = events.timings
+    manifest_path = output_dir / "manifest.json"
+    if result["status"] == "ok" and manifest_path.exists():
+        with manifest_path.open("r", encoding="utf-8") as handle:
+            files = json.load(handle).get("files", {})
+        result["files"] = len(files)
+        result["bytes"] = sum(entry.get("size", 0) for entry in files.values())
+    return result
+
+
+class BatchScheduler:
+    """Feed conversions and packages to a process pool, honouring per-volume limits for packages."""
+
+    def __init__(self, output_root: Path, workers: int, per_volume: int, options: Dict[str, Any]) -> None:
+        self.output_root = output_root
+        self.workers = max(1, workers)
+        self.per_volume = max(1, per_volume)
+        self.options = options
+        self.results: List[Dict[str, Any]] = []
+        self._conversions: Deque[Dict[str, Any]] = deque()
+        self._packages: Deque[Tuple[Dict[str, Any], Set[str]]] = deque()
+        self._busy: Counter[str] = Counter()
+        self._running: Dict[Future[Dict[str, Any]], Tuple[Dict[str, Any], Set[str]]] = {}
+
+    def _paths(self, item: Dict[str, Any]) -> Tuple[Path, Path, Path]:
+        name = item["name"]
+        config_path = item.get("config") or self.output_root / "configs" / f"{name}.json"
+        output_dir = item.get("output") or self.output_root / name
+        return Path(config_path), Path(output_dir), self.output_root / "logs" / f"{name}.log"
+
+    def _queue_package(self, item: Dict[str, Any]) -> None:
+        config_path, output_dir, _log = self._paths(item)
+        self._packages.append((item, package_volumes(config_path, output_dir)))
+
+    def _start_next(self, pool: ProcessPoolExecutor) -> bool:
+        for _ in range(len(self._packages)):
+            item, volumes = self._packages.popleft()
+            if all(self._busy[volume] < self.per_volume for volume in volumes):
+                config_path, output_dir, log_path = self._paths(item)
+                future = pool.submit(run_package, config_path, output_dir, log_path, item["name"], self.options)
+                self._busy.update(volumes)
+                self._running[future] = (item, volumes)
+                return True
+            self._packages.append((item, volumes))
+        if self._conversions:
+            item = self._conversions.popleft()
+            config_path, _output, log_path = self._paths(item)
+            self._running[pool.submit(run_convert, item, config_path, log_path)] = (item, set())
+            return True
+        return False
+
+    def run(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        (self.output_root / "logs").mkdir(parents=True, exist_ok=True)
+        for item in items:
+            if "config" in item:
+                self._queue_package(item)
+            else:
+                self._conversions.append(item)
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            while self._conversions or self._packages or self._running:
+                while len(self._running) < self.workers and self._start_next(pool):
+                    pass
+                done, _pending = wait(self._running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    item, volumes = self._running.pop(future)
+                    self._busy.subtract(volumes)
+                    broken |= not self._collect(item, future)
+                if broken:
+                    # A crashed worker takes the pool down; what was running on it fails, the rest carries on.
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=self.workers)
+        finally:
+            pool.shutdown()
+        return self.results
+
+    def _collect(self, item: Dict[str, Any], future: Future[Dict[str, Any]]) -> bool:
+        """Record a finished task. Returns False when its worker process died."""
+        alive = True
+        try:
+            result = future.result()
+        except Exception as exc:  # the worker itself died or its result could not be sent back
+            alive = not isinstance(exc, BrokenProcessPool)
+            result = {"app": item["name"], "stage": "worker", "status": "failed", "error": str(exc) or repr(exc)}
+        self.results.append(result)
+        label = "ok" if result["status"] == "ok" else f"FAILED: {result.get('error')}"
+        print(f"[batch] {result['app']} {result['stage']}: {label} ({result.get('seconds', 0):.1f}s)")
+        if result["stage"] == "convert" and result["status"] == "ok":
+            self._queue_package(item)
+        return alive
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Fold per-stage results into one row per app plus batch totals."""
+    apps: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        app = apps.setdefault(result["app"], {"app": result["app"], "status": "ok", "seconds": 0.0})
+        app["seconds"] = round(app["seconds"] + result.get("seconds", 0.0), 3)
+        app[result["stage"]] = result
+        if result["status"] != "ok":
+            app["status"] = "failed"
+            app["error"] = f"{result['stage']}: {result.get('error')}"
+        for key in ("files", "bytes", "output"):
+            if key in result:
+                app[key] = result[key]
+    rows = sorted(apps.values(), key=lambda row: row["app"])
+    busy = sum(row["seconds"] for row in rows)
+    return {
+        "apps": rows,
+        "totals": {
+            "apps": len(rows),
+            "ok": sum(1 for row in rows if row["status"] == "ok"),
+            "failed": sum(1 for row in rows if row["status"] != "ok"),
+            "files": sum(row.get("files", 0) for row in rows),
+            "bytes": sum(row.get("bytes", 0) for row in rows),
+            "wall_seconds": round(wall_seconds, 3),
+            "busy_seconds": round(busy, 3),
+            "speedup": round(busy / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        },
+    }
+
+
+def print_summary(report: Dict[str, Any]) -> None:
+    print(f"{'app':<32} {'status':<8} {'seconds':>9} {'files':>9} {'MiB':>10}")
+    for row in report["apps"]:
+        mib = row.get("bytes", 0) / 1048576
+        print(f"{row['app']:<32} {row['status']:<8} {row['seconds']:>9.1f} {row.get('files', 0):>9} {mib:>10.1f}")
+        if row["status"] != "ok":
+            print(f"    {' '.join(row['error'].split())}")
+    totals = report["totals"]
+    print(
+        f"[batch] {totals['ok']}/{totals['apps']} apps ok, {totals['files']} files, "
+        f"{totals['bytes'] / 1048576:.1f} MiB in {totals['wall_seconds']:.1f}s "
+        f"({totals['busy_seconds']:.1f}s of work, {totals['speedup']:.1f}x parallel)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert and package many apps on a process pool.")
+    parser.add_argument("source", type=Path, help="Folder of *.xml traces / *.json configs, or a batch manifest JSON.")
+    parser.add_argument("--output-root", type=Path, required=True, help="Folder receiving one package per app.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Processes (default: {DEFAULT_WORKERS}).")
+    parser.add_argument(
+        "--per-volume",
+        type=int,
+        default=DEFAULT_PER_VOLUME,
+        help=f"Packages allowed to use the same disk at once (default: {DEFAULT_PER_VOLUME}).",
+    )
+    parser.add_argument(
+        "--copy-workers",
+        type=int,
+        default=DEFAULT_BATCH_COPY_WORKERS,
+        help=f"Copy threads inside each package (default: {DEFAULT_BATCH_COPY_WORKERS}).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Convert traces and plan packages without copying.")
+    parser.add_argument("--incremental", action="store_true", help="Update packages that already exist.")
+    parser.add_argument("--link-mode", choices=portable_packager.LINK_MODES, default="copy", help="See portable_packager.py.")
+    parser.add_argument("--blob-store", type=Path, help="Shared content-addressed store for all packages.")
+    parser.add_argument("--catalog", type=Path, help="SQLite catalog every finished package is recorded in.")
+    parser.add_argument("--report", type=Path, help=f"Report path (default: <output-root>/{REPORT_NAME}).")
+    args = parser.parse_args()
+
+    try:
+        items = load_batch(args.source)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    if not items:
+        print(f"[error] Nothing to do in {args.source}", file=sys.stderr)
+        sys.exit(1)
+    assign_names(items)
+    output_root = args.output_root.resolve()
+    options = {
+        "dry_run": args.dry_run,
+        "incremental": args.incremental,
+        "copy_workers": args.copy_workers,
+        "link_mode": args.link_mode,
+        "blob_store_dir": args.blob_store,
+        "catalog_path": args.catalog.resolve() if args.catalog else None,
+    }
+    print(f"[batch] {len(items)} apps, {args.workers} processes, {args.per_volume} packages per volume")
+    started = time.perf_counter()
+    results = BatchScheduler(output_root, args.workers, args.per_volume, options).run(items)
+    report = summarize(results, time.perf_counter() - started)
+    report_path = args.report or output_root / REPORT_NAME
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with report_path.open("w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, default=str)
+    print_summary(report)
+    print(f"[done] Wrote {report_path}")
+    if report["totals"]["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
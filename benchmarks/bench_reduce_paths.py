@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark path reduction and directory/file classification in trace_xml_to_config.
+
+Generates synthetic traced file paths (spread over Program Files, AppData and
+ProgramData, plus loose files outside known roots) and times reduce_paths and
+pick_directories_and_files at increasing sizes. The previous quadratic
+reduction is timed too, up to --legacy-max paths, for comparison.
+
+Usage:
+    python benchmarks/bench_reduce_paths.py --sizes 1000 10000 100000 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import trace_xml_to_config  # noqa: E402
+
+ROOTS = [
+    "C:\\Program Files\\Vendor{vendor}\\App{app}",
+    "C:\\Users\\User\\AppData\\Local\\Vendor{vendor}\\App{app}",
+    "C:\\ProgramData\\Vendor{vendor}\\App{app}",
+    "C:\\Windows\\System32\\Vendor{vendor}",
+]
+
+
+def synthetic_paths(count: int, seed: int = 1) -> List[str]:
+    """Return ``count`` distinct file paths, ~40 per directory, 1-4 directory levels below a root."""
+    rng = random.Random(seed)
+    paths: List[str] = []
+    directories = max(1, count // 40)
+    for index in range(count):
+        directory = index % directories
+        root = ROOTS[directory % len(ROOTS)].format(vendor=directory % 97, app=directory)
+        depth = 1 + directory % 4
+        sub = "\\".join(f"dir{(directory >> level) % 13}" for level in range(depth))
+        name = f"file{index}.{rng.choice(('dll', 'pak', 'dat', 'json'))}"
+        paths.append(f"{root}\\{sub}\\{name}")
+    return paths
+
+
+def legacy_reduce_paths(paths: Iterable[str]) -> List[str]:
+    """The original O(n^2) reduction, kept here only as a baseline."""
+    result: List[str] = []
+    for path in sorted(set(paths), key=lambda p: (len(p), p)):
+        if not any(trace_xml_to_config.is_subpath(path, existing) for existing in result):
+            result.append(path)
+    return result
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark trace_xml_to_config path reduction.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="Largest size to time the quadratic baseline at.")
+    args = parser.parse_args()
+
+    print(f"{'paths':>10} {'reduce (s)':>11} {'classify (s)':>13} {'paths/s':>12} {'legacy (s)':>11}")
+    for size in args.sizes:
+        paths = synthetic_paths(size)
+        reduce_time = timed(trace_xml_to_config.reduce_paths, paths)
+        classify_time = timed(trace_xml_to_config.pick_directories_and_files, paths)
+        legacy = f"{timed(legacy_reduce_paths, paths):11.3f}" if size <= args.legacy_max else f"{'-':>11}"
+        rate = size / classify_time if classify_time else float("inf")
+        print(f"{size:>10} {reduce_time:11.3f} {classify_time:13.3f} {rate:12,.0f} {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite and compare against a saved baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scale small --output results.json
+    python benchmarks/run_benchmarks.py --scale small --baseline results.json --threshold 0.25
+    python benchmarks/run_benchmarks.py --only copy_tree hash_tree --threshold-for copy_tree=0.4
+
+Inputs come from benchmarks/synthetic.py (same seed, same data), so results are
+comparable between commits on the same machine. Each benchmark runs --repeat
+times and reports the median. A benchmark regresses when its rate falls more
+than its threshold below the baseline's; any regression exits with status 2.
+Copies and hashes read from the page cache after the first run, so they
+measure the CPU side of the pipeline rather than the disk.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent))
+
+import package_verify  # noqa: E402
+import portable_packager  # noqa: E402
+import trace_xml_to_config  # noqa: E402
+from bench_reduce_paths import synthetic_paths  # noqa: E402
+from synthetic import synthetic_trace_xml, synthetic_tree  # noqa: E402
+
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"files": 2000, "mean_size": 32 * 1024, "xml_elements": 50000, "paths": 50000},
+    "medium": {"files": 20000, "mean_size": 64 * 1024, "xml_elements": 500000, "paths": 500000},
+    "large": {"files": 100000, "mean_size": 128 * 1024, "xml_elements": 2000000, "paths": 2000000},
+}
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 3
+WORKERS = portable_packager.DEFAULT_COPY_WORKERS
+
+# name -> (unit, function(context) -> (seconds, amount in unit numerator))
+Benchmark = Callable[[Dict[str, Any]], Tuple[float, float]]
+
+
+def _timed(func: Callable[[], Any]) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        result = func()
+    return time.perf_counter() - started, result
+
+
+def bench_xml_stream(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    seconds, (_sets, count) = _timed(lambda: trace_xml_to_config.stream_paths(ctx["xml"]))
+    return seconds, count
+
+
+def bench_xml_convert(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    seconds, _config = _timed(lambda: trace_xml_to_config.build_config(ctx["xml"], "Bench"))
+    return seconds, ctx["scale"]["xml_elements"]
+
+
+def bench_reduce_paths(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    paths = ctx.setdefault("paths", synthetic_paths(ctx["scale"]["paths"]))
+    seconds, _reduced = _timed(lambda: trace_xml_to_config.reduce_paths(paths))
+    return seconds, len(paths)
+
+
+def bench_copy_tree(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    destination = ctx["work"] / "copy"
+    shutil.rmtree(destination, ignore_errors=True)
+    seconds, stats = _timed(lambda: portable_packager.copy_tree_parallel(ctx["tree"], destination, workers=WORKERS))
+    return seconds, stats["bytes"] / 1048576
+
+
+def bench_hash_tree(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    index = portable_packager.PackageIndex(ctx["tree"])
+    seconds, _count = _timed(lambda: portable_packager.index_tree(ctx["tree"], index, workers=WORKERS))
+    return seconds, ctx["tree_stats"]["bytes"] / 1048576
+
+
+def _package(ctx: Dict[str, Any]) -> Path:
+    """A packaged copy of the synthetic tree (built once, reused by manifest/verify)."""
+    if "package" not in ctx:
+        package = ctx["work"] / "package"
+        shutil.rmtree(package, ignore_errors=True)
+        config = ctx["work"] / "bench_config.json"
+        config.write_text(json.dumps({"app_name": "Bench", "directories": [{"path": str(ctx["tree"]), "target": "Bench"}]}))
+        with redirect_stdout(StringIO()):
+            portable_packager.main(config, package, copy_workers=WORKERS)
+        ctx["package"] = package
+    return ctx["package"]
+
+
+def bench_manifest(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    package = _package(ctx)
+    with (package / "manifest.json").open("r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    target = ctx["work"] / "manifest_out"
+    target.mkdir(exist_ok=True)
+    index = portable_packager.PackageIndex(target)
+    index.entries = dict(manifest["files"])
+    seconds, _ = _timed(lambda: portable_packager.create_manifest(target, manifest["payload"], False, index=index))
+    return seconds, len(index.entries)
+
+
+def bench_verify(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    package = _package(ctx)
+    seconds, report = _timed(lambda: package_verify.verify_package(package, workers=WORKERS))
+    if report["missing"] or report["corrupt"]:
+        raise RuntimeError(f"verify benchmark found problems: {report}")
+    return seconds, report["bytes"] / 1048576
+
+
+BENCHMARKS: Dict[str, Tuple[str, Benchmark]] = {
+    "xml_stream": ("elements/s", bench_xml_stream),
+    "xml_convert": ("elements/s", bench_xml_convert),
+    "reduce_paths": ("paths/s", bench_reduce_paths),
+    "copy_tree": ("MiB/s", bench_copy_tree),
+    "hash_tree": ("MiB/s", bench_hash_tree),
+    "manifest": ("entries/s", bench_manifest),
+    "verify": ("MiB/s", bench_verify),
+}
+
+
+def prepare(work: Path, scale_name: str, names: List[str]) -> Dict[str, Any]:
+    scale = SCALES[scale_name]
+    ctx: Dict[str, Any] = {"work": work, "scale": scale}
+    if any(name.startswith("xml") for name in names):
+        ctx["xml"] = work / f"traced_{scale['xml_elements']}.xml"
+        if not ctx["xml"].exists():
+            synthetic_trace_xml(ctx["xml"], scale["xml_elements"])
+    if any(name in ("copy_tree", "hash_tree", "manifest", "verify") for name in names):
+        ctx["tree"] = work / f"tree_{scale_name}"
+        stats_path = work / f"tree_{scale_name}.json"
+        if stats_path.exists():
+            ctx["tree_stats"] = json.loads(stats_path.read_text())
+        else:
+            shutil.rmtree(ctx["tree"], ignore_errors=True)
+            ctx["tree_stats"] = synthetic_tree(ctx["tree"], scale["files"], mean_size=scale["mean_size"], duplicates=0.1)
+            stats_path.write_text(json.dumps(ctx["tree_stats"]))
+    return ctx
+
+
+def run_suite(ctx: Dict[str, Any], names: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in names:
+        unit, bench = BENCHMARKS[name]
+        runs = [bench(ctx) for _ in range(max(1, repeat))]
+        seconds = statistics.median(run[0] for run in runs)
+        amount = runs[0][1]
+        rate = amount / seconds if seconds > 0 else 0.0
+        results[name] = {"seconds": round(seconds, 6), "runs": [round(run[0], 6) for run in runs], "rate": rate, "unit": unit}
+        print(f"[bench] {name:<14} {seconds:>9.3f}s  {rate:>14,.1f} {unit}")
+    return results
+
+
+def environment(scale: str, repeat: int) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "repeat": repeat,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+    overrides: Dict[str, float],
+) -> List[str]:
+    """Print rate changes against ``baseline`` and return the names that regressed."""
+    regressions: List[str] = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("rate"):
+            print(f"[compare] {name:<14} (no baseline)")
+            continue
+        change = result["rate"] / old["rate"] - 1
+        limit = overrides.get(name, threshold)
+        regressed = change < -limit
+        if regressed:
+            regressions.append(name)
+        status = "REGRESSION" if regressed else "ok"
+        print(f"[compare] {name:<14} {change:>+8.1%}  (limit -{limit:.0%})  {status}")
+    return regressions
+
+
+def parse_overrides(values: List[str]) -> Dict[str, float]:
+    overrides: Dict[str, float] = {}
+    for value in values:
+        name, _, limit = value.partition("=")
+        if name not in BENCHMARKS or not limit:
+            raise ValueError(f"Invalid --threshold-for '{value}' (expected NAME=FRACTION with NAME in {', '.join(BENCHMARKS)})")
+        overrides[name] = float(limit)
+    return overrides
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the portable packager benchmark suite.")
+    parser.add_argument("--scale", choices=SCALES, default="small", help="Input sizes (default: small).")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Runs per benchmark (default: {DEFAULT_REPEAT}).")
+    parser.add_argument("--work-dir", type=Path, help="Keep generated inputs here between runs (default: temporary).")
+    parser.add_argument("--output", type=Path, help="Write results as JSON.")
+    parser.add_argument("--baseline", type=Path, help="Results JSON from an earlier run to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Allowed rate drop before a benchmark counts as regressed (default: {DEFAULT_THRESHOLD}).",
+    )
+    parser.add_argument("--threshold-for", action="append", default=[], help="Per-benchmark limit, e.g. copy_tree=0.4.")
+    args = parser.parse_args()
+
+    try:
+        overrides = parse_overrides(args.threshold_for)
+    except ValueError as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    names = args.only or list(BENCHMARKS)
+    temporary: Optional[tempfile.TemporaryDirectory] = None
+    if args.work_dir:
+        work = args.work_dir.resolve()
+        work.mkdir(parents=True, exist_ok=True)
+    else:
+        temporary = tempfile.TemporaryDirectory(prefix="ppkg-bench-")
+        work = Path(temporary.name)
+    try:
+        print(f"[bench] scale={args.scale}, work dir {work}")
+        ctx = prepare(work, args.scale, names)
+        results = run_suite(ctx, names, args.repeat)
+    finally:
+        if temporary:
+            temporary.cleanup()
+    report = {"environment": environment(args.scale, args.repeat), "results": results}
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with args.output.open("w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"[done] Wrote {args.output}")
+    if args.baseline:
+        with args.baseline.open("r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if baseline.get("environment", {}).get("scale") != args.scale:
+            print(f"[compare] warning: baseline was recorded at scale {baseline.get('environment', {}).get('scale')}")
+        regressions = compare(results, baseline.get("results", {}), args.threshold, overrides)
+        if regressions:
+            print(f"[compare] {len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Generate reproducible synthetic install trees and traced-data XMLs for benchmarks.
+
+Usage:
+    python benchmarks/synthetic.py tree /tmp/bench/src --files 20000 --mean-size 65536 --depth 4 --duplicates 0.1
+    python benchmarks/synthetic.py xml /tmp/bench/traced.xml --elements 1000000
+
+Trees: file sizes follow a log-normal (many small files, a few large ones),
+uniform or fixed distribution around --mean-size, spread over folders up to
+--depth levels deep; --duplicates is the fraction of files that repeat the
+bytes of an earlier file. XMLs follow the Uninstall Tool "Traced Data" layout
+(Files/Registry/Services/Tasks) with the same path shapes as
+bench_reduce_paths.py. The same --seed always produces the same output.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_reduce_paths import synthetic_paths  # noqa: E402
+
+SIZE_DISTRIBUTIONS = ("lognormal", "uniform", "fixed")
+# Bytes all file contents are sliced from; a per-file prefix keeps unique files unique.
+POOL_SIZE = 1024 * 1024
+FILES_PER_DIRECTORY = 50
+
+
+def _sizes(count: int, mean_size: int, distribution: str, max_size: int, rng: random.Random) -> List[int]:
+    if distribution == "fixed":
+        return [mean_size] * count
+    if distribution == "uniform":
+        return [rng.randint(0, 2 * mean_size) for _ in range(count)]
+    # sigma 1.5: the median file is ~1/3 of the mean and a few percent of files hold most bytes.
+    sigma = 1.5
+    mu = math.log(max(1, mean_size)) - sigma * sigma / 2
+    return [min(max_size, int(rng.lognormvariate(mu, sigma))) for _ in range(count)]
+
+
+def _content(index: int, size: int, pool: bytes) -> bytes:
+    prefix = f"file-{index}\n".encode("ascii")[:size]
+    remaining = size - len(prefix)
+    start = (index * 7919) % POOL_SIZE
+    body = (pool[start:] + pool[:start]) * (remaining // POOL_SIZE + 1)
+    return prefix + body[:remaining]
+
+
+def synthetic_tree(
+    root: Path,
+    files: int,
+    mean_size: int = 64 * 1024,
+    depth: int = 3,
+    duplicates: float = 0.0,
+    distribution: str = "lognormal",
+    max_size: int = 256 * 1024 * 1024,
+    seed: int = 1,
+) -> Dict[str, int]:
+    """Write a synthetic install tree under ``root``. Returns file/byte/duplicate counts."""
+    if distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution '{distribution}'. Expected one of: {', '.join(SIZE_DISTRIBUTIONS)}")
+    rng = random.Random(seed)
+    pool = rng.randbytes(POOL_SIZE)
+    sizes = _sizes(files, mean_size, distribution, max_size, rng)
+    directories = max(1, files // FILES_PER_DIRECTORY)
+    written: List[int] = []
+    total_bytes = duplicate_count = 0
+    for index, size in enumerate(sizes):
+        directory = index % directories
+        levels = 1 + directory % max(1, depth)
+        folder = root.joinpath(*(f"dir{(directory >> (3 * level)) % 8}_{level}" for level in range(levels)))
+        folder.mkdir(parents=True, exist_ok=True)
+        if written and rng.random() < duplicates:
+            source = rng.choice(written)
+            size = sizes[source]
+            data = _content(source, size, pool)
+            duplicate_count += 1
+        else:
+            data = _content(index, size, pool)
+            written.append(index)
+        (folder / f"file{index}.{('dll', 'pak', 'dat', 'json', 'exe')[index % 5]}").write_bytes(data)
+        total_bytes += size
+    return {"files": files, "bytes": total_bytes, "duplicates": duplicate_count}
+
+
+def synthetic_trace_xml(path: Path, elements: int, seed: int = 1) -> int:
+    """Write a traced-data XML with about ``elements`` entries (80% files, the rest registry/services/tasks)."""
+    rng = random.Random(seed)
+    file_count = elements * 8 // 10
+    key_count = elements - file_count - 2 * max(1, elements // 100)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<TracedData>\n  <Files>\n')
+        for file_path in synthetic_paths(file_count, seed):
+            out.write(f"    <File Path={quoteattr(file_path)} />\n")
+        out.write("  </Files>\n  <Registry>\n")
+        for index in range(max(0, key_count)):
+            hive = rng.choice(("HKLM\\SOFTWARE", "HKCU\\Software"))
+            out.write(f"    <Key Path=\"{hive}\\Vendor{index % 97}\\App{index % 1000}\\Key{index}\" />\n")
+        out.write("  </Registry>\n  <Services>\n")
+        for index in range(max(1, elements // 100)):
+            out.write(f'    <Service Name="SynthService{index}" />\n')
+        out.write("  </Services>\n  <Tasks>\n")
+        for index in range(max(1, elements // 100)):
+            out.write(f'    <Task Name="\\Vendor{index % 97}\\Task{index}" />\n')
+        out.write("  </Tasks>\n</TracedData>\n")
+    return elements
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    tree = sub.add_parser("tree", help="Synthetic install tree.")
+    tree.add_argument("root", type=Path)
+    tree.add_argument("--files", type=int, default=10000)
+    tree.add_argument("--mean-size", type=int, default=64 * 1024, help="Mean file size in bytes.")
+    tree.add_argument("--max-size", type=int, default=256 * 1024 * 1024, help="Cap for log-normal sizes.")
+    tree.add_argument("--distribution", choices=SIZE_DISTRIBUTIONS, default="lognormal")
+    tree.add_argument("--depth", type=int, default=3, help="Maximum folder depth.")
+    tree.add_argument("--duplicates", type=float, default=0.0, help="Fraction of files repeating earlier content.")
+    tree.add_argument("--seed", type=int, default=1)
+    xml = sub.add_parser("xml", help="Synthetic traced-data XML.")
+    xml.add_argument("path", type=Path)
+    xml.add_argument("--elements", type=int, default=100000)
+    xml.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "tree":
+        stats = synthetic_tree(
+            args.root,
+            args.files,
+            mean_size=args.mean_size,
+            depth=args.depth,
+            duplicates=args.duplicates,
+            distribution=args.distribution,
+            max_size=args.max_size,
+            seed=args.seed,
+        )
+        print(f"[tree] {stats['files']} files, {stats['bytes']} bytes, {stats['duplicates']} duplicates -> {args.root}")
+    else:
+        synthetic_trace_xml(args.path, args.elements, seed=args.seed)
+        print(f"[xml] {args.elements} elements -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
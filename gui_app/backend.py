@@ -1,42 +1,99 @@
 from __future__ import annotations
 
+import io
 import json
 import os
 import subprocess
+import sys
 import threading
-import traceback
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, TextIO
 
-from PySide6.QtCore import QObject, QUrl, Signal, Slot
+from PySide6.QtCore import Property, QObject, QUrl, Signal, Slot
 
+import package_events
 import portable_packager
 import trace_xml_to_config
 
+from .jobs import DEFAULT_MAX_JOBS, Job, JobQueue, ProgressTracker, current_job
+from .log_model import LogModel
+
 
 class _SignalWriter:
-    """Redirects stdout/stderr to the GUI log signal."""
+    """Tee for stdout/stderr that also copies job output line by line into the GUI log model.
+
+    Everything still reaches the original stream, so the terminal keeps showing
+    startup errors and QML warnings even when the UI cannot. Only lines written
+    from worker threads (jobs and the pools they start) go to the log model, and
+    lines written by a job's own thread are tagged with its number. Partial lines
+    are kept per thread as a list of fragments and joined once their newline
+    arrives, so large writes stay linear; ``flush`` (called when a job ends)
+    emits whatever the thread left without a newline.
+    """
+
+    def __init__(self, sink: Callable[[str], None], original: Optional[TextIO]) -> None:
+        self._sink = sink
+        self.original = original
+        self._local = threading.local()
+
+    @property
+    def encoding(self) -> str:
+        return getattr(self.original, "encoding", None) or "utf-8"
+
+    @property
+    def errors(self) -> Optional[str]:
+        return getattr(self.original, "errors", None)
+
+    def isatty(self) -> bool:
+        return bool(self.original and self.original.isatty())
 
-    def __init__(self, emitter: "Backend") -> None:
-        self._emitter = emitter
-        self._buffer = ""
+    def fileno(self) -> int:
+        if self.original is None:
+            raise io.UnsupportedOperation("fileno")
+        return self.original.fileno()
+
+    def writable(self) -> bool:
+        return True
+
+    def _parts(self) -> List[str]:
+        parts = getattr(self._local, "parts", None)
+        if parts is None:
+            parts = self._local.parts = []
+        return parts
 
     def write(self, text: str) -> int:
         if not text:
             return 0
-        self._buffer += text
-        while "\n" in self._buffer:
-            line, self._buffer = self._buffer.split("\n", 1)
-            clean = line.strip()
-            if clean:
-                self._emitter.logMessage.emit(clean)
+        if self.original is not None:
+            self.original.write(text)
+        if threading.current_thread() is threading.main_thread():
+            return len(text)
+        parts = self._parts()
+        if "\n" not in text:
+            parts.append(text)
+            return len(text)
+        lines = text.split("\n")
+        parts.append(lines[0])
+        self._emit("".join(parts))
+        for line in lines[1:-1]:
+            self._emit(line)
+        self._local.parts = [lines[-1]] if lines[-1] else []
         return len(text)
 
+    def _emit(self, line: str) -> None:
+        clean = line.strip()
+        if clean:
+            job = current_job()
+            self._sink(f"#{job.job_id} {clean}" if job else clean)
+
     def flush(self) -> None:
-        if self._buffer.strip():
-            self._emitter.logMessage.emit(self._buffer.strip())
-        self._buffer = ""
+        if self.original is not None:
+            self.original.flush()
+        parts = self._parts()
+        if parts:
+            self._emit("".join(parts))
+        self._local.parts = []
 
 
 @dataclass
@@ -51,25 +108,66 @@ class _JobParams:
 class Backend(QObject):
     """Bridge between QML and the Python logic."""
 
-    logMessage = Signal(str, arguments=["message"])
     operationStarted = Signal(str, arguments=["description"])
     operationFinished = Signal(str, arguments=["description"])
     operationFailed = Signal(str, arguments=["error"])
+    planReady = Signal(str, arguments=["planJson"])
+    jobChanged = Signal(int, str, str, arguments=["jobId", "state", "description"])
+    jobProgress = Signal(
+        int, float, float, float, float, arguments=["jobId", "percent", "bytesDone", "bytesTotal", "etaSeconds"]
+    )
+    maxJobsChanged = Signal()
 
     def __init__(self) -> None:
         super().__init__()
-        self._lock = threading.Lock()
+        self._log_model = LogModel(parent=self)
+        self._jobs = JobQueue(DEFAULT_MAX_JOBS, on_change=self._job_changed)
+        self._stdout = _SignalWriter(self._log_model.append, sys.stdout)
+        self._stderr = _SignalWriter(self._log_model.append, sys.stderr)
+        sys.stdout, sys.stderr = self._stdout, self._stderr
+
+    def shutdown(self) -> None:
+        """Put the original stdout/stderr back (connected to the application's aboutToQuit)."""
+        if sys.stdout is self._stdout:
+            sys.stdout = self._stdout.original
+        if sys.stderr is self._stderr:
+            sys.stderr = self._stderr.original
+
+    def _get_log_model(self) -> LogModel:
+        return self._log_model
+
+    logModel = Property(QObject, _get_log_model, constant=True)
+
+    def _get_max_jobs(self) -> int:
+        return self._jobs.max_workers
+
+    def _set_max_jobs(self, value: int) -> None:
+        if value != self._jobs.max_workers:
+            self._jobs.set_max_workers(value)
+            self.maxJobsChanged.emit()
+
+    # How many queued jobs run at the same time; more than one or two mostly competes for the same disk.
+    maxConcurrentJobs = Property(int, _get_max_jobs, _set_max_jobs, notify=maxJobsChanged)
 
     # -------------------------- Public slots for QML ----------------------- #
     @Slot(str, str, str)
     def convertXml(self, xml_path: str, output_path: str, app_name: str) -> None:
         params = _JobParams(xml_path=xml_path, output_path=output_path, app_name=app_name or None)
-        self._start_thread(self._convert_worker, params, "Convirtiendo XML...")
+        self._enqueue("convert", f"Convertir {Path(xml_path).name or 'XML'}", self._convert_worker, params)
 
     @Slot(str, str, bool)
     def generatePackage(self, config_path: str, output_dir: str, dry_run: bool) -> None:
         params = _JobParams(config_path=config_path, output_path=output_dir, dry_run=dry_run)
-        self._start_thread(self._package_worker, params, "Generando paquete portable...")
+        label = "Dry-run" if dry_run else "Empaquetar"
+        self._enqueue("package", f"{label} {Path(config_path).name or 'configuración'}", self._package_worker, params)
+
+    @Slot(int)
+    def cancelJob(self, job_id: int) -> None:
+        self._jobs.cancel(job_id)
+
+    @Slot()
+    def cancelAllJobs(self) -> None:
+        self._jobs.cancel_all()
 
     @Slot(str, result=str)
     def urlToLocalPath(self, url: str) -> str:
@@ -96,42 +194,75 @@ class Backend(QObject):
         return self._resolve_path(path, create=False).exists()
 
     # ------------------------------ Workers -------------------------------- #
-    def _convert_worker(self, params: _JobParams) -> None:
-        try:
-            xml_path = self._resolve_path(params.xml_path)
-            output_path = self._resolve_path(params.output_path, must_exist_parent=True)
-            self.logMessage.emit(f"Procesando XML: {xml_path}")
-            config = trace_xml_to_config.build_config(xml_path, params.app_name)
-            with output_path.open("w", encoding="utf-8") as handle:
-                json.dump(config, handle, indent=2, ensure_ascii=False)
-            self.operationFinished.emit(f"Configuración guardada en {output_path}")
-        except Exception as exc:  # pragma: no cover - GUI feedback
-            self._handle_error("Error al convertir XML", exc)
-
-    def _package_worker(self, params: _JobParams) -> None:
-        from contextlib import redirect_stdout, redirect_stderr
-
-        writer = _SignalWriter(self)
-        try:
-            config_path = self._resolve_path(params.config_path)
-            output_dir = self._resolve_path(params.output_path, create=True)
-            with redirect_stdout(writer), redirect_stderr(writer):
-                portable_packager.main(config_path, output_dir, dry_run=params.dry_run)
-            writer.flush()
-            if params.dry_run:
-                self.operationFinished.emit("Dry-run completado (no se copiaron archivos).")
-            else:
-                self.operationFinished.emit(f"Paquete generado en {output_dir}")
-        except Exception as exc:  # pragma: no cover - GUI feedback
-            self._handle_error("Error al generar paquete", exc)
-        finally:
-            writer.flush()
+    def _convert_worker(self, params: _JobParams, job: Job) -> str:
+        """Convert a trace. The parse itself cannot be interrupted; a cancelled job discards its result."""
+        xml_path = self._resolve_path(params.xml_path)
+        output_path = self._resolve_path(params.output_path, must_exist_parent=True)
+        self._log_model.append(f"Procesando XML: {xml_path}")
+        config = trace_xml_to_config.build_config(xml_path, params.app_name)
+        if job.cancel.is_set():
+            return "Conversión cancelada."
+        with output_path.open("w", encoding="utf-8") as handle:
+            json.dump(config, handle, indent=2, ensure_ascii=False)
+        return f"Configuración guardada en {output_path}"
+
+    def _package_worker(self, params: _JobParams, job: Job) -> str:
+        config_path = self._resolve_path(params.config_path)
+        output_dir = self._resolve_path(params.output_path, create=True)
+        events = package_events.EventBus()
+        tracker: Optional[ProgressTracker] = None
+        if not params.dry_run:
+            # The same parallel scan the dry-run plan uses gives the byte total for percent and ETA.
+            config = portable_packager.load_config(config_path)
+            totals = portable_packager.plan_package(config, output_dir)["totals"]
+            tracker = ProgressTracker(totals["bytes"], lambda snapshot: self._emit_progress(job, snapshot))
+            events.add_sink(tracker)
+        plan = portable_packager.main(
+            config_path, output_dir, dry_run=params.dry_run, events=events, cancel=job.cancel
+        )
+        if tracker:
+            tracker.finish()
+        if plan is not None:
+            self.planReady.emit(json.dumps(plan, indent=2, ensure_ascii=False))
+        if params.dry_run:
+            return "Dry-run completado (no se copiaron archivos)."
+        return f"Paquete generado en {output_dir}"
 
     # -------------------------- Utilities ---------------------------------- #
-    def _start_thread(self, target, params: _JobParams, description: str) -> None:
-        self.operationStarted.emit(description)
-        thread = threading.Thread(target=target, args=(params,), daemon=True)
-        thread.start()
+    def _enqueue(self, kind: str, description: str, worker, params: _JobParams) -> None:
+        def run(job: Job) -> str:
+            try:
+                return worker(params, job)
+            finally:
+                # A last line without a newline would otherwise stay buffered on this thread.
+                self._stdout.flush()
+                self._stderr.flush()
+
+        self._jobs.submit(kind, description, run)
+
+    def _emit_progress(self, job: Job, snapshot: Dict[str, Any]) -> None:
+        self.jobProgress.emit(
+            job.job_id,
+            snapshot["percent"],
+            float(snapshot["bytes_done"]),
+            float(snapshot["bytes_total"]),
+            snapshot["eta_seconds"],
+        )
+
+    def _job_changed(self, job: Job) -> None:
+        self.jobChanged.emit(job.job_id, job.state, job.description)
+        if job.state == "running":
+            self.operationStarted.emit(f"#{job.job_id} {job.description}...")
+        elif job.state == "done":
+            self._finish(f"#{job.job_id} {job.result}")
+        elif job.state == "cancelled":
+            message = f"#{job.job_id} {job.description}: cancelado"
+            if job.kind == "package":
+                message += " (vuelve a ejecutarlo para reanudar)"
+            self._log_model.append(f"✖ {message}")
+            self.operationFinished.emit(message)
+        elif job.state == "failed":
+            self._handle_error(f"#{job.job_id} Error en {job.description}", job)
 
     def _resolve_path(self, raw: Optional[str], create: bool = False, must_exist_parent: bool = False) -> Path:
         if not raw:
@@ -143,7 +274,13 @@ class Backend(QObject):
             path.parent.mkdir(parents=True, exist_ok=True)
         return path.resolve()
 
-    def _handle_error(self, prefix: str, exc: Exception) -> None:
-        message = f"{prefix}: {exc}"
-        self.logMessage.emit(traceback.format_exc())
+    def _finish(self, message: str) -> None:
+        self._log_model.append(f"✔ {message}")
+        self.operationFinished.emit(message)
+
+    def _handle_error(self, prefix: str, job: Job) -> None:
+        message = f"{prefix}: {job.error}"
+        for line in (job.traceback or "").splitlines():
+            self._log_model.append(line)
+        self._log_model.append(f"✖ {message}")
         self.operationFailed.emit(message)
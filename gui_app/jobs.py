@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+DEFAULT_MAX_JOBS = 2
+PROGRESS_INTERVAL = 0.25
+
+_current = threading.local()
+
+
+def current_job() -> Optional["Job"]:
+    """The job running on this thread, if any (used to tag log lines)."""
+    return getattr(_current, "job", None)
+
+
+@dataclass
+class Job:
+    job_id: int
+    kind: str
+    description: str
+    run: Callable[["Job"], Optional[str]]
+    cancel: threading.Event = field(default_factory=threading.Event)
+    state: str = "queued"
+    result: Optional[str] = None
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+
+
+class JobQueue:
+    """FIFO of GUI jobs run on at most ``max_workers`` threads at a time.
+
+    ``run(job)`` receives the Job so it can pass ``job.cancel`` down to the work
+    it does; a job that raises after its cancel event was set ends up "cancelled"
+    instead of "failed". ``on_change(job)`` is called (from whatever thread made
+    the change) on every state transition: queued, running, cancelling, done,
+    failed, cancelled.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_JOBS, on_change: Callable[[Job], None] = lambda job: None) -> None:
+        self._max_workers = max(1, max_workers)
+        self._on_change = on_change
+        self._pending: Deque[Job] = deque()
+        self._jobs: Dict[int, Job] = {}
+        self._running = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def set_max_workers(self, value: int) -> None:
+        with self._lock:
+            self._max_workers = max(1, value)
+        self._start_ready()
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def submit(self, kind: str, description: str, run: Callable[[Job], Optional[str]]) -> Job:
+        with self._lock:
+            job = Job(self._next_id, kind, description, run)
+            self._next_id += 1
+            self._jobs[job.job_id] = job
+            self._pending.append(job)
+        self._on_change(job)
+        self._start_ready()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Drop a queued job or ask a running one to stop. Returns False if it already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in ("queued", "running"):
+                return False
+            job.cancel.set()
+            if job.state == "queued":
+                self._pending.remove(job)
+                job.state = "cancelled"
+            else:
+                job.state = "cancelling"
+        self._on_change(job)
+        return True
+
+    def cancel_all(self) -> None:
+        for job in self.jobs():
+            self.cancel(job.job_id)
+
+    def _start_ready(self) -> None:
+        started: List[Job] = []
+        with self._lock:
+            while self._pending and self._running < self._max_workers:
+                job = self._pending.popleft()
+                job.state = "running"
+                self._running += 1
+                started.append(job)
+        for job in started:
+            self._on_change(job)
+            threading.Thread(target=self._run, args=(job,), name=f"job-{job.job_id}", daemon=True).start()
+
+    def _run(self, job: Job) -> None:
+        _current.job = job
+        try:
+            job.result = job.run(job)
+            state = "cancelled" if job.cancel.is_set() else "done"
+        except Exception as exc:  # reported through on_change
+            job.error = str(exc)
+            job.traceback = traceback.format_exc()
+            state = "cancelled" if job.cancel.is_set() else "failed"
+        finally:
+            _current.job = None
+        with self._lock:
+            job.state = state
+            self._running -= 1
+        self._on_change(job)
+        self._start_ready()
+
+
+class ProgressTracker:
+    """EventBus sink turning portable_packager file events into percent/bytes/ETA reports.
+
+    Files reused from an earlier run count towards the percentage but not towards
+    the copy rate used for the ETA. ``report`` is called at most every
+    PROGRESS_INTERVAL seconds, plus once from ``finish()``.
+    """
+
+    def __init__(self, total_bytes: int, report: Callable[[Dict[str, Any]], None]) -> None:
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.copied_bytes = 0
+        self.files = 0
+        self._report = report
+        self._started = time.monotonic()
+        self._reported = 0.0
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        kind = event["event"]
+        if kind not in ("file", "file_skipped"):
+            return
+        self.files += 1
+        self.done_bytes += event["bytes"]
+        if kind == "file":
+            self.copied_bytes += event["bytes"]
+        now = time.monotonic()
+        if now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            self._report(self.snapshot())
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        remaining = max(0, self.total_bytes - self.done_bytes)
+        rate = self.copied_bytes / elapsed if elapsed > 0 else 0.0
+        return {
+            "percent": min(100.0, 100.0 * self.done_bytes / self.total_bytes) if self.total_bytes else 0.0,
+            "bytes_done": self.done_bytes,
+            "bytes_total": self.total_bytes,
+            "files": self.files,
+            "eta_seconds": remaining / rate if rate > 0 else -1.0,
+        }
+
+    def finish(self) -> None:
+        self.done_bytes = self.total_bytes
+        self._report(self.snapshot())
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List
+
+from PySide6.QtCore import QAbstractListModel, QByteArray, QModelIndex, QObject, Qt, QTimer, Property, Signal, Slot
+
+DEFAULT_CAPACITY = 20000
+FLUSH_INTERVAL_MS = 100
+
+
+class LogModel(QAbstractListModel):
+    """Bounded ring buffer of log lines exposed to QML as a list model.
+
+    ``append`` may be called from any thread and only queues the line; a timer on
+    the GUI thread moves queued lines into the model every FLUSH_INTERVAL_MS as
+    one row insertion, dropping the oldest rows once ``capacity`` is reached.
+    A burst of 50k lines therefore costs a handful of model updates, and the
+    ListView only creates delegates for the rows on screen.
+    """
+
+    MessageRole = Qt.UserRole + 1
+    countChanged = Signal()
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._capacity = max(1, capacity)
+        self._rows: List[str] = []
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self._flush)
+        self._timer.start()
+
+    # ------------------------- QAbstractListModel -------------------------- #
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        if role in (Qt.DisplayRole, self.MessageRole):
+            return self._rows[index.row()]
+        return None
+
+    def roleNames(self) -> Dict[int, QByteArray]:
+        return {self.MessageRole: QByteArray(b"message")}
+
+    # ------------------------------ Public API ----------------------------- #
+    @Slot(str)
+    def append(self, line: str) -> None:
+        """Queue one line (thread-safe); it shows up on the next flush."""
+        with self._lock:
+            self._pending.append(line)
+
+    @Slot()
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        self.beginResetModel()
+        self._rows.clear()
+        self._dropped = 0
+        self.endResetModel()
+        self.countChanged.emit()
+
+    def _get_count(self) -> int:
+        return len(self._rows)
+
+    def _get_dropped(self) -> int:
+        return self._dropped
+
+    count = Property(int, _get_count, notify=countChanged)
+    dropped = Property(int, _get_dropped, notify=countChanged)
+
+    # ------------------------------ Internals ------------------------------ #
+    def _flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+        if len(batch) > self._capacity:
+            self._dropped += len(batch) - self._capacity
+            batch = batch[-self._capacity :]
+        overflow = len(self._rows) + len(batch) - self._capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            # Rows are dropped once per flush, not per line, so a plain list beats a deque
+            # (data() needs O(1) indexing for whatever rows the view asks for).
+            del self._rows[:overflow]
+            self.endRemoveRows()
+            self._dropped += overflow
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        self._rows.extend(batch)
+        self.endInsertRows()
+        self.countChanged.emit()
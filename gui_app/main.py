@@ -29,12 +29,14 @@ def run() -> int:
     engine.warnings.connect(_log_warnings)
 
     backend = Backend()
+    app.aboutToQuit.connect(backend.shutdown)
     engine.rootContext().setContextProperty("backend", backend)
 
     qml_file = Path(__file__).resolve().parent / "qml" / "Main.qml"
     engine.load(QUrl.fromLocalFile(str(qml_file)))
 
     if not engine.rootObjects():
+        backend.shutdown()
         print("No se pudo cargar la interfaz QML.", file=sys.stderr)
         return -1
     return app.exec()
@@ -200,7 +200,106 @@ ApplicationWindow {
                                 onClicked: backend.generatePackage(configField.text, outputField.text, dryRunCheck.checked)
                             }
                         }
-                        Item { Layout.fillHeight: true }
+                        GroupBox {
+                            title: "Plan del paquete (dry-run)"
+                            visible: planArea.text.length > 0
+                            Layout.fillWidth: true
+                            Layout.fillHeight: true
+                            ScrollView {
+                                anchors.fill: parent
+                                TextArea {
+                                    id: planArea
+                                    readOnly: true
+                                    font.family: "Consolas"
+                                    wrapMode: Text.NoWrap
+                                }
+                            }
+                        }
+                        Item {
+                            visible: planArea.text.length === 0
+                            Layout.fillHeight: true
+                        }
+                    }
+                }
+            }
+        }
+
+        GroupBox {
+            title: "Cola de trabajos"
+            Layout.fillWidth: true
+            Layout.preferredHeight: 170
+            visible: jobsModel.count > 0
+            ColumnLayout {
+                anchors.fill: parent
+                ListView {
+                    id: jobsView
+                    Layout.fillWidth: true
+                    Layout.fillHeight: true
+                    clip: true
+                    model: jobsModel
+                    ScrollBar.vertical: ScrollBar {}
+                    delegate: RowLayout {
+                        required property int jobId
+                        required property string description
+                        required property string state
+                        required property real percent
+                        required property real bytesDone
+                        required property real bytesTotal
+                        required property real etaSeconds
+                        width: ListView.view.width
+                        spacing: 12
+                        Label {
+                            text: "#" + jobId + " " + description
+                            elide: Text.ElideMiddle
+                            Layout.preferredWidth: 320
+                        }
+                        Label {
+                            text: root.jobStateText(state)
+                            Layout.preferredWidth: 110
+                        }
+                        ProgressBar {
+                            from: 0
+                            to: 100
+                            value: percent
+                            indeterminate: state === "running" && bytesTotal === 0
+                            Layout.fillWidth: true
+                        }
+                        Label {
+                            text: bytesTotal > 0
+                                  ? root.formatBytes(bytesDone) + " / " + root.formatBytes(bytesTotal)
+                                    + (state === "running" && etaSeconds >= 0 ? " · ETA " + root.formatEta(etaSeconds) : "")
+                                  : ""
+                            Layout.preferredWidth: 240
+                        }
+                        Button {
+                            text: "Cancelar"
+                            enabled: state === "queued" || state === "running"
+                            onClicked: backend.cancelJob(jobId)
+                        }
+                    }
+                }
+                RowLayout {
+                    Layout.alignment: Qt.AlignRight
+                    Label { text: "Trabajos simultáneos" }
+                    SpinBox {
+                        from: 1
+                        to: 8
+                        value: backend.maxConcurrentJobs
+                        onValueModified: backend.maxConcurrentJobs = value
+                    }
+                    Button {
+                        text: "Cancelar todos"
+                        onClicked: backend.cancelAllJobs()
+                    }
+                    Button {
+                        text: "Quitar terminados"
+                        onClicked: {
+                            for (var i = jobsModel.count - 1; i >= 0; --i) {
+                                var state = jobsModel.get(i).state
+                                if (state === "done" || state === "failed" || state === "cancelled")
+                                    jobsModel.remove(i)
+                            }
+                        }
                     }
                 }
             }
@@ -212,26 +311,83 @@ ApplicationWindow {
             Layout.preferredHeight: 220
             ColumnLayout {
                 anchors.fill: parent
-                ScrollView {
+                ListView {
+                    id: logView
                     Layout.fillWidth: true
                     Layout.fillHeight: true
-                    TextArea {
-                        id: logArea
-                        readOnly: true
+                    clip: true
+                    reuseItems: true
+                    model: backend.logModel
+                    // Follow new lines only while the view is already at the bottom.
+                    property bool following: true
+                    onMovementEnded: following = atYEnd
+                    onCountChanged: if (following) Qt.callLater(positionViewAtEnd)
+                    ScrollBar.vertical: ScrollBar {
+                        policy: ScrollBar.AsNeeded
+                    }
+                    delegate: Label {
+                        required property string message
+                        width: ListView.view.width
+                        text: message
                         wrapMode: Text.Wrap
                     }
                 }
                 RowLayout {
                     Layout.alignment: Qt.AlignRight
+                    Label {
+                        visible: backend.logModel.dropped > 0
+                        text: backend.logModel.dropped + " líneas antiguas descartadas"
+                        opacity: 0.7
+                    }
                     Button {
                         text: "Limpiar"
-                        onClicked: logArea.text = ""
+                        onClicked: backend.logModel.clear()
                     }
                 }
             }
         }
     }
 
+    ListModel {
+        id: jobsModel
+    }
+
+    function jobIndex(jobId) {
+        for (var i = 0; i < jobsModel.count; ++i) {
+            if (jobsModel.get(i).jobId === jobId)
+                return i
+        }
+        return -1
+    }
+
+    function jobStateText(state) {
+        switch (state) {
+        case "queued": return "En cola"
+        case "running": return "En curso"
+        case "cancelling": return "Cancelando..."
+        case "done": return "Terminado"
+        case "failed": return "Error"
+        case "cancelled": return "Cancelado"
+        }
+        return state
+    }
+
+    function formatBytes(value) {
+        var units = ["B", "KB", "MB", "GB", "TB"]
+        var unit = 0
+        while (value >= 1024 && unit < units.length - 1) {
+            value /= 1024
+            ++unit
+        }
+        return value.toFixed(unit === 0 ? 0 : 1) + " " + units[unit]
+    }
+
+    function formatEta(seconds) {
+        var s = Math.round(seconds)
+        var m = Math.floor(s / 60)
+        return m > 0 ? m + " min " + (s % 60) + " s" : s + " s"
+    }
+
     Connections {
         target: backend
         function onOperationStarted(description) {
@@ -239,14 +395,32 @@ ApplicationWindow {
         }
         function onOperationFinished(description) {
             statusLabel.text = description
-            logArea.append("✔ " + description)
         }
         function onOperationFailed(error) {
             statusLabel.text = error
-            logArea.append("✖ " + error)
         }
-        function onLogMessage(message) {
-            logArea.append(message)
+        function onPlanReady(planJson) {
+            planArea.text = planJson
+        }
+        function onJobChanged(jobId, state, description) {
+            var index = root.jobIndex(jobId)
+            if (index < 0) {
+                jobsModel.append({ jobId: jobId, description: description, state: state, percent: 0,
+                                   bytesDone: 0, bytesTotal: 0, etaSeconds: -1 })
+            } else {
+                jobsModel.setProperty(index, "state", state)
+                if (state === "done")
+                    jobsModel.setProperty(index, "percent", 100)
+            }
+        }
+        function onJobProgress(jobId, percent, bytesDone, bytesTotal, etaSeconds) {
+            var index = root.jobIndex(jobId)
+            if (index < 0)
+                return
+            jobsModel.setProperty(index, "percent", percent)
+            jobsModel.setProperty(index, "bytesDone", bytesDone)
+            jobsModel.setProperty(index, "bytesTotal", bytesTotal)
+            jobsModel.setProperty(index, "etaSeconds", etaSeconds)
         }
     }
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Pack a portable package folder into a single compressed, seekable archive (.ppkg)
+and read members back without unpacking the whole file.
+
+Usage:
+    python package_archive.py pack PortableRoot --output MyApp.ppkg
+    python package_archive.py list MyApp.ppkg
+    python package_archive.py show MyApp.ppkg manifest.json
+    python package_archive.py extract MyApp.ppkg [member ...] --dest C:\\Restore
+
+Layout: an 8-byte magic, then every file as a run of independently compressed
+chunks, then a zlib-compressed JSON index (per member: size, mtime, mode, sha256
+and the offset/length of each chunk) and a fixed-size footer pointing at it.
+Chunks are compressed on a thread pool (zlib releases the GIL), and any member
+can be read by seeking straight to its chunks.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path, PureWindowsPath
+from typing import Any, BinaryIO, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"PPKGARC1"
+FOOTER = struct.Struct("<8sQQ")
+CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_LEVEL = 6
+DEFAULT_WORKERS = os.cpu_count() or 1
+METHOD_STORED = 0
+METHOD_ZLIB = 1
+
+
+def _compress(data: bytes, level: int) -> Tuple[int, bytes]:
+    packed = zlib.compress(data, level)
+    if len(packed) >= len(data):
+        return METHOD_STORED, data
+    return METHOD_ZLIB, packed
+
+
+def member_path(dest_dir: Path, name: str) -> Path:
+    """Where member ``name`` lands below ``dest_dir``.
+
+    Names come from the archive index, so they are untrusted: absolute names,
+    drive-qualified names and names with ``..`` components raise ValueError, as
+    does anything that still resolves outside ``dest_dir`` (e.g. via a symlink).
+    """
+    parts = [part for part in re.split(r"[\\/]+", name) if part and part != "."]
+    if not parts or name[0] in "/\\" or PureWindowsPath(name).drive or ".." in parts:
+        raise ValueError(f"Unsafe member name '{name}'")
+    path = dest_dir.joinpath(*parts)
+    root = dest_dir.resolve()
+    if root not in path.resolve().parents:
+        raise ValueError(f"Member '{name}' would be extracted outside {dest_dir}")
+    return path
+
+
+def _iter_package_files(package_dir: Path) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """Yield (posix relative path, path, stat) for every regular file, in a stable order."""
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = Path(root) / name
+            yield path.relative_to(package_dir).as_posix(), path, path.stat()
+
+
+def write_archive(
+    package_dir: Path,
+    archive_path: Path,
+    workers: int = DEFAULT_WORKERS,
+    level: int = DEFAULT_LEVEL,
+) -> Dict[str, int]:
+    """Pack ``package_dir`` into ``archive_path``. Returns file/byte counts.
+
+    Chunks are written in the order they were read; at most ``workers * 4`` chunks
+    are being compressed at any time so memory stays bounded on large packages.
+    """
+    package_dir = package_dir.resolve()
+    archive_path = archive_path.resolve()
+    members: List[Dict[str, Any]] = []
+    directories: List[str] = []
+    for root, dirs, _files in os.walk(package_dir):
+        for name in dirs:
+            directories.append((Path(root) / name).relative_to(package_dir).as_posix())
+    pending: Deque[Tuple[Dict[str, Any], Future[Tuple[int, bytes]], int]] = deque()
+    raw_bytes = 0
+    partial = archive_path.with_name(archive_path.name + ".partial")
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with partial.open("wb") as out, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        out.write(MAGIC)
+
+        def drain(limit: int) -> None:
+            while len(pending) > limit:
+                member, future, raw_len = pending.popleft()
+                method, data = future.result()
+                member["chunks"].append([out.tell(), len(data), raw_len, method])
+                out.write(data)
+
+        for name, path, stat in _iter_package_files(package_dir):
+            if path == archive_path or path == partial:
+                continue
+            member = {
+                "name": name,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "mode": stat.st_mode & 0o7777,
+                "chunks": [],
+            }
+            digest = hashlib.sha256()
+            with path.open("rb") as handle:
+                for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    pending.append((member, pool.submit(_compress, chunk, level), len(chunk)))
+                    drain(max(1, workers) * 4)
+            member["sha256"] = digest.hexdigest()
+            members.append(member)
+            raw_bytes += stat.st_size
+        drain(0)
+
+        index = zlib.compress(json.dumps({"directories": directories, "members": members}).encode("utf-8"), 9)
+        index_offset = out.tell()
+        out.write(index)
+        out.write(FOOTER.pack(MAGIC, index_offset, len(index)))
+    os.replace(partial, archive_path)
+    return {"files": len(members), "bytes": raw_bytes, "archive_bytes": archive_path.stat().st_size}
+
+
+class PackageArchive:
+    """Random-access reader for .ppkg archives.
+
+    Only the footer and index are read on open; member data is read on demand.
+    """
+
+    def __init__(self, archive_path: Path) -> None:
+        self.path = archive_path
+        self._handle: BinaryIO = archive_path.open("rb")
+        try:
+            self._handle.seek(-FOOTER.size, os.SEEK_END)
+            magic, index_offset, index_length = FOOTER.unpack(self._handle.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{archive_path} is not a package archive")
+            self._handle.seek(index_offset)
+            index = json.loads(zlib.decompress(self._handle.read(index_length)))
+        except Exception:
+            self._handle.close()
+            raise
+        self.directories: List[str] = index["directories"]
+        self.members: Dict[str, Dict[str, Any]] = {member["name"]: member for member in index["members"]}
+
+    def __enter__(self) -> "PackageArchive":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def names(self) -> List[str]:
+        return list(self.members)
+
+    def info(self, name: str) -> Dict[str, Any]:
+        try:
+            return self.members[name]
+        except KeyError:
+            raise KeyError(f"'{name}' is not in {self.path}") from None
+
+    def iter_chunks(self, name: str) -> Iterator[bytes]:
+        """Yield the decompressed contents of ``name`` chunk by chunk."""
+        for offset, length, _raw_len, method in self.info(name)["chunks"]:
+            self._handle.seek(offset)
+            data = self._handle.read(length)
+            yield zlib.decompress(data) if method == METHOD_ZLIB else data
+
+    def read(self, name: str) -> bytes:
+        return b"".join(self.iter_chunks(name))
+
+    def read_json(self, name: str = "manifest.json") -> Any:
+        return json.loads(self.read(name).decode("utf-8-sig"))
+
+    def extract(self, name: str, destination: Path, verify: bool = True) -> Path:
+        """Extract one member to ``destination`` (a file path), restoring mtime and mode."""
+        member = self.info(name)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with destination.open("wb") as out:
+            for data in self.iter_chunks(name):
+                digest.update(data)
+                out.write(data)
+        if verify and member.get("sha256") and digest.hexdigest() != member["sha256"]:
+            destination.unlink(missing_ok=True)
+            raise ValueError(f"Checksum mismatch while extracting '{name}' from {self.path}")
+        os.chmod(destination, member["mode"])
+        os.utime(destination, ns=(member["mtime_ns"], member["mtime_ns"]))
+        return destination
+
+    def extract_all(self, dest_dir: Path, names: Optional[Iterable[str]] = None) -> int:
+        selected = list(names) if names else self.names()
+        # Check every name before writing anything, so a crafted index leaves no partial extraction.
+        targets = [(name, member_path(dest_dir, name)) for name in selected]
+        if not names:
+            for directory in [member_path(dest_dir, directory) for directory in self.directories]:
+                directory.mkdir(parents=True, exist_ok=True)
+        for name, target in targets:
+            self.extract(name, target)
+        return len(targets)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack, list and extract portable package archives.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Pack a package folder into one archive.")
+    pack.add_argument("package", type=Path, help="Portable package folder.")
+    pack.add_argument("--output", "-o", type=Path, required=True, help="Archive file to write.")
+    pack.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Compression threads.")
+    pack.add_argument("--level", type=int, default=DEFAULT_LEVEL, choices=range(0, 10), help="zlib level (0-9).")
+    listing = sub.add_parser("list", help="List archive members.")
+    listing.add_argument("archive", type=Path)
+    show = sub.add_parser("show", help="Write one member to stdout (e.g. manifest.json).")
+    show.add_argument("archive", type=Path)
+    show.add_argument("member")
+    extract = sub.add_parser("extract", help="Extract all or selected members.")
+    extract.add_argument("archive", type=Path)
+    extract.add_argument("members", nargs="*", help="Members to extract (default: all).")
+    extract.add_argument("--dest", type=Path, required=True, help="Destination folder.")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "pack":
+            stats = write_archive(args.package, args.output, workers=args.workers, level=args.level)
+            print(
+                f"[archive] {stats['files']} files, {stats['bytes']} bytes -> "
+                f"{args.output} ({stats['archive_bytes']} bytes)"
+            )
+            return
+        with PackageArchive(args.archive) as archive:
+            if args.command == "list":
+                for name in archive.names():
+                    member = archive.info(name)
+                    stored = sum(chunk[1] for chunk in member["chunks"])
+                    print(f"{member['size']:>14} {stored:>14}  {name}")
+            elif args.command == "show":
+                for data in archive.iter_chunks(args.member):
+                    sys.stdout.buffer.write(data)
+            else:
+                count = archive.extract_all(args.dest, args.members)
+                print(f"[extract] {count} files -> {args.dest}")
+    except (OSError, KeyError, ValueError, zlib.error) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of built packages: every packaged file plus the registry keys,
+services and scheduled tasks of each package, indexed for queries across
+thousands of packages.
+
+Usage:
+    python package_catalog.py catalog.db add MiApp_Portable MiApp.ppkg D:\\Portables
+    python package_catalog.py catalog.db find libcrypto-3-x64.dll
+    python package_catalog.py catalog.db find 5d73d6cb9cd975febb96c233f7393e8ab9a2d20b61c01ea13ba987549996f624
+    python package_catalog.py catalog.db find "*.pak" --limit 50
+    python package_catalog.py catalog.db largest --limit 10
+    python package_catalog.py catalog.db shared --min-size 1MB
+    python package_catalog.py catalog.db stats
+    python package_catalog.py catalog.db prune
+
+Packages are read from the per-file index in their manifest.json (folders or
+.ppkg archives; a folder without a manifest is searched one level deep for
+packages), never by walking their trees; only index entries without a digest
+(--link-mode clone/hardlink) are hashed, once per change. Adding a package again only touches
+what changed: the manifest digest is compared first, then only added, changed
+and removed files are written. portable_packager.py --catalog and
+batch_package.py --catalog keep the catalog up to date as packages are built.
+Shared content is tracked in a per-digest table maintained on every update, so
+"shared" reads an index instead of grouping all files. The database uses WAL,
+so several packaging processes can update it at once.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import package_archive
+import package_rules
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_MS = 30000
+# Page cache per connection; the digest and name indexes are updated in random order.
+CACHE_KIB = 256 * 1024
+DEFAULT_LIMIT = 20
+PACKAGES_PER_COMMIT = 64
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+HASH_BUFFER_SIZE = 1024 * 1024
+CAPTURE_KINDS = {"registry_keys": "registry", "services": "service", "scheduled_tasks": "task"}
+_SHA256 = re.compile(r"^[0-9a-fA-F]{64}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    location TEXT NOT NULL UNIQUE,
+    app_name TEXT,
+    generated_at TEXT,
+    manifest_sha256 TEXT,
+    file_count INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    cataloged_at TEXT
+);
+CREATE INDEX IF NOT EXISTS packages_bytes ON packages(total_bytes);
+CREATE INDEX IF NOT EXISTS packages_app ON packages(app_name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS files (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    PRIMARY KEY (package_id, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256);
+CREATE INDEX IF NOT EXISTS files_name ON files(name);
+CREATE TABLE IF NOT EXISTS contents (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER,
+    packages INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS contents_shared ON contents(packages, size);
+CREATE TABLE IF NOT EXISTS captures (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (package_id, kind, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS captures_value ON captures(kind, value COLLATE NOCASE);
+"""
+
+
+def read_package(location: Path) -> Tuple[Dict[str, Any], str]:
+    """(manifest, SHA-256 of the manifest bytes) of a package folder or .ppkg archive."""
+    if location.is_dir():
+        data = (location / "manifest.json").read_bytes()
+        return json.loads(data.decode("utf-8-sig")), hashlib.sha256(data).hexdigest()
+    with package_archive.PackageArchive(location) as archive:
+        return archive.read_json("manifest.json"), archive.info("manifest.json")["sha256"]
+
+
+def _hash_file(path: Path) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(HASH_BUFFER_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def find_packages(paths: Iterable[Path]) -> List[Path]:
+    """Package folders and archives among ``paths``; other folders are searched one level deep."""
+    found: List[Path] = []
+    for path in paths:
+        if path.is_dir() and not (path / "manifest.json").exists():
+            for child in sorted(path.iterdir()):
+                if (child / "manifest.json").exists() or child.suffix.lower() == ".ppkg":
+                    found.append(child)
+        else:
+            found.append(path)
+    return found
+
+
+class PackageCatalog:
+    """Connection to a catalog database; creates the schema on first use."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"{db_path} has catalog schema {version}, expected {SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def __enter__(self) -> "PackageCatalog":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ---------------------------- updates ------------------------------ #
+    def _adjust_contents(self, added: Dict[str, int], removed: Set[str]) -> None:
+        """Count one more package for each digest in ``added`` (digest -> size) and one fewer for ``removed``."""
+        self.db.executemany(
+            "INSERT INTO contents(sha256, size, packages) VALUES (?, ?, 1) "
+            "ON CONFLICT(sha256) DO UPDATE SET packages = packages + 1",
+            added.items(),
+        )
+        self.db.executemany("UPDATE contents SET packages = packages - 1 WHERE sha256 = ?", ((sha,) for sha in removed))
+        if removed:
+            self.db.execute("DELETE FROM contents WHERE packages <= 0")
+
+    def add_package(self, location: Path) -> Dict[str, Any]:
+        """Catalog (or refresh) one package. Returns what changed ({"status": "unchanged"} when nothing did)."""
+        location = location.resolve()
+        manifest, manifest_sha = read_package(location)
+        self._fill_digests(location, manifest, manifest_sha)
+        # Take the write lock before reading the row, so two builders refreshing one package serialize.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            stats = self._record(location, manifest, manifest_sha)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return stats
+
+    def add_packages(self, locations: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+        """Catalog many packages, committing every PACKAGES_PER_COMMIT of them.
+
+        Index pages dirtied by one package are mostly dirtied again by the next, so
+        grouping commits writes each page once per group instead of once per package.
+        A package whose manifest cannot be read is reported as failed and skipped.
+        """
+        pending = 0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for location in locations:
+                location = location.resolve()
+                try:
+                    manifest, manifest_sha = read_package(location)
+                except (OSError, ValueError, KeyError) as exc:
+                    yield {"status": "failed", "location": str(location), "error": str(exc)}
+                    continue
+                self._fill_digests(location, manifest, manifest_sha)
+                yield self._record(location, manifest, manifest_sha)
+                pending += 1
+                if pending >= PACKAGES_PER_COMMIT:
+                    self.db.execute("COMMIT")
+                    self.db.execute("BEGIN IMMEDIATE")
+                    pending = 0
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _fill_digests(self, location: Path, manifest: Dict[str, Any], manifest_sha: str) -> None:
+        """Fill in the SHA-256 of index entries that carry none, so "find" and "shared" see them.
+
+        Files packaged with --link-mode clone/hardlink are not hashed by the packager. An
+        entry whose size and mtime match the catalog's row reuses that digest; the rest
+        are hashed from the package folder, or taken from the member index of an archive.
+        Nothing is hashed when the manifest has not changed since it was last cataloged.
+        """
+        files: Dict[str, Dict[str, Any]] = manifest.get("files") or {}
+        missing = [name for name, entry in files.items() if not entry.get("sha256")]
+        if not missing:
+            return
+        row = self.db.execute("SELECT id, manifest_sha256 FROM packages WHERE location = ?", (str(location),)).fetchone()
+        if row and row[1] == manifest_sha:
+            return
+        if row:
+            known = {
+                path: (size, mtime_ns, sha)
+                for path, size, mtime_ns, sha in self.db.execute(
+                    "SELECT path, size, mtime_ns, sha256 FROM files WHERE package_id = ? AND sha256 IS NOT NULL",
+                    (row[0],),
+                )
+            }
+            pending = []
+            for name in missing:
+                cached = known.get(name)
+                if cached and cached[:2] == (files[name].get("size"), files[name].get("mtime_ns")):
+                    files[name]["sha256"] = cached[2]
+                else:
+                    pending.append(name)
+            missing = pending
+        if location.is_dir():
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                paths = [location.joinpath(*name.split("/")) for name in missing]
+                for name, digest in zip(missing, pool.map(_hash_file, paths)):
+                    files[name]["sha256"] = digest
+        else:
+            with package_archive.PackageArchive(location) as archive:
+                for name in missing:
+                    if name in archive.members:
+                        files[name]["sha256"] = archive.members[name].get("sha256")
+
+    def _record(self, location: Path, manifest: Dict[str, Any], manifest_sha: str) -> Dict[str, Any]:
+        """Bring the rows of one package in line with its manifest. Runs inside the caller's transaction."""
+        payload = manifest.get("payload", {})
+        files: Dict[str, Dict[str, Any]] = manifest.get("files") or {}
+        row = self.db.execute("SELECT id, manifest_sha256 FROM packages WHERE location = ?", (str(location),)).fetchone()
+        if row and row[1] == manifest_sha:
+            return {"status": "unchanged", "location": str(location)}
+        stats = {"status": "updated" if row else "added", "location": str(location), "added": 0, "changed": 0, "removed": 0}
+        if row:
+            package_id = row[0]
+            old = {
+                path: (size, mtime_ns, sha)
+                for path, size, mtime_ns, sha in self.db.execute(
+                    "SELECT path, size, mtime_ns, sha256 FROM files WHERE package_id = ?", (package_id,)
+                )
+            }
+        else:
+            package_id = self.db.execute("INSERT INTO packages(location) VALUES (?)", (str(location),)).lastrowid
+            old = {}
+        new = {path: (entry.get("size"), entry.get("mtime_ns"), entry.get("sha256")) for path, entry in files.items()}
+        removed = [path for path in old if path not in new]
+        upserts = [(path, values) for path, values in new.items() if old.get(path) != values]
+        stats["removed"] = len(removed)
+        stats["changed"] = sum(1 for path, _ in upserts if path in old)
+        stats["added"] = len(upserts) - stats["changed"]
+        self.db.executemany(
+            "DELETE FROM files WHERE package_id = ? AND path = ?", ((package_id, path) for path in removed)
+        )
+        self.db.executemany(
+            "INSERT INTO files(package_id, path, name, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(package_id, path) DO UPDATE SET size = excluded.size, "
+            "mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256",
+            ((package_id, path, path.rsplit("/", 1)[-1].lower(), *values) for path, values in upserts),
+        )
+        old_digests = {values[2] for values in old.values() if values[2]}
+        new_digests = {values[2]: values[0] for values in new.values() if values[2]}
+        self._adjust_contents(
+            {sha: size for sha, size in new_digests.items() if sha not in old_digests},
+            old_digests - new_digests.keys(),
+        )
+        self.db.execute("DELETE FROM captures WHERE package_id = ?", (package_id,))
+        self.db.executemany(
+            "INSERT OR IGNORE INTO captures(package_id, kind, value) VALUES (?, ?, ?)",
+            ((package_id, kind, value) for key, kind in CAPTURE_KINDS.items() for value in payload.get(key, [])),
+        )
+        self.db.execute(
+            "UPDATE packages SET app_name = ?, generated_at = ?, manifest_sha256 = ?, file_count = ?, "
+            "total_bytes = ?, cataloged_at = ? WHERE id = ?",
+            (
+                payload.get("app_name"),
+                manifest.get("generated_at"),
+                manifest_sha,
+                len(files),
+                sum(entry.get("size") or 0 for entry in files.values()),
+                datetime.utcnow().isoformat() + "Z",
+                package_id,
+            ),
+        )
+        return stats
+
+    def remove_package(self, location: str) -> bool:
+        row = self.db.execute("SELECT id FROM packages WHERE location = ?", (location,)).fetchone()
+        if row is None:
+            return False
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            digests = {sha for (sha,) in self.db.execute("SELECT DISTINCT sha256 FROM files WHERE package_id = ? AND sha256 IS NOT NULL", row)}
+            self._adjust_contents({}, digests)
+            self.db.execute("DELETE FROM packages WHERE id = ?", row)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return True
+
+    def prune(self) -> List[str]:
+        """Forget packages whose folder or archive no longer exists."""
+        gone = [location for (location,) in self.db.execute("SELECT location FROM packages") if not Path(location).exists()]
+        for location in gone:
+            self.remove_package(location)
+        return gone
+
+    # ---------------------------- queries ------------------------------ #
+    def find(self, query: str, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """(app, location, path, size, sha256) of files matching a SHA-256, a file name or a name glob."""
+        if _SHA256.match(query):
+            where, value = "f.sha256 = ?", query.lower()
+        elif any(char in query for char in "*?["):
+            where, value = "f.name GLOB ?", query.lower()
+        else:
+            where, value = "f.name = ?", query.lower()
+        return self.db.execute(
+            "SELECT p.app_name, p.location, f.path, f.size, f.sha256 FROM files f JOIN packages p ON p.id = f.package_id "
+            f"WHERE {where} ORDER BY p.app_name, f.path LIMIT ?",
+            (value, limit),
+        ).fetchall()
+
+    def find_capture(self, kind: str, value: str, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, str, str]]:
+        """(app, location, value) of packages with a registry key/service/task equal to ``value`` (case-insensitive)."""
+        return self.db.execute(
+            "SELECT p.app_name, p.location, c.value FROM captures c JOIN packages p ON p.id = c.package_id "
+            "WHERE c.kind = ? AND c.value = ? COLLATE NOCASE ORDER BY p.app_name LIMIT ?",
+            (kind, value, limit),
+        ).fetchall()
+
+    def largest(self, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, str, int, int]]:
+        return self.db.execute(
+            "SELECT app_name, location, file_count, total_bytes FROM packages ORDER BY total_bytes DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def shared(self, min_size: int = 0, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """Contents found in more than one package, largest savings first, with where they occur."""
+        rows = self.db.execute(
+            "SELECT sha256, size, packages FROM contents WHERE packages > 1 AND size >= ? "
+            "ORDER BY size * (packages - 1) DESC LIMIT ?",
+            (min_size, limit),
+        ).fetchall()
+        shared = []
+        for sha, size, packages in rows:
+            where = self.db.execute(
+                "SELECT p.app_name, f.path FROM files f JOIN packages p ON p.id = f.package_id WHERE f.sha256 = ? "
+                "ORDER BY p.app_name LIMIT 5",
+                (sha,),
+            ).fetchall()
+            shared.append({"sha256": sha, "size": size, "packages": packages, "examples": where})
+        return shared
+
+    def stats(self) -> Dict[str, int]:
+        packages, files, total = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(file_count), 0), COALESCE(SUM(total_bytes), 0) FROM packages"
+        ).fetchone()
+        unique, unique_bytes = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM contents").fetchone()
+        return {"packages": packages, "files": files, "bytes": total, "unique_contents": unique, "unique_bytes": unique_bytes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query and update the SQLite catalog of portable packages.")
+    parser.add_argument("db", type=Path, help="Catalog database (created if missing).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Catalog package folders/archives (or folders containing them).")
+    add.add_argument("packages", type=Path, nargs="+")
+    remove = sub.add_parser("remove", help="Forget a package.")
+    remove.add_argument("location")
+    sub.add_parser("prune", help="Forget packages that no longer exist on disk.")
+    find = sub.add_parser("find", help="Packages containing a file (name, glob such as *.dll, or SHA-256).")
+    find.add_argument("query")
+    find.add_argument("--kind", choices=sorted(CAPTURE_KINDS.values()), help="Search registry keys, services or tasks instead.")
+    find.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    largest = sub.add_parser("largest", help="Largest packages.")
+    largest.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    shared = sub.add_parser("shared", help="Identical files stored in several packages.")
+    shared.add_argument("--min-size", default="0", help="Ignore files smaller than this (e.g. 1MB).")
+    shared.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    sub.add_parser("stats", help="Catalog totals.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        with PackageCatalog(args.db) as catalog:
+            if args.command == "add":
+                for result in catalog.add_packages(find_packages(args.packages)):
+                    if result["status"] == "failed":
+                        print(f"[error] {result['location']}: {result['error']}", file=sys.stderr)
+                    elif result["status"] == "unchanged":
+                        print(f"[catalog] {result['location']}: unchanged")
+                    else:
+                        print(
+                            f"[catalog] {result['location']}: {result['status']} "
+                            f"(+{result['added']} ~{result['changed']} -{result['removed']} files)"
+                        )
+            elif args.command == "remove":
+                if not catalog.remove_package(args.location):
+                    raise ValueError(f"'{args.location}' is not in the catalog")
+                print(f"[catalog] removed {args.location}")
+            elif args.command == "prune":
+                for location in catalog.prune():
+                    print(f"[catalog] removed {location}")
+            elif args.command == "find":
+                if args.kind:
+                    for app, location, value in catalog.find_capture(args.kind, args.query, args.limit):
+                        print(f"{app}\t{location}\t{value}")
+                else:
+                    for app, location, path, size, sha in catalog.find(args.query, args.limit):
+                        print(f"{app}\t{location}\t{path}\t{size}\t{sha or '-'}")
+            elif args.command == "largest":
+                for app, location, count, total in catalog.largest(args.limit):
+                    print(f"{total:>15,} bytes  {count:>8} files  {app}  ({location})")
+            elif args.command == "shared":
+                for item in catalog.shared(package_rules.parse_size(args.min_size), args.limit):
+                    print(f"{item['size']:>15,} bytes x{item['packages']}  {item['sha256']}")
+                    for app, path in item["examples"]:
+                        print(f"    {app}: {path}")
+            else:
+                for key, value in catalog.stats().items():
+                    print(f"{key}: {value}")
+    except (OSError, ValueError, KeyError, sqlite3.Error) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[done] {args.command} in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
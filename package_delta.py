@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Build and apply binary deltas between two versions of a portable package.
+
+Usage:
+    python package_delta.py create ProtonPass_1.32 ProtonPass_1.33 --output ProtonPass_1.32-1.33.delta
+    python package_delta.py show ProtonPass_1.32-1.33.delta
+    python package_delta.py apply ProtonPass_1.32 ProtonPass_1.32-1.33.delta --output ProtonPass_1.33
+
+create compares the manifests of an old and a new package folder. Files whose
+content already exists in the old package (same path, or moved, e.g. into a new
+app-<version> folder) are only referenced. Changed files are matched against
+the closest old file (same path, same path with version numbers ignored, or
+same file name) and encoded rsync-style: the old file is cut into blocks
+indexed by an Adler-32 rolling checksum plus a BLAKE2 digest, the new file is
+scanned byte by byte for those blocks, and the delta stores block references
+plus zlib-compressed literal bytes. Files with no usable base are stored
+compressed. Encoding runs on a process pool, one file per task.
+
+apply rebuilds the new package next to the old one on a thread pool and checks
+the size and SHA-256 of every file it writes against the new manifest, so a
+wrong or modified old package is reported instead of silently producing a
+broken one. The delta folder can be packed with package_archive.py for
+shipping.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import package_archive
+import package_restore
+import portable_packager
+
+DELTA_FORMAT = 1
+DELTA_NAME = "delta.json"
+DELTA_MAGIC = b"PPDELTA1"
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_APPLY_WORKERS = portable_packager.DEFAULT_COPY_WORKERS
+MIN_BLOCK_SIZE = 2048
+MAX_BLOCK_SIZE = 64 * 1024
+# Files smaller than this are stored whole; a block index would not pay for itself.
+MIN_PATCH_SIZE = 16 * 1024
+# Literal runs are split so apply never holds more than this much of one in memory.
+MAX_LITERAL = 1024 * 1024
+COMPRESS_LEVEL = 6
+ADLER_MOD = 65521
+OP_COPY = b"C"
+OP_LITERAL = b"L"
+COPY = struct.Struct("<QQ")
+LENGTH = struct.Struct("<Q")
+_VERSION = re.compile(r"\d+(?:\.\d+)+")
+
+Op = Union[Tuple[str, int, int], Tuple[str, bytes]]
+
+
+def block_size_for(size: int) -> int:
+    """Block size for a base file of ``size`` bytes: about sqrt(size), like rsync, in whole KiB."""
+    block = -(-math.isqrt(max(1, size)) // 1024) * 1024
+    return min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, block))
+
+
+# ------------------------------ Encoding ------------------------------- #
+def _strong(block: Union[bytes, memoryview]) -> bytes:
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def block_signature(base: bytes, block: int) -> Dict[int, List[Tuple[int, bytes]]]:
+    """Adler-32 of every whole block of ``base`` -> [(offset, strong digest)]."""
+    view = memoryview(base)
+    table: Dict[int, List[Tuple[int, bytes]]] = {}
+    for offset in range(0, len(base) - block + 1, block):
+        chunk = view[offset : offset + block]
+        table.setdefault(zlib.adler32(chunk), []).append((offset, _strong(chunk)))
+    return table
+
+
+def _find(candidates: List[Tuple[int, bytes]], base: bytes, view: memoryview, pos: int, block: int) -> Optional[int]:
+    strong = None
+    for offset, digest in candidates:
+        strong = strong or _strong(view[pos : pos + block])
+        if digest == strong and base[offset : offset + block] == view[pos : pos + block]:
+            return offset
+    return None
+
+
+def diff_ops(base: bytes, target: bytes, block: int) -> Iterator[Op]:
+    """Yield ("copy", base offset, length) and ("literal", data) ops that rebuild ``target`` from ``base``.
+
+    At each position the Adler-32 of the next block is looked up in the base's
+    block index; a hit (confirmed by digest and bytes) is copied and the scan
+    jumps a whole block, otherwise the checksum is rolled forward one byte at a
+    time until a block matches again. Unchanged regions therefore cost one C
+    checksum per block, and only changed regions are walked byte by byte.
+    """
+    table = block_signature(base, block)
+    view = memoryview(target)
+    size = len(target)
+    pos = literal_start = 0
+    copy_offset = copy_length = 0
+    lookup = table.get
+    # What leaving the window takes off the second Adler-32 sum (plus the 1 the first sum starts at).
+    outgoing = [(block * byte + 1) % ADLER_MOD for byte in range(256)]
+
+    def literal(end: int) -> Iterator[Op]:
+        for start in range(literal_start, end, MAX_LITERAL):
+            yield ("literal", bytes(view[start : min(end, start + MAX_LITERAL)]))
+
+    while table and pos + block <= size:
+        weak = zlib.adler32(view[pos : pos + block])
+        candidates = lookup(weak)
+        match = _find(candidates, base, view, pos, block) if candidates else None
+        if match is None:
+            a, b = weak & 0xFFFF, weak >> 16
+            start = pos
+            for pos, out, new in zip(range(start + 1, size - block + 1), view[start : size - block], view[start + block :]):
+                a = (a - out + new) % ADLER_MOD
+                b = (b - outgoing[out] + a) % ADLER_MOD
+                if (b << 16 | a) in table:
+                    match = _find(table[b << 16 | a], base, view, pos, block)
+                    if match is not None:
+                        break
+            if match is None:
+                break
+        if literal_start < pos:
+            if copy_length:
+                yield ("copy", copy_offset, copy_length)
+                copy_length = 0
+            yield from literal(pos)
+        if copy_length and copy_offset + copy_length == match:
+            copy_length += block
+        else:
+            if copy_length:
+                yield ("copy", copy_offset, copy_length)
+            copy_offset, copy_length = match, block
+        pos += block
+        literal_start = pos
+    if copy_length:
+        yield ("copy", copy_offset, copy_length)
+    yield from literal(size)
+
+
+def encode_patch(base_path: str, target_path: str, out_path: str, block: int = 0) -> Dict[str, int]:
+    """Write the compressed delta that turns ``base_path`` into ``target_path``. Runs in a worker process."""
+    base = Path(base_path).read_bytes()
+    target = Path(target_path).read_bytes()
+    block = block or block_size_for(len(base))
+    copied = literal = 0
+    compressor = zlib.compressobj(COMPRESS_LEVEL)
+    partial = Path(out_path + ".partial")
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    with partial.open("wb") as out:
+        out.write(compressor.compress(DELTA_MAGIC))
+        for op in diff_ops(base, target, block):
+            if op[0] == "copy":
+                copied += op[2]
+                out.write(compressor.compress(OP_COPY + COPY.pack(op[1], op[2])))
+            else:
+                literal += len(op[1])
+                out.write(compressor.compress(OP_LITERAL + LENGTH.pack(len(op[1]))))
+                out.write(compressor.compress(op[1]))
+        out.write(compressor.flush())
+    os.replace(partial, out_path)
+    return {"block": block, "copied": copied, "literal": literal, "delta_bytes": Path(out_path).stat().st_size}
+
+
+def encode_whole(target_path: str, out_path: str) -> Dict[str, int]:
+    """Store ``target_path`` zlib-compressed. Runs in a worker process."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL)
+    partial = Path(out_path + ".partial")
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    literal = 0
+    with open(target_path, "rb") as src, partial.open("wb") as out:
+        for chunk in iter(lambda: src.read(portable_packager.COPY_BUFFER_SIZE), b""):
+            literal += len(chunk)
+            out.write(compressor.compress(chunk))
+        out.write(compressor.flush())
+    os.replace(partial, out_path)
+    return {"copied": 0, "literal": literal, "delta_bytes": Path(out_path).stat().st_size}
+
+
+# ------------------------------ Planning ------------------------------- #
+def _package_files(source: package_restore.DirectorySource, workers: int) -> Dict[str, Dict[str, Any]]:
+    """The manifest index plus the package's other files, with every SHA-256 filled in.
+
+    Entries copied by reflink or kernel copy carry no digest; those are hashed here.
+    """
+    files = {name: dict(entry) for name, entry in (source.manifest.get("files") or {}).items()}
+    for path in sorted(source.path.rglob("*")):
+        name = path.relative_to(source.path).as_posix()
+        if path.is_file() and name not in files and name != "manifest.json":
+            if name == portable_packager.JOURNAL_NAME or name.endswith(".partial"):
+                continue
+            stat = path.stat()
+            files[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "extra": True}
+    missing = [name for name, entry in files.items() if not entry.get("sha256")]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            paths = [source.file_path(name, files[name]) for name in missing]
+            for name, digest in zip(missing, pool.map(portable_packager.hash_file, paths)):
+                files[name]["sha256"] = digest
+    return files
+
+
+def _version_key(name: str) -> str:
+    return _VERSION.sub("#", name.lower())
+
+
+def choose_base(name: str, old: Dict[str, Dict[str, Any]], by_version: Dict[str, str], by_file: Dict[str, List[str]], size: int) -> Optional[str]:
+    """Old file to diff ``name`` against: same path, same path ignoring version numbers, or same file name."""
+    if name in old:
+        return name
+    base = by_version.get(_version_key(name))
+    if base:
+        return base
+    candidates = by_file.get(name.rsplit("/", 1)[-1].lower())
+    if candidates:
+        return min(candidates, key=lambda candidate: abs(old[candidate]["size"] - size))
+    return None
+
+
+def plan_delta(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Pick an operation (keep, copy, patch or add) for every file of the new package."""
+    by_digest: Dict[str, str] = {}
+    by_version: Dict[str, str] = {}
+    by_file: Dict[str, List[str]] = {}
+    for name, entry in old.items():
+        by_digest.setdefault(entry["sha256"], name)
+        by_version.setdefault(_version_key(name), name)
+        by_file.setdefault(name.rsplit("/", 1)[-1].lower(), []).append(name)
+    plan: Dict[str, Dict[str, Any]] = {}
+    for name, entry in new.items():
+        record = {key: entry[key] for key in ("size", "sha256", "mtime_ns") if key in entry}
+        if name in old and old[name]["sha256"] == entry["sha256"]:
+            record["op"] = "keep"
+        elif entry["sha256"] in by_digest:
+            record.update(op="copy", source=by_digest[entry["sha256"]])
+        else:
+            base = choose_base(name, old, by_version, by_file, entry["size"])
+            if base and entry["size"] >= MIN_PATCH_SIZE and old[base]["size"] >= MIN_PATCH_SIZE:
+                record.update(op="patch", base=base, data=f"patches/{entry['sha256']}.delta")
+            else:
+                record.update(op="add", data=f"data/{entry['sha256']}.z")
+        if entry.get("extra"):
+            record["extra"] = True
+        plan[name] = record
+    return plan
+
+
+def create_delta(
+    old_dir: Path,
+    new_dir: Path,
+    output: Path,
+    workers: int = DEFAULT_WORKERS,
+    block_size: int = 0,
+) -> Dict[str, Any]:
+    """Write a delta folder that turns package ``old_dir`` into package ``new_dir``. Returns delta.json."""
+    if output.exists() and any(output.iterdir()):
+        raise FileExistsError(f"Output directory '{output}' is not empty.")
+    old_source = package_restore.DirectorySource(old_dir)
+    new_source = package_restore.DirectorySource(new_dir)
+    print(f"[delta] Indexing {old_dir} and {new_dir}")
+    old_files = _package_files(old_source, workers)
+    new_files = _package_files(new_source, workers)
+    plan = plan_delta(old_files, new_files)
+    output.mkdir(parents=True, exist_ok=True)
+
+    jobs: Dict[str, Tuple[Any, ...]] = {}
+    for name, record in plan.items():
+        if record["op"] in ("patch", "add") and record["data"] not in jobs:
+            target = str(new_source.file_path(name, new_files[name]))
+            destination = str(output / record["data"])
+            if record["op"] == "patch":
+                base = str(old_source.file_path(record["base"], old_files[record["base"]]))
+                jobs[record["data"]] = (encode_patch, base, target, destination, block_size)
+            else:
+                jobs[record["data"]] = (encode_whole, target, destination)
+    sizes = {record["data"]: record["size"] for record in plan.values() if record.get("data")}
+    results: Dict[str, Dict[str, int]] = {}
+    # Biggest files first so one large binary does not start last and run alone.
+    order = sorted(jobs, key=lambda data: -sizes[data])
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(*jobs[data]): data for data in order}
+        for future in futures:
+            data = futures[future]
+            results[data] = future.result()
+            print(f"[delta] {data}: {results[data]['delta_bytes']} bytes")
+    for record in plan.values():
+        if record.get("data"):
+            record.update(results[record["data"]])
+
+    stats = summarize_plan(plan)
+    stats["delta_bytes"] = sum(result["delta_bytes"] for result in results.values())
+    delta = {
+        "format": DELTA_FORMAT,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "old": {
+            "app_name": old_source.manifest.get("payload", {}).get("app_name"),
+            "generated_at": old_source.manifest.get("generated_at"),
+        },
+        "manifest": new_source.manifest,
+        "files": plan,
+        "removed": sorted(name for name in old_files if name not in new_files),
+        "stats": stats,
+    }
+    with (output / DELTA_NAME).open("w", encoding="utf-8") as handle:
+        json.dump(delta, handle, indent=2)
+    return delta
+
+
+def summarize_plan(plan: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"files": len(plan), "bytes": 0}
+    for op in ("keep", "copy", "patch", "add"):
+        stats[op] = 0
+    for record in plan.values():
+        stats[record["op"]] += 1
+        stats["bytes"] += record.get("size", 0)
+    return stats
+
+
+# ------------------------------ Applying ------------------------------- #
+class _DeltaReader:
+    """Exact-length reads from a zlib-compressed delta stream."""
+
+    def __init__(self, handle: BinaryIO) -> None:
+        self._handle = handle
+        self._decompressor = zlib.decompressobj()
+        self._buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = self._handle.read(portable_packager.COPY_BUFFER_SIZE)
+            if not chunk:
+                self._buffer += self._decompressor.flush()
+                break
+            self._buffer += self._decompressor.decompress(chunk)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _patched_chunks(base: Path, delta: Path) -> Iterator[bytes]:
+    with base.open("rb") as old, delta.open("rb") as handle:
+        reader = _DeltaReader(handle)
+        if reader.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+            raise ValueError(f"{delta} is not a package delta")
+        while True:
+            op = reader.read(1)
+            if not op:
+                return
+            if op == OP_COPY:
+                offset, length = COPY.unpack(reader.read(COPY.size))
+                old.seek(offset)
+                while length:
+                    data = old.read(min(length, portable_packager.COPY_BUFFER_SIZE))
+                    if not data:
+                        raise ValueError(f"{base} is shorter than the file the delta was made against")
+                    length -= len(data)
+                    yield data
+            elif op == OP_LITERAL:
+                (length,) = LENGTH.unpack(reader.read(LENGTH.size))
+                yield reader.read(length)
+            else:
+                raise ValueError(f"{delta} is corrupt (unknown op {op!r})")
+
+
+def _whole_chunks(data: Path) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj()
+    with data.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(portable_packager.COPY_BUFFER_SIZE), b""):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+def _plain_chunks(path: Path) -> Iterator[bytes]:
+    with path.open("rb") as handle:
+        yield from iter(lambda: handle.read(portable_packager.COPY_BUFFER_SIZE), b"")
+
+
+def apply_file(
+    old: package_restore.DirectorySource,
+    delta_dir: Path,
+    output: Path,
+    name: str,
+    record: Dict[str, Any],
+    old_files: Dict[str, Dict[str, Any]],
+) -> None:
+    """Rebuild one file of the new package and check it against the new manifest."""
+    # Every name comes from delta.json, which also carries the expected digests: only
+    # member_path keeps a crafted "../" name from reading or writing outside these folders.
+    destination = package_archive.member_path(output, name)
+    op = record["op"]
+    if op in ("keep", "copy"):
+        source = record.get("source", name)
+        chunks = _plain_chunks(old.file_path(source, old_files.get(source, {})))
+    elif op == "patch":
+        base = old.file_path(record["base"], old_files.get(record["base"], {}))
+        chunks = _patched_chunks(base, package_archive.member_path(delta_dir, record["data"]))
+    else:
+        chunks = _whole_chunks(package_archive.member_path(delta_dir, record["data"]))
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(destination.name + ".partial")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with partial.open("wb") as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        if size != record["size"] or digest.hexdigest() != record["sha256"]:
+            base = record.get("base") or record.get("source")
+            hint = f"; old file '{base}' differs from the one the delta was made against" if base else ""
+            raise ValueError(f"result does not match the new manifest{hint}")
+        if record.get("mtime_ns") is not None:
+            os.utime(partial, ns=(record["mtime_ns"], record["mtime_ns"]))
+        os.replace(partial, destination)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def new_manifest(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """The new package's manifest as it applies to the rebuilt folder: every file is a real copy."""
+    manifest = dict(delta["manifest"])
+    manifest.pop("blob_store", None)
+    if "files" in manifest:
+        files = {}
+        for name, entry in manifest["files"].items():
+            entry = {key: value for key, value in entry.items() if key != "link"}
+            entry["sha256"] = delta["files"][name]["sha256"]
+            if "method" in entry:
+                entry["method"] = "buffered"
+            files[name] = entry
+        manifest["files"] = files
+    return manifest
+
+
+def apply_delta(
+    old_dir: Path,
+    delta_dir: Path,
+    output: Path,
+    workers: int = DEFAULT_APPLY_WORKERS,
+) -> Dict[str, Any]:
+    """Rebuild the new package in ``output`` from ``old_dir`` and the delta. Failures are collected."""
+    if output.exists() and any(output.iterdir()):
+        raise FileExistsError(f"Output directory '{output}' is not empty.")
+    with (delta_dir / DELTA_NAME).open("r", encoding="utf-8") as handle:
+        delta = json.load(handle)
+    if delta.get("format") != DELTA_FORMAT:
+        raise ValueError(f"Unsupported delta format {delta.get('format')} in {delta_dir}")
+    old = package_restore.DirectorySource(old_dir)
+    old_files = old.manifest.get("files") or {}
+    output.mkdir(parents=True, exist_ok=True)
+    report: Dict[str, Any] = {"files": 0, "bytes": 0, "failed": []}
+    workers = max(1, workers)
+    pending: Set[Future[None]] = set()
+    names: Dict[Future[None], str] = {}
+
+    def collect(done: Set[Future[None]]) -> None:
+        for future in done:
+            name = names.pop(future)
+            try:
+                future.result()
+            except (OSError, ValueError) as exc:
+                report["failed"].append({"file": name, "error": str(exc)})
+                print(f"[error] {name}: {exc}", file=sys.stderr)
+                continue
+            report["files"] += 1
+            report["bytes"] += delta["files"][name]["size"]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, record in delta["files"].items():
+            future = pool.submit(apply_file, old, delta_dir, output, name, record, old_files)
+            names[future] = name
+            pending.add(future)
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(pending)
+        collect(done)
+    if not report["failed"]:
+        with (output / "manifest.json").open("w", encoding="utf-8") as handle:
+            json.dump(new_manifest(delta), handle, indent=2)
+    return report
+
+
+def print_stats(delta: Dict[str, Any]) -> None:
+    stats = delta["stats"]
+    new_bytes = stats["bytes"]
+    print(
+        f"[delta] {stats['files']} files ({new_bytes} bytes): {stats['keep']} unchanged, {stats['copy']} moved, "
+        f"{stats['patch']} patched, {stats['add']} stored; {len(delta['removed'])} removed"
+    )
+    ratio = stats["delta_bytes"] / new_bytes if new_bytes else 0.0
+    print(f"[delta] delta size {stats['delta_bytes']} bytes ({ratio:.1%} of the new package)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Binary deltas between two versions of a portable package.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="Build a delta from an old and a new package folder.")
+    create.add_argument("old", type=Path)
+    create.add_argument("new", type=Path)
+    create.add_argument("--output", type=Path, required=True, help="Delta folder to create.")
+    create.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Encoding processes (default: {DEFAULT_WORKERS}).")
+    create.add_argument("--block-size", type=int, default=0, help="Match block size in bytes (default: about sqrt of each file).")
+    apply = sub.add_parser("apply", help="Rebuild the new package from the old one and a delta.")
+    apply.add_argument("old", type=Path)
+    apply.add_argument("delta", type=Path)
+    apply.add_argument("--output", type=Path, required=True, help="Folder for the rebuilt package.")
+    apply.add_argument(
+        "--workers", type=int, default=DEFAULT_APPLY_WORKERS, help=f"Parallel file writes (default: {DEFAULT_APPLY_WORKERS})."
+    )
+    show = sub.add_parser("show", help="Summarize a delta.")
+    show.add_argument("delta", type=Path)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        if args.command == "create":
+            delta = create_delta(args.old, args.new, args.output, workers=args.workers, block_size=args.block_size)
+            print_stats(delta)
+        elif args.command == "apply":
+            report = apply_delta(args.old, args.delta, args.output, workers=args.workers)
+            if report["failed"]:
+                print(f"[error] {len(report['failed'])} files could not be rebuilt; manifest.json not written", file=sys.stderr)
+                sys.exit(1)
+            print(f"[delta] Rebuilt {report['files']} files ({report['bytes']} bytes) in {args.output}, all verified")
+        else:
+            with (args.delta / DELTA_NAME).open("r", encoding="utf-8") as handle:
+                print_stats(json.load(handle))
+            return
+    except (OSError, ValueError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[done] {args.command} finished in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
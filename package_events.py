@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Structured progress events and per-stage timing for portable_packager.
+
+Usage:
+    python portable_packager.py config.json --output PortableRoot --events run.jsonl --profile run.prof
+    python package_events.py run.jsonl
+
+Every stage (validation, each capture, each directory copy, manifest, archive...)
+emits ``stage_start``/``stage_end`` events with duration, files, bytes and
+throughput; copied files emit ``file`` events and failed attempts ``file_retry``.
+Events are plain dicts sent to any number of sinks: a JSONL file, stdout or a
+callback. Run as a script, this module summarises a JSONL event log per stage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+EventSink = Callable[[Dict[str, Any]], None]
+PROFILE_TOP_N = 25
+
+
+class JsonlSink:
+    """Append events as JSON lines to a file ('-' writes to stdout)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._owned = str(path) != "-"
+        self._handle: TextIO = path.open("a", encoding="utf-8") if self._owned else sys.stdout
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        self._handle.write(json.dumps(event, default=str) + "\n")
+
+    def close(self) -> None:
+        if self._owned:
+            self._handle.close()
+        else:
+            self._handle.flush()
+
+
+class EventBus:
+    """Fan events out to sinks and accumulate per-stage timings.
+
+    ``emit`` is thread-safe and returns immediately when there are no sinks, so
+    per-file events cost nothing unless someone listens. Stage totals are kept
+    either way (stages are coarse) for ``breakdown()``.
+    """
+
+    def __init__(self, sinks: Iterable[EventSink] = ()) -> None:
+        self.sinks: List[EventSink] = list(sinks)
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink: EventSink) -> None:
+        self.sinks.append(sink)
+
+    def emit(self, kind: str, **fields: Any) -> None:
+        if not self.sinks:
+            return
+        event = {"event": kind, "ts": round(time.time(), 6), "thread": threading.current_thread().name, **fields}
+        with self._lock:
+            for sink in self.sinks:
+                sink(event)
+
+    @contextmanager
+    def stage(self, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Time a stage. The yielded dict's "files"/"bytes" (and any other keys) go into the end event."""
+        counters: Dict[str, Any] = {"files": 0, "bytes": 0}
+        self.emit("stage_start", stage=name, **fields)
+        started = time.perf_counter()
+        status, error = "ok", None
+        try:
+            yield counters
+        except BaseException as exc:
+            status, error = "error", str(exc)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            mib_s = counters["bytes"] / 1048576 / duration if duration > 0 else 0.0
+            with self._lock:
+                totals = self.timings.setdefault(name, {"count": 0, "seconds": 0.0, "files": 0, "bytes": 0})
+                totals["count"] += 1
+                totals["seconds"] += duration
+                totals["files"] += counters["files"]
+                totals["bytes"] += counters["bytes"]
+            extra = {"error": error} if error else {}
+            self.emit(
+                "stage_end",
+                stage=name,
+                status=status,
+                duration=round(duration, 6),
+                mib_s=round(mib_s, 2),
+                **fields,
+                **counters,
+                **extra,
+            )
+
+    def breakdown(self) -> List[str]:
+        return format_breakdown(self.timings)
+
+
+def format_breakdown(timings: Dict[str, Dict[str, float]]) -> List[str]:
+    """Render per-stage totals, slowest first. Captures overlap, so their seconds are busy time, not wall time."""
+    lines = [f"{'stage':<12} {'count':>6} {'seconds':>10} {'files':>10} {'MiB':>12} {'MiB/s':>9}"]
+    for name, totals in sorted(timings.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        mib = totals["bytes"] / 1048576
+        rate = mib / totals["seconds"] if totals["seconds"] > 0 else 0.0
+        lines.append(
+            f"{name:<12} {int(totals['count']):>6} {totals['seconds']:>10.3f} {int(totals['files']):>10} "
+            f"{mib:>12.1f} {rate:>9.1f}"
+        )
+    return lines
+
+
+@contextmanager
+def profiled(output: Optional[Path], top: int = PROFILE_TOP_N) -> Iterator[None]:
+    """Run the block under cProfile (calling thread only), dump stats to ``output`` and print the top entries."""
+    if output is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(output))
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        print(f"[profile] cProfile stats written to {output}")
+        print(report.getvalue().rstrip())
+
+
+def summarize_log(log_path: Path) -> Dict[str, Dict[str, float]]:
+    """Rebuild per-stage totals from a JSONL event log."""
+    timings: Dict[str, Dict[str, float]] = {}
+    with log_path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            event = json.loads(line)
+            if event.get("event") != "stage_end":
+                continue
+            totals = timings.setdefault(event["stage"], {"count": 0, "seconds": 0.0, "files": 0, "bytes": 0})
+            totals["count"] += 1
+            totals["seconds"] += event.get("duration", 0.0)
+            totals["files"] += event.get("files", 0)
+            totals["bytes"] += event.get("bytes", 0)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise a portable_packager JSONL event log per stage.")
+    parser.add_argument("log", type=Path, help="Event log written with portable_packager.py --events.")
+    args = parser.parse_args()
+    try:
+        timings = summarize_log(args.log)
+    except (OSError, ValueError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    for line in format_breakdown(timings):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+Restore a portable package on the target machine from its manifest.json.
+
+Usage:
+    python package_restore.py MiApp_Portable
+    python package_restore.py MiApp.ppkg --workers 16 --report restore.json
+    python package_restore.py MiApp_Portable --root /tmp/scratch --handlers record
+    python package_restore.py MiApp_Portable --map "%ProgramFiles%=D:\\Apps" --registry-map "C:\\Users\\alice=C:\\Users\\bob"
+
+Directory entries go to the location write_restore_stub() suggests
+(determine_destination_base + restore_target_suffix); listed files and
+shortcuts go back to their original paths. --root puts every location under a
+scratch folder with the usual Windows layout ("Program Files", "ProgramData",
+"Users/<user>/AppData/..."), and --map overrides single locations. Files are
+written on a thread pool, hashed while they are written and checked against
+the manifest before they replace anything; files that already match (same size
+and mtime, or same SHA-256) are left alone, so running the restore again only
+repairs what differs. Registry, service and task captures go through a handler:
+"windows" runs reg/sc/schtasks, "record" only logs what would run into
+<root>/restore_actions.jsonl, which is what makes the engine usable on Linux.
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import getpass
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+import package_archive
+import portable_packager
+import reg_snapshot
+
+DEFAULT_WORKERS = portable_packager.DEFAULT_COPY_WORKERS
+COPY_BUFFER_SIZE = portable_packager.COPY_BUFFER_SIZE
+HANDLER_NAMES = ("windows", "record")
+ACTIONS_LOG = "restore_actions.jsonl"
+# Scratch-root layout, relative to --root, for the locations packages refer to.
+ROOT_LAYOUT = {
+    "%PROGRAMFILES%": "Program Files",
+    "%PROGRAMFILES(X86)%": "Program Files (x86)",
+    "%PROGRAMDATA%": "ProgramData",
+    "%APPDATA%": "Users/{user}/AppData/Roaming",
+    "%LOCALAPPDATA%": "Users/{user}/AppData/Local",
+    "%USERPROFILE%": "Users/{user}",
+    "%PUBLIC%": "Users/Public",
+}
+_TOKEN = re.compile(r"^(%[^%]+%)[\\/]*(.*)$")
+
+
+def _join(base: Path, windows_path: str) -> Path:
+    parts = [part for part in re.split(r"[\\/]+", windows_path) if part and part != "."]
+    return base.joinpath(*parts)
+
+
+class Locations:
+    """Resolve %Variable%-based and absolute Windows paths on the target machine.
+
+    Without ``root`` the variables come from the environment (so this only works
+    on Windows unless every variable used is given in ``overrides``). With
+    ``root`` each variable maps into ROOT_LAYOUT below it and absolute paths
+    such as C:\\Tools\\x.exe become <root>/C/Tools/x.exe.
+    """
+
+    def __init__(self, root: Optional[Path] = None, overrides: Optional[Dict[str, str]] = None) -> None:
+        self.root = root
+        self.bases: Dict[str, Path] = {}
+        if root is not None:
+            user = os.environ.get("USERNAME") or getpass.getuser()
+            for token, relative in ROOT_LAYOUT.items():
+                self.bases[token] = root / relative.format(user=user)
+        for token, path in (overrides or {}).items():
+            token = token.strip().upper()
+            token = token if token.startswith("%") else f"%{token}%"
+            self.bases[token] = Path(os.path.expandvars(path))
+
+    def base(self, token: str) -> Path:
+        token = token.upper()
+        if token in self.bases:
+            return self.bases[token]
+        value = os.environ.get(token.strip("%"))
+        if value is None:
+            raise ValueError(f"Cannot resolve {token} on this machine; use --root or --map {token}=PATH")
+        return Path(value)
+
+    def resolve(self, windows_path: str) -> Path:
+        match = _TOKEN.match(windows_path.strip())
+        if match:
+            return _join(self.base(match.group(1)), match.group(2))
+        if self.root is None:
+            return Path(os.path.expandvars(windows_path))
+        drive, rest = os.path.splitdrive(windows_path) if os.name == "nt" else (windows_path[:2], windows_path[2:])
+        if len(drive) == 2 and drive[1] == ":":
+            return _join(self.root / drive[0].upper(), rest)
+        return _join(self.root, windows_path)
+
+
+class DirectorySource:
+    """A package folder. Entries kept only in the blob store ("link": "manifest") are read from it."""
+
+    def __init__(self, package_dir: Path) -> None:
+        self.path = package_dir.resolve()
+        with (self.path / "manifest.json").open("r", encoding="utf-8") as handle:
+            self.manifest: Dict[str, Any] = json.load(handle)
+        store = self.manifest.get("blob_store")
+        self._store = portable_packager.BlobStore(Path(store["root"])) if store else None
+
+    def file_path(self, name: str, entry: Dict[str, Any]) -> Path:
+        if entry.get("link") == "manifest":
+            if self._store is None:
+                raise FileNotFoundError(f"'{name}' lives in a blob store the manifest does not name")
+            return self._store.blob_path(entry["sha256"])
+        return package_archive.member_path(self.path, name)
+
+    def open(self, name: str, entry: Dict[str, Any]) -> BinaryIO:
+        return self.file_path(name, entry).open("rb")
+
+    def iter_chunks(self, name: str, entry: Dict[str, Any]) -> Iterator[bytes]:
+        with self.open(name, entry) as handle:
+            while True:
+                chunk = handle.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def list_files(self, prefix: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Files below ``prefix`` for manifests written before the per-file index existed."""
+        root = self.path / prefix
+        if not root.is_dir():
+            return
+        for relative, entry in portable_packager.iter_tree(root):
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                name = f"{prefix}/{(relative / entry.name).as_posix()}"
+                yield name, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def materialize(self, name: str) -> Path:
+        return package_archive.member_path(self.path, name)
+
+    def close(self) -> None:
+        pass
+
+
+class ArchiveSource:
+    """A .ppkg archive. Each worker thread gets its own reader, since a reader seeks a shared handle."""
+
+    def __init__(self, archive_path: Path) -> None:
+        self.path = archive_path
+        self._local = threading.local()
+        self._readers: List[package_archive.PackageArchive] = []
+        self._lock = threading.Lock()
+        self.manifest: Dict[str, Any] = self._reader().read_json("manifest.json")
+        self._scratch: Optional[tempfile.TemporaryDirectory] = None
+
+    def _reader(self) -> package_archive.PackageArchive:
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = self._local.reader = package_archive.PackageArchive(self.path)
+            with self._lock:
+                self._readers.append(reader)
+        return reader
+
+    def iter_chunks(self, name: str, entry: Dict[str, Any]) -> Iterator[bytes]:
+        return self._reader().iter_chunks(name)
+
+    def list_files(self, prefix: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        reader = self._reader()
+        for name in reader.names():
+            if name.startswith(prefix + "/"):
+                member = reader.info(name)
+                yield name, {"size": member["size"], "mtime_ns": member["mtime_ns"], "sha256": member.get("sha256")}
+
+    def materialize(self, name: str) -> Path:
+        """Extract a capture (registry/service/task file) so a handler can read it from disk."""
+        if self._scratch is None:
+            self._scratch = tempfile.TemporaryDirectory(prefix="ppkg-restore-")
+        return self._reader().extract(name, package_archive.member_path(Path(self._scratch.name), name))
+
+    def close(self) -> None:
+        for reader in self._readers:
+            reader.close()
+        if self._scratch is not None:
+            self._scratch.cleanup()
+
+
+def open_source(path: Path) -> Any:
+    return DirectorySource(path) if path.is_dir() else ArchiveSource(path)
+
+
+# ------------------------------ Handlers ------------------------------- #
+class RestoreHandlers(abc.ABC):
+    """Applies the registry, service and scheduled-task captures of a package.
+
+    Subclass it to restore them some other way; each method receives the
+    original name and the captured file on disk.
+    """
+
+    @abc.abstractmethod
+    def registry(self, key: str, reg_file: Path) -> None:
+        """Import the .reg snapshot of ``key``."""
+
+    @abc.abstractmethod
+    def service(self, name: str, capture: Path) -> None:
+        """Recreate service ``name`` from its `sc qc` capture."""
+
+    @abc.abstractmethod
+    def task(self, name: str, xml_file: Path) -> None:
+        """Register scheduled task ``name`` from its exported XML."""
+
+
+def parse_service_capture(text: str) -> Dict[str, str]:
+    """Fields of an `sc qc` + `sc qdescription` capture, keyed like sc prints them (TYPE, START_TYPE...)."""
+    fields: Dict[str, str] = {}
+    for line in text.splitlines():
+        name, sep, value = line.partition(":")
+        name = name.strip()
+        if sep and name and name == name.upper() and " " not in name:
+            fields[name] = value.strip()
+    return fields
+
+
+SERVICE_TYPES = {"1": "kernel", "2": "filesys", "10": "own", "20": "share", "110": "interact", "120": "interact"}
+START_TYPES = {"0": "boot", "1": "system", "2": "auto", "3": "demand", "4": "disabled"}
+
+
+class WindowsHandlers(RestoreHandlers):
+    """reg import, sc create/config and schtasks /create on the local machine."""
+
+    def __init__(
+        self,
+        runner: Optional[portable_packager.CommandRunner] = None,
+        dry_run: bool = False,
+    ) -> None:
+        self.runner = runner
+        self.dry_run = dry_run
+
+    def _run(self, cmd: List[str]) -> None:
+        portable_packager.run_command(cmd, dry_run=self.dry_run, runner=self.runner)
+
+    def registry(self, key: str, reg_file: Path) -> None:
+        self._run(["reg", "import", str(reg_file)])
+
+    def service(self, name: str, capture: Path) -> None:
+        fields = parse_service_capture(capture.read_text(encoding="utf-8", errors="replace"))
+        if "BINARY_PATH_NAME" not in fields:
+            raise ValueError(f"{capture} does not look like an `sc qc` capture")
+        settings = [name, "binPath=", fields["BINARY_PATH_NAME"]]
+        code = fields.get("TYPE", "").split()[:1]
+        if code and code[0] in SERVICE_TYPES:
+            settings += ["type=", SERVICE_TYPES[code[0]]]
+        code = fields.get("START_TYPE", "").split()[:1]
+        if code and code[0] in START_TYPES:
+            settings += ["start=", START_TYPES[code[0]]]
+        if fields.get("DISPLAY_NAME"):
+            settings += ["DisplayName=", fields["DISPLAY_NAME"]]
+        if fields.get("SERVICE_START_NAME") and fields["SERVICE_START_NAME"] != "LocalSystem":
+            settings += ["obj=", fields["SERVICE_START_NAME"]]
+        if self.dry_run:
+            # Even `sc query` would run on the target machine; show both ways this step can go.
+            print(f"[dry-run] service {name}: config if it already exists, create otherwise")
+            verbs = ["config", "create"]
+        else:
+            exists = (self.runner or portable_packager.subprocess_runner)(["sc.exe", "query", name]).returncode == 0
+            verbs = ["config" if exists else "create"]
+        for verb in verbs:
+            self._run(["sc.exe", verb, *settings])
+        if fields.get("DESCRIPTION"):
+            self._run(["sc.exe", "description", name, fields["DESCRIPTION"]])
+
+    def task(self, name: str, xml_file: Path) -> None:
+        self._run(["schtasks", "/create", "/tn", name, "/xml", str(xml_file), "/f"])
+
+
+class RecordingHandlers(RestoreHandlers):
+    """Record each step (with the capture's SHA-256) as a JSON line instead of changing the system.
+
+    In a dry run the steps are only kept in ``actions`` and printed; the log file is not written.
+    """
+
+    def __init__(self, log_path: Path, dry_run: bool = False) -> None:
+        self.log_path = log_path
+        self.dry_run = dry_run
+        self.actions: List[Dict[str, Any]] = []
+
+    def _record(self, kind: str, name: str, path: Path) -> None:
+        action = {"kind": kind, "name": name, "file": path.name, "sha256": portable_packager.hash_file(path)}
+        self.actions.append(action)
+        if self.dry_run:
+            print(f"[record] {kind} {name} (dry run, not logged)")
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.log_path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(action) + "\n")
+        print(f"[record] {kind} {name}")
+
+    def registry(self, key: str, reg_file: Path) -> None:
+        self._record("registry", key, reg_file)
+
+    def service(self, name: str, capture: Path) -> None:
+        self._record("service", name, capture)
+
+    def task(self, name: str, xml_file: Path) -> None:
+        self._record("task", name, xml_file)
+
+
+# -------------------------------- Files -------------------------------- #
+def plan_files(source: Any, locations: Locations) -> List[Tuple[str, Dict[str, Any], Path]]:
+    """(package name, manifest entry, destination) for every file the package restores."""
+    manifest = source.manifest
+    payload = manifest.get("payload", {})
+    indexed: Dict[str, Dict[str, Any]] = manifest.get("files") or {}
+    jobs: List[Tuple[str, Dict[str, Any], Path]] = []
+
+    def files_below(prefix: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if not indexed:
+            yield from source.list_files(prefix)
+            return
+        for name, entry in indexed.items():
+            if name.startswith(prefix + "/"):
+                yield name, entry
+
+    for entry in payload.get("directories", []):
+        target = entry.get("target") or portable_packager.expand_path(entry["path"]).name
+        prefix = (Path(portable_packager.package_directory(entry)) / target).as_posix()
+        base = locations.base(portable_packager.determine_destination_base(entry))
+        destination = _join(base, portable_packager.restore_target_suffix(entry))
+        for name, file_entry in files_below(prefix):
+            # Manifest keys are untrusted: a '..' or absolute name must not land outside the target folder.
+            jobs.append((name, file_entry, package_archive.member_path(destination, name[len(prefix) + 1 :])))
+
+    for folder, key in (("ProgramFiles", "files"), ("Shortcuts", "shortcuts")):
+        for raw in payload.get(key, []):
+            name = f"{folder}/{portable_packager.expand_path(raw).name}"
+            file_entry = indexed.get(name)
+            if file_entry is None and not indexed:
+                file_entry = next((entry for found, entry in source.list_files(folder) if found == name), None)
+            if file_entry is None:
+                print(f"[restore] {name}: not in the package, skipped")
+                continue
+            jobs.append((name, file_entry, locations.resolve(raw)))
+    return jobs
+
+
+def _matches(destination: Path, entry: Dict[str, Any]) -> bool:
+    """True when ``destination`` already holds the file: same size and mtime, or same SHA-256."""
+    try:
+        stat = destination.stat()
+    except OSError:
+        return False
+    if stat.st_size != entry.get("size"):
+        return False
+    if entry.get("mtime_ns") is not None and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if not entry.get("sha256") or portable_packager.hash_file(destination) != entry["sha256"]:
+        return False
+    if entry.get("mtime_ns") is not None:
+        os.utime(destination, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+    return True
+
+
+def restore_file(source: Any, name: str, entry: Dict[str, Any], destination: Path) -> bool:
+    """Write one file unless it already matches. Returns True if it was written.
+
+    The data goes to a ``.partial`` file next to the destination and is hashed on
+    the way; only a copy whose size and SHA-256 match the manifest replaces the
+    destination.
+    """
+    if _matches(destination, entry):
+        return False
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(f"{destination.name}.{threading.get_ident()}.partial")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with partial.open("wb") as out:
+            for chunk in source.iter_chunks(name, entry):
+                digest.update(chunk)
+                out.write(chunk)
+                written += len(chunk)
+        if entry.get("size") is not None and written != entry["size"]:
+            raise ValueError(f"expected {entry['size']} bytes, package has {written}")
+        if entry.get("sha256") and digest.hexdigest() != entry["sha256"]:
+            raise ValueError("SHA-256 mismatch, the package copy is corrupt")
+        if entry.get("mtime_ns") is not None:
+            os.utime(partial, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        os.replace(partial, destination)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def restore_files(
+    source: Any,
+    jobs: List[Tuple[str, Dict[str, Any], Path]],
+    workers: int = DEFAULT_WORKERS,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Restore ``jobs`` on a bounded thread pool. Failures are collected, not raised."""
+    stats: Dict[str, Any] = {"written": 0, "written_bytes": 0, "unchanged": 0, "unchanged_bytes": 0, "failed": []}
+    if dry_run:
+        for name, entry, destination in jobs:
+            print(f"[restore] {name} -> {destination}")
+        return stats
+    workers = max(1, workers)
+    pending: Set[Future[bool]] = set()
+    sizes: Dict[Future[bool], Tuple[str, int]] = {}
+
+    def collect(done: Set[Future[bool]]) -> None:
+        for future in done:
+            name, size = sizes.pop(future)
+            try:
+                key = "written" if future.result() else "unchanged"
+            except (OSError, ValueError) as exc:
+                stats["failed"].append({"file": name, "error": str(exc)})
+                continue
+            stats[key] += 1
+            stats[f"{key}_bytes"] += size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, entry, destination in jobs:
+            future = pool.submit(restore_file, source, name, entry, destination)
+            sizes[future] = (name, entry.get("size") or 0)
+            pending.add(future)
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(pending)
+        collect(done)
+    return stats
+
+
+# ------------------------------- Restore ------------------------------- #
+def restore_captures(
+    source: Any,
+    handlers: RestoreHandlers,
+    registry_map: Optional[List[Tuple[str, str]]] = None,
+) -> List[Dict[str, Any]]:
+    """Run the registry, service and task steps in that order. Returns one result per step."""
+    payload = source.manifest.get("payload", {})
+    indexed = source.manifest.get("files") or {}
+    rewrite = reg_snapshot.profile_rewriter(registry_map) if registry_map else None
+    steps: List[Dict[str, Any]] = []
+
+    def run(kind: str, name: str, member: str, apply: Any) -> None:
+        step: Dict[str, Any] = {"kind": kind, "name": name}
+        try:
+            if indexed and member not in indexed:
+                raise FileNotFoundError(f"{member} is not in the package")
+            path = source.materialize(member)
+            if kind == "registry" and rewrite:
+                rewritten = Path(tempfile.mkdtemp(prefix="ppkg-reg-")) / path.name
+                stats = reg_snapshot.transform_snapshot(path, rewritten, exclude=(), rewrite=rewrite)
+                step["rewritten_values"] = stats["rewritten_values"]
+                try:
+                    apply(name, rewritten)
+                finally:
+                    shutil.rmtree(rewritten.parent, ignore_errors=True)
+            else:
+                apply(name, path)
+            step["status"] = "ok"
+        except (OSError, ValueError, RuntimeError) as exc:
+            step.update(status="failed", error=str(exc))
+            print(f"[error] {kind} {name}: {exc}", file=sys.stderr)
+        steps.append(step)
+
+    for key in payload.get("registry_keys", []):
+        run("registry", key, f"Registry/{portable_packager.sanitize_name(key)}.reg", handlers.registry)
+    for service in payload.get("services", []):
+        run("service", service, f"Services/{portable_packager.sanitize_name(service)}.txt", handlers.service)
+    for task in payload.get("scheduled_tasks", []):
+        run("task", task, f"Tasks/{portable_packager.sanitize_name(task.strip(chr(92) + '/'))}.xml", handlers.task)
+    return steps
+
+
+def restore_package(
+    package: Path,
+    locations: Locations,
+    handlers: RestoreHandlers,
+    workers: int = DEFAULT_WORKERS,
+    dry_run: bool = False,
+    registry_map: Optional[List[Tuple[str, str]]] = None,
+) -> Dict[str, Any]:
+    """Restore files, then registry/services/tasks, from a package folder or .ppkg archive."""
+    started = time.perf_counter()
+    source = open_source(package)
+    try:
+        app_name = source.manifest.get("payload", {}).get("app_name", "PortableApp")
+        print(f"[info] Restoring '{app_name}' from {package}")
+        jobs = plan_files(source, locations)
+        report = restore_files(source, jobs, workers=workers, dry_run=dry_run)
+        print(
+            f"[restore] {report['written']} files written ({report['written_bytes']} bytes), "
+            f"{report['unchanged']} already up to date, {len(report['failed'])} failed"
+        )
+        report["steps"] = restore_captures(source, handlers, registry_map)
+    finally:
+        source.close()
+    report["app_name"] = app_name
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def parse_pairs(values: List[str], option: str) -> List[Tuple[str, str]]:
+    pairs = []
+    for value in values:
+        old, sep, new = value.partition("=")
+        if not sep or not old or not new:
+            raise ValueError(f"Invalid {option} '{value}' (expected NAME=VALUE)")
+        pairs.append((old, new))
+    return pairs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Restore a portable package from its manifest.")
+    parser.add_argument("package", type=Path, help="Package folder or .ppkg archive.")
+    parser.add_argument("--root", type=Path, help="Restore under this folder instead of the real system locations.")
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        help="Override one location, e.g. %%ProgramFiles%%=D:\\Apps (repeatable).",
+    )
+    parser.add_argument(
+        "--handlers",
+        choices=HANDLER_NAMES,
+        help="How to apply registry/service/task captures (default: windows on Windows, record elsewhere).",
+    )
+    parser.add_argument(
+        "--registry-map",
+        action="append",
+        default=[],
+        help="Rewrite OLD=NEW paths inside .reg files before importing (repeatable).",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Parallel file writes (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be restored and run nothing.")
+    parser.add_argument("--report", type=Path, help="Write the restore report as JSON.")
+    args = parser.parse_args()
+
+    try:
+        overrides = dict(parse_pairs(args.map, "--map"))
+        registry_map = parse_pairs(args.registry_map, "--registry-map")
+        root = args.root.resolve() if args.root else None
+        locations = Locations(root, overrides)
+        handler_name = args.handlers or ("windows" if os.name == "nt" else "record")
+        if handler_name == "windows":
+            handlers: RestoreHandlers = WindowsHandlers(dry_run=args.dry_run)
+        else:
+            handlers = RecordingHandlers((root or Path.cwd()) / ACTIONS_LOG, dry_run=args.dry_run)
+        report = restore_package(
+            args.package,
+            locations,
+            handlers,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            registry_map=registry_map,
+        )
+    except (OSError, ValueError, RuntimeError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    if args.report:
+        with args.report.open("w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    failed_steps = [step for step in report["steps"] if step["status"] != "ok"]
+    for failure in report["failed"]:
+        print(f"[error] {failure['file']}: {failure['error']}", file=sys.stderr)
+    if report["failed"] or failed_steps:
+        sys.exit(1)
+    print(f"[done] Restore finished in {report['seconds']}s.")
+
+
+if __name__ == "__main__":
+    main()
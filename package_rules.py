@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Include/exclude rules for the directories of a portable package.
+
+Usage:
+    python package_rules.py config.json [--show 50]
+
+Rules live in the config, globally under "rules" and per entry under
+directories[i]["rules"] (lists are combined, the entry's "locales" replace
+the global ones):
+
+    "rules": {
+      "presets": ["electron-cache", "crash-dumps", "logs"],
+      "exclude": ["*.pdb", "Temp/", {"glob": "logs/**", "older_than_days": 30},
+                  {"regex": "\\\\.bak\\\\d*$"}, {"glob": "**", "larger_than": "2GB"}],
+      "include": [],
+      "locales": ["en-US", "es"],
+      "locale_dirs": ["locales"]
+    }
+
+Globs work as in .gitignore: a pattern without "/" matches a name at any depth,
+one with "/" is anchored at the directory root, "**" spans folders and a
+trailing "/" matches directories only. Regexes are searched in the relative
+path (always "/"-separated). Everything is case-insensitive, as on Windows.
+An excluded directory is not walked at all. With "include", only files that
+match it (or lie below a matching folder) are kept. In locale folders only
+files whose name starts with a listed locale are kept ("es" keeps es.pak and
+es-419.pak). Rules only apply to "directories"; explicitly listed files and
+shortcuts are always copied.
+
+All patterns are compiled into one regex per check, so the walk pays a single
+match per file or folder. Run as a script, this module lists what the rules
+of a config would drop from each directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+PRESETS: Dict[str, List[str]] = {
+    # Chromium/Electron disk caches, rebuilt on the next start.
+    "electron-cache": [
+        "Cache/",
+        "Code Cache/",
+        "GPUCache/",
+        "DawnCache/",
+        "DawnGraphiteCache/",
+        "DawnWebGPUCache/",
+        "GrShaderCache/",
+        "ShaderCache/",
+        # Contain a "/", so without "**/" they would only match at the directory root.
+        "**/Service Worker/CacheStorage/",
+        "**/Service Worker/ScriptCache/",
+        "blob_storage/",
+    ],
+    "crash-dumps": ["*.dmp", "*.mdmp", "Crashpad/", "CrashDumps/", "Crash Reports/"],
+    "logs": ["*.log", "*.log.[0-9]*", "*.etl", "logs/"],
+    "temp": ["*.tmp", "*.temp", "Temp/", "tmp/"],
+}
+DEFAULT_LOCALE_DIRS = ("locales",)
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "KIB": 1024, "M": 1024**2, "MB": 1024**2, "MIB": 1024**2}
+SIZE_UNITS.update({"G": 1024**3, "GB": 1024**3, "GIB": 1024**3, "T": 1024**4, "TB": 1024**4, "TIB": 1024**4})
+# How many pruned folders the manifest/plan list by name.
+PRUNED_EXAMPLES = 20
+
+
+def parse_size(value: Any) -> int:
+    """Bytes from an int or a string such as "500MB", "1.5 GiB" or "64k"."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([A-Za-z]*)\s*", str(value))
+    unit = match.group(2).upper() if match else None
+    if not match or unit not in SIZE_UNITS:
+        raise ValueError(f"Invalid size '{value}' (expected bytes or a number with KB/MB/GB/TB)")
+    return int(float(match.group(1)) * SIZE_UNITS[unit])
+
+
+def glob_to_regex(pattern: str) -> Tuple[str, bool]:
+    """Translate a .gitignore-style glob into a regex over "/"-separated relative paths.
+
+    Returns (regex, directories_only).
+    """
+    pattern = pattern.replace("\\", "/")
+    directories_only = pattern.endswith("/")
+    anchored = pattern.startswith("/") or "/" in pattern.strip("/")
+    pattern = pattern.strip("/")
+    parts: List[str] = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1 : end]
+            parts.append("[" + ("^" + body[1:] if body.startswith("!") else body).replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    body = "".join(parts)
+    return ("" if anchored else "(?:.*/)?") + body, directories_only
+
+
+def _combine(alternatives: List[str]) -> Optional[Pattern[str]]:
+    if not alternatives:
+        return None
+    return re.compile("|".join(f"(?:{alternative})" for alternative in alternatives), re.IGNORECASE | re.DOTALL)
+
+
+def _rule_regex(rule: Any) -> Tuple[str, bool]:
+    """(search regex, directories_only) for a string glob or a {"glob"|"regex": ...} rule."""
+    if isinstance(rule, str):
+        rule = {"glob": rule}
+    if "regex" in rule:
+        re.compile(rule["regex"])  # report a bad pattern with its own text
+        return rule["regex"], False
+    if "glob" not in rule:
+        raise ValueError(f"Rule {rule!r} needs a 'glob' or 'regex'")
+    regex, directories_only = glob_to_regex(rule["glob"])
+    return f"^{regex}$", directories_only
+
+
+class PathRules:
+    """Compiled include/exclude rules for one directory entry.
+
+    ``directory_reason`` and ``file_reason`` take the "/"-separated path relative
+    to the entry's root and return why it is dropped ("exclude", "include",
+    "locale", "size" or "age"), or None to keep it.
+    """
+
+    def __init__(self, spec: Dict[str, Any], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        excludes: List[Any] = []
+        for name in spec.get("presets", []):
+            if name not in PRESETS:
+                raise ValueError(f"Unknown rule preset '{name}'. Expected one of: {', '.join(PRESETS)}")
+            excludes.extend(PRESETS[name])
+        excludes.extend(spec.get("exclude", []))
+
+        plain_dirs: List[str] = []
+        plain_files: List[str] = []
+        # (regex, larger_than, older than this mtime, reason) for rules with thresholds
+        self._conditional: List[Tuple[Pattern[str], int, float, str]] = []
+        for rule in excludes:
+            regex, directories_only = _rule_regex(rule)
+            larger_than = older_than = None
+            if isinstance(rule, dict):
+                if "larger_than" in rule:
+                    larger_than = parse_size(rule["larger_than"])
+                if "older_than_days" in rule:
+                    older_than = now - float(rule["older_than_days"]) * 86400
+            if larger_than is None and older_than is None:
+                plain_dirs.append(regex)
+                if not directories_only:
+                    plain_files.append(regex)
+            else:
+                self._conditional.append(
+                    (
+                        re.compile(regex, re.IGNORECASE | re.DOTALL),
+                        -1 if larger_than is None else larger_than,
+                        float("inf") if older_than is None else older_than,
+                        "size" if larger_than is not None else "age",
+                    )
+                )
+        self._exclude_dirs = _combine(plain_dirs)
+        self._exclude_files = _combine(plain_files)
+        # An included folder keeps everything below it.
+        includes = [
+            regex[:-1] + "(?:/.*)?$" if regex.endswith("$") else regex
+            for regex, _ in map(_rule_regex, spec.get("include", []))
+        ]
+        self._include = _combine(includes)
+        locales = spec.get("locales")
+        self._locales = frozenset(locale.lower() for locale in locales) if locales else None
+        self._locale_dirs = frozenset(name.lower() for name in spec.get("locale_dirs", DEFAULT_LOCALE_DIRS))
+
+    @classmethod
+    def for_entry(cls, config: Dict[str, Any], entry: Dict[str, Any]) -> Optional["PathRules"]:
+        """Rules for one directory entry (global "rules" plus the entry's own), or None if there are none."""
+        spec = merge_specs(config.get("rules") or {}, entry.get("rules") or {})
+        return cls(spec) if spec else None
+
+    def directory_reason(self, relative: str) -> Optional[str]:
+        if self._exclude_dirs and self._exclude_dirs.search(relative):
+            return "exclude"
+        return None
+
+    def file_reason(self, relative: str, size: int, mtime: float) -> Optional[str]:
+        if self._exclude_files and self._exclude_files.search(relative):
+            return "exclude"
+        for regex, larger_than, older_than, reason in self._conditional:
+            if size > larger_than and mtime < older_than and regex.search(relative):
+                return reason
+        if self._include and not self._include.search(relative):
+            return "include"
+        if self._locales is not None:
+            parent, _, name = relative.rpartition("/")
+            if parent.rpartition("/")[2].lower() in self._locale_dirs:
+                locale = name.split(".", 1)[0].lower()
+                if locale not in self._locales and locale.split("-", 1)[0] not in self._locales:
+                    return "locale"
+        return None
+
+
+def merge_specs(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine global and per-entry rule specs: lists are joined, scalars of ``override`` win."""
+    merged: Dict[str, Any] = {}
+    for spec in (base, override):
+        for key, value in spec.items():
+            if key in ("presets", "exclude", "include"):
+                merged[key] = merged.get(key, []) + list(value)
+            else:
+                merged[key] = value
+    return {key: value for key, value in merged.items() if value not in (None, [], {})}
+
+
+class PruneStats:
+    """What the rules kept out of a package: files and bytes in total and per reason."""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.bytes = 0
+        self.by_reason: Dict[str, Dict[str, int]] = {}
+        self.directories: List[str] = []
+        self.pruned_directories = 0
+
+    def add(self, reason: str, size: int, files: int = 1) -> None:
+        self.files += files
+        self.bytes += size
+        bucket = self.by_reason.setdefault(reason, {"files": 0, "bytes": 0})
+        bucket["files"] += files
+        bucket["bytes"] += size
+
+    def add_directory(self, path: str, files: int, size: int) -> None:
+        self.add("exclude", size, files)
+        self.pruned_directories += 1
+        if len(self.directories) < PRUNED_EXAMPLES:
+            self.directories.append(path)
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Add a ``to_dict()`` result (e.g. replayed from the journal)."""
+        self.files += other.get("files", 0)
+        self.bytes += other.get("bytes", 0)
+        for reason, bucket in other.get("by_reason", {}).items():
+            mine = self.by_reason.setdefault(reason, {"files": 0, "bytes": 0})
+            mine["files"] += bucket["files"]
+            mine["bytes"] += bucket["bytes"]
+        self.pruned_directories += other.get("pruned_directories", 0)
+        room = PRUNED_EXAMPLES - len(self.directories)
+        self.directories.extend(other.get("directories", [])[: max(0, room)])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "by_reason": self.by_reason,
+            "pruned_directories": self.pruned_directories,
+            "directories": self.directories,
+        }
+
+
+def tree_size(root: Path) -> Tuple[int, int]:
+    """(files, bytes) below ``root``, for reporting what a pruned folder would have cost."""
+    files = total = 0
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file():
+                        files += 1
+                        total += entry.stat().st_size
+        except OSError:
+            continue
+    return files, total
+
+
+def describe(stats: Dict[str, Any]) -> str:
+    reasons = ", ".join(
+        f"{reason} {bucket['files']} files/{bucket['bytes']} bytes" for reason, bucket in sorted(stats["by_reason"].items())
+    )
+    return f"{stats['files']} files, {stats['bytes']} bytes excluded ({reasons})"
+
+
+def _dropped(root: Path, rules: PathRules) -> Iterable[Tuple[str, str, int, int]]:
+    """(relative path, reason, files, bytes) for every folder and file the rules drop below ``root``."""
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        with os.scandir(root / relative) as entries:
+            for entry in entries:
+                path = f"{relative}/{entry.name}" if relative else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    reason = rules.directory_reason(path)
+                    if reason:
+                        yield (path + "/", reason, *tree_size(Path(entry.path)))
+                    else:
+                        stack.append(path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    reason = rules.file_reason(path, stat.st_size, stat.st_mtime)
+                    if reason:
+                        yield path, reason, 1, stat.st_size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List what a config's include/exclude rules drop from each directory.")
+    parser.add_argument("config", type=Path)
+    parser.add_argument("--show", type=int, default=20, help="Largest dropped paths to list per directory (default: 20).")
+    args = parser.parse_args()
+
+    try:
+        with args.config.open("r", encoding="utf-8") as handle:
+            config = json.load(handle)
+        for entry in config.get("directories", []):
+            root = Path(os.path.expanduser(os.path.expandvars(entry["path"].strip())))
+            rules = PathRules.for_entry(config, entry)
+            if rules is None:
+                print(f"[rules] {root}: no rules")
+                continue
+            stats = PruneStats()
+            dropped: List[Tuple[int, str, str]] = []
+            for path, reason, files, size in _dropped(root, rules):
+                if path.endswith("/"):
+                    stats.add_directory(path, files, size)
+                else:
+                    stats.add(reason, size)
+                dropped.append((size, path, reason))
+            print(f"[rules] {root}: {describe(stats.to_dict())}")
+            for size, path, reason in sorted(dropped, reverse=True)[: args.show]:
+                print(f"[rules]   {size:>14}  {reason:<8} {path}")
+    except (OSError, ValueError, re.error) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
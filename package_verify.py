@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Verify a portable package against the per-file index in its manifest.json.
+
+Usage:
+    python package_verify.py PortableRoot
+    python package_verify.py MyApp.ppkg --json report.json
+
+Every indexed file is re-hashed on a thread pool (large files through mmap) and
+reported as missing, corrupt (size or SHA-256 mismatch) or extra (present in the
+tree but not in the manifest). Archives are checked member by member against
+their own recorded digests and the embedded manifest.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import package_archive
+import portable_packager
+
+
+def _check_file(path: Path, expected: Dict[str, Any]) -> Optional[str]:
+    """Return a reason string if ``path`` does not match ``expected``, None when it does."""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return "missing"
+    if "size" in expected and size != expected["size"]:
+        return f"size {size} != {expected['size']}"
+    if "sha256" in expected and portable_packager.hash_file(path) != expected["sha256"]:
+        return "sha256 mismatch"
+    return None
+
+
+def _empty_report() -> Dict[str, Any]:
+    return {"checked": 0, "bytes": 0, "missing": [], "corrupt": [], "extra": []}
+
+
+def verify_package(
+    package_dir: Path,
+    workers: int = portable_packager.DEFAULT_COPY_WORKERS,
+) -> Dict[str, Any]:
+    """Re-hash every file recorded in ``package_dir``/manifest.json and compare."""
+    package_dir = package_dir.resolve()
+    with (package_dir / "manifest.json").open("r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    entries: Dict[str, Dict[str, Any]] = manifest.get("files", {})
+    store_root = Path(manifest["blob_store"]["root"]) if "blob_store" in manifest else None
+    report = _empty_report()
+    started = time.perf_counter()
+
+    jobs: List[Tuple[str, Path, Dict[str, Any]]] = []
+    for name, expected in entries.items():
+        path = package_dir / name
+        if expected.get("link") == "manifest":
+            # Not materialised in the tree; check the blob it points at instead.
+            if store_root is None:
+                report["missing"].append(name)
+                continue
+            path = store_root / "objects" / expected["sha256"][:2] / expected["sha256"]
+        jobs.append((name, path, expected))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(lambda job: _check_file(job[1], job[2]), jobs)
+        for (name, _path, expected), reason in zip(jobs, results):
+            report["checked"] += 1
+            report["bytes"] += expected.get("size", 0)
+            if reason == "missing":
+                report["missing"].append(name)
+            elif reason:
+                report["corrupt"].append({"path": name, "reason": reason})
+
+    for relative, entry in portable_packager.iter_tree(package_dir):
+        if entry.is_dir(follow_symlinks=False):
+            continue
+        name = (relative / entry.name).as_posix()
+        if name not in entries and name not in portable_packager.PACKAGE_METADATA:
+            report["extra"].append(name)
+
+    report["extra"].sort()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def verify_archive(archive_path: Path) -> Dict[str, Any]:
+    """Check every archive member against its recorded digest and the embedded manifest index."""
+    report = _empty_report()
+    started = time.perf_counter()
+    with package_archive.PackageArchive(archive_path) as archive:
+        entries: Dict[str, Dict[str, Any]] = {}
+        if "manifest.json" in archive.members:
+            entries = archive.read_json("manifest.json").get("files", {})
+        for name in archive.names():
+            member = archive.info(name)
+            digest = hashlib.sha256()
+            for data in archive.iter_chunks(name):
+                digest.update(data)
+            report["checked"] += 1
+            report["bytes"] += member["size"]
+            expected = entries.get(name, member)
+            if digest.hexdigest() != member.get("sha256") or digest.hexdigest() != expected.get("sha256"):
+                report["corrupt"].append({"path": name, "reason": "sha256 mismatch"})
+            elif name not in entries and name not in portable_packager.PACKAGE_METADATA:
+                report["extra"].append(name)
+        for name, expected in entries.items():
+            if name not in archive.members and expected.get("link") != "manifest":
+                report["missing"].append(name)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verify a portable package folder or .ppkg archive.")
+    parser.add_argument("package", type=Path, help="Package folder (with manifest.json) or .ppkg archive.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=portable_packager.DEFAULT_COPY_WORKERS,
+        help=f"Files hashed in parallel (default: {portable_packager.DEFAULT_COPY_WORKERS}).",
+    )
+    parser.add_argument("--json", type=Path, help="Also write the full report to this JSON file.")
+    args = parser.parse_args()
+    try:
+        if args.package.is_file():
+            report = verify_archive(args.package)
+        else:
+            report = verify_package(args.package, workers=args.workers)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+    for name in report["missing"]:
+        print(f"[missing] {name}")
+    for item in report["corrupt"]:
+        print(f"[corrupt] {item['path']} ({item['reason']})")
+    for name in report["extra"]:
+        print(f"[extra] {name}")
+    rate = report["bytes"] / report["seconds"] / (1024 * 1024) if report["seconds"] else 0.0
+    print(
+        f"[verify] {report['checked']} files, {report['bytes']} bytes in {report['seconds']:.2f}s "
+        f"({rate:.1f} MiB/s): {len(report['missing'])} missing, {len(report['corrupt'])} corrupt, "
+        f"{len(report['extra'])} extra"
+    )
+    if args.json:
+        with args.json.open("w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    if report["missing"] or report["corrupt"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Keep a portable package in sync with its sources while they change.
+
+Usage:
+    python package_watch.py watch config.json --output PortableRoot
+    python package_watch.py watch config.json --output PortableRoot --debounce 2 --catalog catalog.db
+    python package_watch.py simulate --work /tmp/watchsim --files 5000 --bursts 10
+
+watch first brings the package up to date with an incremental portable_packager
+run, then polls the configured directories, files and shortcuts. A poll is one
+scandir walk compared with the per-file index of manifest.json (size and source
+mtime), so the difference is exactly the pending work and nothing has to be
+remembered between polls. Bursts are coalesced: the difference is applied once
+it has stopped changing for --debounce seconds, or --max-delay seconds after it
+first appeared for sources that never go quiet. Only the affected files are
+copied or removed, then manifest.json is rewritten. While nothing changes the
+interval doubles up to --max-interval, and idle polls are never closer than
+the scan time divided by SCAN_DUTY, so large trees do not keep a core busy.
+Registry keys, services and scheduled tasks are captured by the initial run only.
+
+simulate builds a synthetic source tree, watches it from a background thread and
+replays bursts of creates, edits, deletes, renames, slow writes and excluded temp
+files against it. It reports the sync lag of each burst and the CPU used while
+idle, then checks the package against the source (exit code 1 on a mismatch).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import package_catalog
+import package_events
+import package_rules
+import package_verify
+import portable_packager
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 5.0
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_MAX_DELAY = 30.0
+# Idle polls are spaced so that scanning uses at most this fraction of one core.
+SCAN_DUTY = 0.05
+# How long simulate waits for a burst to be synced before counting it as lost.
+SIMULATION_TIMEOUT = 60.0
+
+# Package key -> (source path, size, mtime_ns) for every file a poll found.
+Snapshot = Dict[str, Tuple[str, int, int]]
+PollCallback = Callable[[Dict[str, Any]], None]
+
+
+class WatchRoot(NamedTuple):
+    """One configured source and the package key it is copied to."""
+
+    key: str
+    source: str
+    directory: bool
+    rules: Optional[package_rules.PathRules] = None
+
+
+def watch_roots(config: Dict[str, Any], output_dir: Path) -> List[WatchRoot]:
+    """Map the "directories", "files" and "shortcuts" of a config to the package keys the packager uses."""
+    roots: List[WatchRoot] = []
+    for entry in config.get("directories", []):
+        source = portable_packager.expand_path(entry["path"])
+        target_rel = Path(entry.get("target", source.name))
+        destination = (output_dir / portable_packager.package_directory(entry) / target_rel).resolve()
+        rules = package_rules.PathRules.for_entry(config, entry)
+        roots.append(WatchRoot(destination.relative_to(output_dir).as_posix(), str(source), True, rules))
+    for file_path in config.get("files", []):
+        source = portable_packager.expand_path(file_path)
+        roots.append(WatchRoot(f"ProgramFiles/{source.name}", str(source), False))
+    for shortcut_path in config.get("shortcuts", []):
+        source = portable_packager.expand_path(shortcut_path)
+        roots.append(WatchRoot(f"Shortcuts/{source.name}", str(source), False))
+    return roots
+
+
+def scan_root(root: WatchRoot, snapshot: Snapshot, blind: List[str]) -> None:
+    """Add the files of ``root`` to ``snapshot``.
+
+    Folders that cannot be read (and a root that is missing altogether, e.g. an
+    unplugged drive) are appended to ``blind``: the package keeps what it has
+    under them instead of treating every file there as deleted.
+    """
+    if not root.directory:
+        try:
+            stat = os.stat(root.source)
+        except FileNotFoundError:
+            return
+        except OSError:
+            blind.append(root.key)
+            return
+        snapshot[root.key] = (root.source, stat.st_size, stat.st_mtime_ns)
+        return
+    rules = root.rules
+    stack: List[Tuple[str, str]] = [("", root.source)]
+    while stack:
+        relative, path = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = f"{relative}/{entry.name}" if relative else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if rules is None or rules.directory_reason(name) is None:
+                                stack.append((name, entry.path))
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            if rules and rules.file_reason(name, stat.st_size, stat.st_mtime):
+                                continue
+                            snapshot[f"{root.key}/{name}"] = (entry.path, stat.st_size, stat.st_mtime_ns)
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            # A subfolder deleted mid-scan is a real deletion; a missing root is not trusted.
+            if not relative:
+                blind.append(root.key)
+        except OSError:
+            blind.append(f"{root.key}/{relative}" if relative else root.key)
+
+
+class PackageWatcher:
+    """Poll the sources of a package and apply what changed to it and its manifest.
+
+    ``on_poll`` is called from the watching thread after every poll with a dict of
+    "scanned_at" (time.monotonic() when the scan started), "scan_seconds", "files",
+    "changed", "removed", "pending" and "synced" (plus "finished_at" when it synced).
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        output_dir: Path,
+        interval: float = DEFAULT_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        copy_workers: int = portable_packager.DEFAULT_COPY_WORKERS,
+        blob_store_dir: Optional[Path] = None,
+        blob_link: str = "hardlink",
+        link_mode: str = "copy",
+        catalog_path: Optional[Path] = None,
+        events: Optional[package_events.EventBus] = None,
+        on_poll: Optional[PollCallback] = None,
+    ) -> None:
+        if interval <= 0 or max_interval < interval:
+            raise ValueError("--interval must be positive and not above --max-interval.")
+        if debounce < 0 or max_delay < debounce:
+            raise ValueError("--debounce must not be negative or above --max-delay.")
+        self.config_path = config_path
+        self.output_dir = output_dir.resolve()
+        self.interval = interval
+        self.max_interval = max_interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.copy_workers = max(1, copy_workers)
+        self.blob_store_dir = blob_store_dir
+        self.blob_link = blob_link
+        self.link_mode = link_mode
+        self.catalog_path = catalog_path
+        self.events = events or package_events.EventBus()
+        self.on_poll = on_poll
+        self.blob_store = portable_packager.BlobStore(blob_store_dir, link_mode=blob_link) if blob_store_dir else None
+        self.copy_one = portable_packager.make_copier(self.blob_store, link_mode, events=self.events)
+        config = portable_packager.load_config(config_path)
+        self.roots = watch_roots(config, self.output_dir)
+        self._directory_prefixes = tuple(root.key + "/" for root in self.roots if root.directory)
+        self._file_keys = {root.key for root in self.roots if not root.directory}
+        self.manifest: Dict[str, Any] = {}
+        self.index = portable_packager.PackageIndex(self.output_dir)
+        # The difference seen by the previous poll, when it first appeared and when it last changed.
+        self._pending: Optional[Tuple[Dict[str, Tuple[str, int, int]], List[str]]] = None
+        self._pending_since = 0.0
+        self._pending_changed = 0.0
+        self._blind_reported: Set[str] = set()
+        # Last scan and its difference; an identical scan against an unchanged index has the same difference.
+        self._last_scan: Optional[Tuple[Snapshot, List[str]]] = None
+        self._last_difference: Tuple[Dict[str, Tuple[str, int, int]], List[str]] = ({}, [])
+        self.syncs = 0
+
+    def initial_sync(self, capture_workers: int = portable_packager.DEFAULT_CAPTURE_WORKERS) -> None:
+        """Build or incrementally update the package, then load its manifest as the watch baseline."""
+        portable_packager.main(
+            self.config_path,
+            self.output_dir,
+            copy_workers=self.copy_workers,
+            blob_store_dir=self.blob_store_dir,
+            blob_link=self.blob_link,
+            incremental=True,
+            capture_workers=capture_workers,
+            link_mode=self.link_mode,
+            events=self.events,
+            catalog_path=self.catalog_path,
+        )
+        self.load_manifest()
+
+    def load_manifest(self) -> None:
+        with (self.output_dir / "manifest.json").open("r", encoding="utf-8") as handle:
+            self.manifest = json.load(handle)
+        self.index.entries = dict(self.manifest.get("files", {}))
+
+    def _watched(self, key: str) -> bool:
+        return key.startswith(self._directory_prefixes) or key in self._file_keys
+
+    def scan(self) -> Tuple[Snapshot, List[str]]:
+        snapshot: Snapshot = {}
+        blind: List[str] = []
+        for root in self.roots:
+            scan_root(root, snapshot, blind)
+        for key in blind:
+            if key not in self._blind_reported:
+                print(f"[watch] cannot read the source of {key}; keeping the packaged files")
+        self._blind_reported = set(blind)
+        return snapshot, blind
+
+    def difference(self, snapshot: Snapshot, blind: List[str]) -> Tuple[Dict[str, Tuple[str, int, int]], List[str]]:
+        """Files to copy (new, or size/mtime differ from the index) and index keys whose source is gone."""
+        entries = self.index.entries
+        changed: Dict[str, Tuple[str, int, int]] = {}
+        for key, value in snapshot.items():
+            old = entries.get(key)
+            if old is None or old.get("size") != value[1] or old.get("mtime_ns") != value[2]:
+                changed[key] = value
+        hidden = tuple(blind)
+        hidden_dirs = tuple(key + "/" for key in blind)
+        removed = [
+            key
+            for key in entries
+            if key not in snapshot
+            and self._watched(key)
+            and not (hidden and (key in hidden or key.startswith(hidden_dirs)))
+        ]
+        return changed, sorted(removed)
+
+    def poll(self) -> Dict[str, Any]:
+        """Scan once; apply the difference when it has been stable for the debounce period."""
+        scanned_at = time.monotonic()
+        snapshot, blind = self.scan()
+        now = time.monotonic()
+        if self._last_scan == (snapshot, blind):
+            changed, removed = self._last_difference
+        else:
+            changed, removed = self.difference(snapshot, blind)
+            self._last_scan, self._last_difference = (snapshot, blind), (changed, removed)
+        report: Dict[str, Any] = {
+            "scanned_at": scanned_at,
+            "scan_seconds": now - scanned_at,
+            "files": len(snapshot),
+            "changed": len(changed),
+            "removed": len(removed),
+            "pending": False,
+            "synced": False,
+        }
+        if not changed and not removed:
+            self._pending = None
+        else:
+            difference = (changed, removed)
+            if self._pending is None:
+                self._pending_since = self._pending_changed = scanned_at
+            elif difference != self._pending:
+                self._pending_changed = scanned_at
+            self._pending = difference
+            if now - self._pending_changed >= self.debounce or now - self._pending_since >= self.max_delay:
+                self.apply(changed, removed)
+                self._pending = self._last_scan = None
+                report["synced"] = True
+                report["finished_at"] = time.monotonic()
+            else:
+                report["pending"] = True
+        self.events.emit("watch_poll", **{key: value for key, value in report.items() if key != "scanned_at"})
+        if self.on_poll:
+            self.on_poll(report)
+        return report
+
+    def apply(self, changed: Dict[str, Tuple[str, int, int]], removed: List[str]) -> Dict[str, Any]:
+        """Copy ``changed`` into the package, delete ``removed`` and rewrite manifest.json."""
+        started = time.perf_counter()
+        failures: List[str] = []
+        copied = 0
+        copied_bytes = 0
+        with self.events.stage("sync", output=str(self.output_dir)) as counters:
+            pending: Dict[Future[Dict[str, Any]], str] = {}
+
+            def collect(done: Set[Future[Dict[str, Any]]]) -> None:
+                nonlocal copied, copied_bytes
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        copied_bytes += future.result()["size"]
+                        copied += 1
+                    except OSError as exc:
+                        failures.append(f"{key}: {exc}")
+
+            with ThreadPoolExecutor(max_workers=self.copy_workers) as pool:
+                for key, (source, size, mtime_ns) in changed.items():
+                    destination = self.output_dir / key
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    future = pool.submit(
+                        portable_packager.copy_entry,
+                        self.copy_one,
+                        Path(source),
+                        destination,
+                        size,
+                        mtime_ns,
+                        self.index,
+                        self.events,
+                    )
+                    pending[future] = key
+                    if len(pending) >= self.copy_workers * 4:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                collect(set(pending))
+            portable_packager.remove_files(self.output_dir, removed)
+            for key in removed:
+                self.index.entries.pop(key, None)
+            self.write_manifest()
+            counters.update(files=copied + len(removed), bytes=copied_bytes)
+        if self.catalog_path:
+            with package_catalog.PackageCatalog(self.catalog_path) as catalog:
+                catalog.add_package(self.output_dir)
+        self.syncs += 1
+        for failure in failures:
+            # The index still describes the old file, so the next poll tries again.
+            print(f"[watch] {failure} (retrying on the next poll)")
+        elapsed = time.perf_counter() - started
+        print(f"[watch] synced {copied} changed, {len(removed)} removed ({copied_bytes} bytes) in {elapsed:.2f}s")
+        return {"copied": copied, "bytes": copied_bytes, "removed": len(removed), "failed": len(failures)}
+
+    def write_manifest(self) -> None:
+        """Rewrite manifest.json with the current index; readers never see a half-written file."""
+        self.manifest["generated_at"] = datetime.utcnow().isoformat() + "Z"
+        self.manifest["files"] = dict(sorted(self.index.entries.items()))
+        if self.blob_store:
+            self.manifest["blob_store"] = self.blob_store.manifest_section()
+        target = self.output_dir / "manifest.json"
+        partial = target.with_name(target.name + ".partial")
+        # Same layout as create_manifest, so a watched package reads (and diffs) like a built one.
+        partial.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+        os.replace(partial, target)
+
+    def next_wait(self, report: Dict[str, Any], idle_wait: float) -> float:
+        """Seconds until the next poll: short while changes are pending, backing off while idle."""
+        if report["pending"]:
+            due = self._pending_changed + self.debounce - time.monotonic()
+            return max(0.01, min(self.interval, due))
+        if report["synced"]:
+            return self.interval
+        return max(idle_wait, report["scan_seconds"] / SCAN_DUTY)
+
+    def run(self, stop: threading.Event) -> None:
+        """Poll until ``stop`` is set."""
+        print(f"[watch] watching {len(self.roots)} sources of {self.output_dir}")
+        idle_wait = self.interval
+        while not stop.is_set():
+            report = self.poll()
+            if report["pending"] or report["synced"]:
+                idle_wait = self.interval
+            else:
+                idle_wait = min(self.max_interval, idle_wait * 2)
+            stop.wait(self.next_wait(report, idle_wait))
+
+
+# ---------------------------- simulation ----------------------------- #
+class _PollLog:
+    """Collects the watcher's poll reports for the simulation thread."""
+
+    def __init__(self) -> None:
+        self.reports: List[Dict[str, Any]] = []
+        self.condition = threading.Condition()
+
+    def __call__(self, report: Dict[str, Any]) -> None:
+        with self.condition:
+            self.reports.append(report)
+            self.condition.notify_all()
+
+    def settled_after(self, moment: float, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for a poll that started after ``moment`` and synced or found nothing to do."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for report in self.reports:
+                    if report["scanned_at"] >= moment and not report["pending"]:
+                        return report
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def last_sync_before(self, moment: float) -> Optional[float]:
+        with self.condition:
+            finished = [report["finished_at"] for report in self.reports if report["synced"]]
+        finished = [value for value in finished if value <= moment]
+        return max(finished) if finished else None
+
+
+def _write_random(path: Path, rng: random.Random, max_size: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(rng.randbytes(rng.randint(1, max_size)))
+
+
+def _burst(source: Path, live: List[Path], rng: random.Random, operations: int, max_size: int) -> Dict[str, int]:
+    """Apply ``operations`` random changes to ``source``; ``live`` tracks the files that exist."""
+    counts: Dict[str, int] = {}
+    for _ in range(operations):
+        kind = rng.choice(("create", "modify", "modify", "delete", "rename", "temp", "slow"))
+        if kind in ("modify", "delete", "rename") and not live:
+            kind = "create"
+        if kind == "create":
+            path = source / f"dir{rng.randrange(20)}" / f"new{rng.randrange(10**9)}.dat"
+            _write_random(path, rng, max_size)
+            live.append(path)
+        elif kind == "modify":
+            _write_random(rng.choice(live), rng, max_size)
+        elif kind == "delete":
+            live.pop(rng.randrange(len(live))).unlink()
+        elif kind == "rename":
+            old = live.pop(rng.randrange(len(live)))
+            new = source / f"dir{rng.randrange(20)}" / f"moved{rng.randrange(10**9)}.dat"
+            new.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(old, new)
+            live.append(new)
+        elif kind == "temp":
+            # Excluded by the simulation's rules: must never reach the package.
+            _write_random(source / f"dir{rng.randrange(20)}" / f"scratch{rng.randrange(10**9)}.tmp", rng, max_size)
+        else:
+            # A file written in pieces over a few hundred milliseconds.
+            path = source / f"dir{rng.randrange(20)}" / f"slow{rng.randrange(10**9)}.log"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("wb") as handle:
+                for _piece in range(4):
+                    handle.write(rng.randbytes(max_size // 4 or 1))
+                    handle.flush()
+                    time.sleep(0.1)
+            live.append(path)
+        counts[kind] = counts.get(kind, 0) + 1
+        time.sleep(rng.uniform(0, 0.01))
+    return counts
+
+
+def compare_with_source(package_dir: Path, source: Path, target: str) -> List[str]:
+    """Differences between the package's manifest and the (non .tmp) files under ``source``."""
+    with (package_dir / "manifest.json").open("r", encoding="utf-8") as handle:
+        entries = json.load(handle).get("files", {})
+    expected: Dict[str, Path] = {}
+    for relative, entry in portable_packager.iter_tree(source):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            expected[f"{target}/{(relative / entry.name).as_posix()}"] = Path(entry.path)
+    problems = [f"missing {key}" for key in sorted(expected.keys() - entries.keys())]
+    problems += [f"unexpected {key}" for key in sorted(key for key in entries if key.startswith(target + "/") and key not in expected)]
+    for key in sorted(expected.keys() & entries.keys()):
+        if entries[key].get("sha256") != portable_packager.hash_file(expected[key]):
+            problems.append(f"stale {key}")
+    return problems
+
+
+def simulate(
+    work: Path,
+    files: int = 2000,
+    bursts: int = 8,
+    burst_size: int = 25,
+    gap: float = 2.0,
+    idle: float = 10.0,
+    max_size: int = 64 * 1024,
+    seed: int = 1,
+    **watch_options: Any,
+) -> Dict[str, Any]:
+    """Replay bursts of filesystem changes against a watched synthetic package. Returns the report."""
+    if work.exists() and any(work.iterdir()):
+        raise FileExistsError(f"Simulation folder '{work}' is not empty.")
+    rng = random.Random(seed)
+    source = work / "source"
+    package_dir = work / "package"
+    live: List[Path] = []
+    for number in range(files):
+        path = source / f"dir{number % 20}" / f"sub{number % 7}" / f"file{number}.dat"
+        _write_random(path, rng, max_size)
+        live.append(path)
+    config_path = work / "config.json"
+    config = {
+        "app_name": "WatchSimulation",
+        "directories": [{"path": str(source), "target": "SimApp", "type": "program"}],
+        "rules": {"exclude": ["*.tmp"]},
+    }
+    config_path.write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+    log = _PollLog()
+    watcher = PackageWatcher(config_path, package_dir, on_poll=log, **watch_options)
+    watcher.initial_sync()
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,), name="watch", daemon=True)
+    thread.start()
+    lags: List[float] = []
+    operations: Dict[str, int] = {}
+    lost = 0
+    try:
+        for _ in range(bursts):
+            for kind, count in _burst(source, live, rng, burst_size, max_size).items():
+                operations[kind] = operations.get(kind, 0) + count
+            burst_end = time.monotonic()
+            report = log.settled_after(burst_end, SIMULATION_TIMEOUT)
+            if report is None:
+                lost += 1
+                continue
+            # A clean poll means an earlier sync (possibly one that finished just before burst_end) caught up.
+            finished = report["finished_at"] if report["synced"] else log.last_sync_before(report["scanned_at"])
+            lags.append(max(0.0, (finished or burst_end) - burst_end))
+            time.sleep(gap)
+        log.settled_after(time.monotonic(), SIMULATION_TIMEOUT)
+        polls_before = len(log.reports)
+        cpu_started, wall_started = time.process_time(), time.monotonic()
+        time.sleep(idle)
+        idle_cpu = (time.process_time() - cpu_started) / (time.monotonic() - wall_started)
+        idle_polls = len(log.reports) - polls_before
+    finally:
+        stop.set()
+        thread.join()
+
+    verify = package_verify.verify_package(package_dir)
+    problems = compare_with_source(package_dir, source, "ProgramFiles/SimApp")
+    problems += [f"missing {name}" for name in verify["missing"]]
+    problems += [f"corrupt {item['path']}: {item['reason']}" for item in verify["corrupt"]]
+    problems += [f"extra {name}" for name in verify["extra"]]
+    return {
+        "files": len(live),
+        "bursts": bursts,
+        "operations": operations,
+        "syncs": watcher.syncs,
+        "lost_bursts": lost,
+        "lag_seconds": {
+            "median": round(statistics.median(lags), 3) if lags else None,
+            "max": round(max(lags), 3) if lags else None,
+        },
+        "idle_cpu_percent": round(idle_cpu * 100, 2),
+        "idle_polls": idle_polls,
+        "problems": problems,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keep a portable package in sync with its sources.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def timing_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument(
+            "--interval", type=float, default=DEFAULT_INTERVAL, help=f"Seconds between polls while changes are pending (default: {DEFAULT_INTERVAL:g})."
+        )
+        command.add_argument(
+            "--max-interval",
+            type=float,
+            default=DEFAULT_MAX_INTERVAL,
+            help=f"Longest wait between polls once the sources are idle (default: {DEFAULT_MAX_INTERVAL:g}).",
+        )
+        command.add_argument(
+            "--debounce",
+            type=float,
+            default=DEFAULT_DEBOUNCE,
+            help=f"Apply changes once they have been quiet this many seconds (default: {DEFAULT_DEBOUNCE:g}).",
+        )
+        command.add_argument(
+            "--max-delay",
+            type=float,
+            default=DEFAULT_MAX_DELAY,
+            help=f"Apply changes at the latest this many seconds after they appeared (default: {DEFAULT_MAX_DELAY:g}).",
+        )
+        command.add_argument(
+            "--copy-workers",
+            type=int,
+            default=portable_packager.DEFAULT_COPY_WORKERS,
+            help=f"Concurrent file copies (default: {portable_packager.DEFAULT_COPY_WORKERS}).",
+        )
+
+    watch = sub.add_parser("watch", help="Build or update the package, then keep it in sync until interrupted.")
+    watch.add_argument("config", type=Path, help="Path to JSON config (see portable_config.sample.json).")
+    watch.add_argument("--output", type=Path, required=True, help="Package folder (created, or updated incrementally).")
+    timing_options(watch)
+    watch.add_argument("--blob-store", type=Path, help="Shared content-addressed store (as in portable_packager.py).")
+    watch.add_argument("--blob-link", choices=portable_packager.BLOB_LINK_MODES, default="hardlink")
+    watch.add_argument("--link-mode", choices=portable_packager.LINK_MODES, default="copy")
+    watch.add_argument("--catalog", type=Path, help="Refresh the package in this SQLite catalog after every sync.")
+    watch.add_argument(
+        "--events",
+        type=Path,
+        help="Write structured events (polls, syncs, files) as JSON lines, or '-' for stdout (progress then goes to stderr).",
+    )
+
+    sim = sub.add_parser("simulate", help="Measure sync lag and idle cost against a synthetic, changing source.")
+    sim.add_argument("--work", type=Path, required=True, help="Empty folder for the source tree, config and package.")
+    sim.add_argument("--files", type=int, default=2000, help="Files in the initial source tree (default: 2000).")
+    sim.add_argument("--bursts", type=int, default=8, help="Bursts of changes to replay (default: 8).")
+    sim.add_argument("--burst-size", type=int, default=25, help="Operations per burst (default: 25).")
+    sim.add_argument("--gap", type=float, default=2.0, help="Seconds between a synced burst and the next (default: 2).")
+    sim.add_argument("--idle", type=float, default=10.0, help="Seconds of idle time to measure CPU over (default: 10).")
+    sim.add_argument("--max-size", default="64KB", help="Largest generated file (default: 64KB).")
+    sim.add_argument("--seed", type=int, default=1)
+    sim.add_argument("--json", type=Path, help="Also write the report as JSON to this file.")
+    timing_options(sim)
+    args = parser.parse_args()
+
+    watch_options = {
+        "interval": args.interval,
+        "max_interval": args.max_interval,
+        "debounce": args.debounce,
+        "max_delay": args.max_delay,
+        "copy_workers": args.copy_workers,
+    }
+    try:
+        if args.command == "watch":
+            bus = package_events.EventBus()
+            sink = package_events.JsonlSink(args.events) if args.events else None
+            if sink:
+                bus.add_sink(sink)
+            # With '-' the events own stdout (the sink picked it above); progress goes to stderr.
+            to_stdout = str(args.events) == "-"
+            with contextlib.redirect_stdout(sys.stderr) if to_stdout else contextlib.nullcontext():
+                try:
+                    watcher = PackageWatcher(
+                        args.config,
+                        args.output,
+                        blob_store_dir=args.blob_store,
+                        blob_link=args.blob_link,
+                        link_mode=args.link_mode,
+                        catalog_path=args.catalog,
+                        events=bus,
+                        **watch_options,
+                    )
+                    watcher.initial_sync()
+                    watcher.run(threading.Event())
+                except KeyboardInterrupt:
+                    print("[watch] stopped")
+                finally:
+                    if sink:
+                        sink.close()
+        else:
+            report = simulate(
+                args.work,
+                files=args.files,
+                bursts=args.bursts,
+                burst_size=args.burst_size,
+                gap=args.gap,
+                idle=args.idle,
+                max_size=package_rules.parse_size(args.max_size),
+                seed=args.seed,
+                **watch_options,
+            )
+            print(
+                f"[simulate] {report['bursts']} bursts ({report['operations']}), {report['syncs']} syncs, "
+                f"lag median {report['lag_seconds']['median']}s max {report['lag_seconds']['max']}s, "
+                f"idle CPU {report['idle_cpu_percent']}% ({report['idle_polls']} polls)"
+            )
+            if args.json:
+                args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+            for problem in report["problems"]:
+                print(f"[mismatch] {problem}")
+            if report["problems"] or report["lost_bursts"]:
+                sys.exit(1)
+    except (OSError, ValueError, RuntimeError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
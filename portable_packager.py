@@ -12,16 +12,68 @@ See portable_config.sample.json for a template.
 from __future__ import annotations
 
 import argparse
+import contextlib
+import hashlib
+import heapq
 import json
+import mmap
 import os
 import shutil
 import subprocess
 import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+import package_archive
+import package_catalog
+import package_events
+import package_rules
 
 SUCCESSFUL_ROBOCOPY_CODES = set(range(0, 8))
+COPY_ENGINES = ("python", "robocopy")
+DEFAULT_COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Files above this size are streamed in COPY_BUFFER_SIZE chunks instead of a single copyfile call.
+LARGE_FILE_THRESHOLD = 8 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+COPY_RETRIES = 2
+COPY_RETRY_WAIT = 2.0
+BLOB_LINK_MODES = ("hardlink", "manifest")
+# copy: buffered copy with hashing; clone: reflink, then kernel-side copy; hardlink: also try a hardlink after reflink.
+LINK_MODES = ("copy", "clone", "hardlink")
+FICLONE = 0x40049409  # Linux ioctl: share extents with another file (btrfs, XFS, bcachefs...)
+DEFAULT_CAPTURE_WORKERS = 4
+# Dry-run plan: assumed sustained copy rate and fixed cost per file used for the time estimate.
+PLAN_THROUGHPUT_MIB_S = 150.0
+PLAN_PER_FILE_SECONDS = 0.0005
+PLAN_TOP_N = 20
+# Only files at least this large are grouped as duplicate candidates.
+PLAN_DUPLICATE_MIN_SIZE = 64 * 1024
+# Files every package has that are not part of the per-file index.
+PACKAGE_METADATA = ("manifest.json", "Restore_Template.cmd")
+# Write-ahead journal kept in the output directory while a package is being built.
+JOURNAL_NAME = ".packaging_journal.jsonl"
+# Buffered copies of files at least this large are checkpointed every RESUME_CHUNK_SIZE bytes.
+RESUMABLE_COPY_THRESHOLD = 64 * 1024 * 1024
+RESUME_CHUNK_SIZE = 64 * 1024 * 1024
+# Per-file journal records are fsync'ed at most this often; checkpoints and steps always are.
+JOURNAL_SYNC_INTERVAL = 1.0
+
+CommandRunner = Callable[[List[str]], "subprocess.CompletedProcess[str]"]
+LogFunc = Callable[[str], None]
+
+
+class PackagingCancelled(RuntimeError):
+    """Raised when the caller's cancel event is set. The journal lets a later run resume."""
+
+
+def check_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise PackagingCancelled("Packaging cancelled.")
 
 
 def expand_path(path: str) -> Path:
@@ -30,12 +82,22 @@ def expand_path(path: str) -> Path:
     return Path(expanded).resolve()
 
 
-def run_command(cmd: List[str], dry_run: bool = False) -> subprocess.CompletedProcess[str] | None:
+def subprocess_runner(cmd: List[str]) -> subprocess.CompletedProcess[str]:
+    """Default CommandRunner: run ``cmd`` and capture its text output."""
+    return subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+
+
+def run_command(
+    cmd: List[str],
+    dry_run: bool = False,
+    runner: Optional[CommandRunner] = None,
+    log: LogFunc = print,
+) -> subprocess.CompletedProcess[str] | None:
     """Run command and return CompletedProcess. Raises on failures."""
-    print(f"[cmd] {' '.join(cmd)}")
+    log(f"[cmd] {' '.join(cmd)}")
     if dry_run:
         return None
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    result = (runner or subprocess_runner)(cmd)
     if result.returncode != 0:
         raise RuntimeError(
             f"Command failed with exit code {result.returncode}:\nSTDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}"
@@ -43,7 +105,7 @@ def run_command(cmd: List[str], dry_run: bool = False) -> subprocess.CompletedPr
     return result
 
 
-def copy_directory(source: Path, destination: Path, dry_run: bool = False) -> None:
+def copy_directory_robocopy(source: Path, destination: Path, dry_run: bool = False) -> None:
     """Copy directory recursively preserving ACLs and timestamps via robocopy."""
     destination.mkdir(parents=True, exist_ok=True)
     cmd = [
@@ -69,13 +131,790 @@ def copy_directory(source: Path, destination: Path, dry_run: bool = False) -> No
         )
 
 
-def copy_file(source: Path, destination: Path, dry_run: bool = False) -> None:
+def iter_tree(
+    source: Path,
+    skip_dir: Optional[Callable[[Path, os.DirEntry], bool]] = None,
+) -> Iterator[Tuple[Path, os.DirEntry]]:
+    """Walk a tree with os.scandir yielding (relative parent, entry) pairs, directories before their contents.
+
+    Directories for which ``skip_dir(relative parent, entry)`` is true are neither yielded nor walked.
+    """
+    stack: List[Path] = [Path()]
+    while stack:
+        relative = stack.pop()
+        with os.scandir(source / relative) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if skip_dir and skip_dir(relative, entry):
+                        continue
+                    yield relative, entry
+                    stack.append(relative / entry.name)
+                else:
+                    yield relative, entry
+
+
+def stream_copy(source: Path, destination: Path, size: int) -> str:
+    """Copy file contents and then its timestamps/permission bits. Returns the SHA-256 of the copied bytes.
+
+    Small files are read in one call; large files are streamed in COPY_BUFFER_SIZE chunks.
+    The digest is computed from the same buffers that are written, so each byte is read once.
+    """
+    digest = hashlib.sha256()
+    with source.open("rb") as src, destination.open("wb") as dst:
+        if size < LARGE_FILE_THRESHOLD:
+            data = src.read()
+            digest.update(data)
+            dst.write(data)
+        else:
+            for chunk in iter(lambda: src.read(COPY_BUFFER_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+    shutil.copystat(source, destination)
+    return digest.hexdigest()
+
+
+def resumable_copy(
+    source: Path,
+    destination: Path,
+    size: int,
+    journal: "PackagingJournal",
+    cancel: Optional[threading.Event] = None,
+) -> str:
+    """Copy a large file in RESUME_CHUNK_SIZE pieces, checkpointing each one in ``journal``. Returns the SHA-256.
+
+    If the journal holds a checkpoint for the same source size and mtime, the bytes already
+    in ``destination`` are re-hashed (read only) and the copy continues from there.
+    ``cancel`` is checked between pieces, so a cancelled copy stops at a checkpoint.
+    """
+    mtime_ns = source.stat().st_mtime_ns
+    offset = journal.resume_offset(destination, size, mtime_ns)
+    if not offset:
+        destination.unlink(missing_ok=True)
+    digest = hashlib.sha256()
+    with source.open("rb") as src, destination.open("r+b" if offset else "wb") as dst:
+        if offset:
+            print(f"[resume] {destination} from byte {offset} of {size}")
+            for chunk in iter(lambda: dst.read(min(COPY_BUFFER_SIZE, offset - dst.tell())), b""):
+                digest.update(chunk)
+            dst.truncate(offset)
+            src.seek(offset)
+        while offset < size:
+            check_cancelled(cancel)
+            end = min(size, offset + RESUME_CHUNK_SIZE)
+            while offset < end:
+                chunk = src.read(min(COPY_BUFFER_SIZE, end - offset))
+                if not chunk:
+                    raise OSError(f"{source} shrank while it was being copied")
+                digest.update(chunk)
+                dst.write(chunk)
+                offset += len(chunk)
+            # The piece must be on disk before the journal says so.
+            dst.flush()
+            os.fsync(dst.fileno())
+            if offset < size:
+                journal.checkpoint(destination, offset, size, mtime_ns)
+    shutil.copystat(source, destination)
+    return digest.hexdigest()
+
+
+def _try_reflink(source: Path, destination: Path) -> bool:
+    """Clone ``source`` into a new ``destination`` without copying data, where the OS and filesystem allow it."""
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with source.open("rb") as src, destination.open("wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return True
+            except OSError:
+                pass
+        destination.unlink()
+        return False
+    if sys.platform == "darwin":
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) == 0
+    return False
+
+
+def _try_hardlink(source: Path, destination: Path) -> bool:
+    """Hardlink when both sides are on the same volume; the package file then shares the source's inode."""
+    try:
+        if source.stat().st_dev != destination.parent.stat().st_dev:
+            return False
+        os.link(source, destination)
+        return True
+    except OSError:
+        return False
+
+
+def _try_kernel_copy(source: Path, destination: Path, size: int) -> Optional[str]:
+    """Copy inside the kernel with copy_file_range, then sendfile. Returns the method used or None."""
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append("copy_file_range")
+    if sys.platform.startswith("linux") and hasattr(os, "sendfile"):
+        methods.append("sendfile")
+    if not methods:
+        return None
+    with source.open("rb") as src, destination.open("wb") as dst:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        for method in methods:
+            copied = 0
+            try:
+                while copied < size:
+                    if method == "copy_file_range":
+                        sent = os.copy_file_range(src_fd, dst_fd, size - copied, copied, copied)
+                    else:
+                        sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            except OSError:
+                pass
+            if copied == size:
+                return method
+            dst.truncate(0)
+    return None
+
+
+def link_copy(source: Path, destination: Path, size: int, allow_hardlink: bool = False) -> Dict[str, Any]:
+    """Copy with the cheapest available method: reflink, hardlink (if allowed), kernel copy, buffered copy.
+
+    Only the buffered fallback reads the bytes in user space, so only it records a sha256;
+    the other methods record size and method, and package_verify checks their size.
+    """
+    destination.unlink(missing_ok=True)
+    if _try_reflink(source, destination):
+        method = "reflink"
+    elif allow_hardlink and _try_hardlink(source, destination):
+        return {"size": size, "method": "hardlink"}
+    else:
+        method = _try_kernel_copy(source, destination, size) or "buffered"
+        if method == "buffered":
+            return {"size": size, "sha256": stream_copy(source, destination, size), "method": method}
+    shutil.copystat(source, destination)
+    return {"size": size, "method": method}
+
+
+def _copy_with_retries(
+    source: Path,
+    destination: Path,
+    size: int,
+    link_mode: str = "copy",
+    journal: Optional["PackagingJournal"] = None,
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    for attempt in range(COPY_RETRIES + 1):
+        try:
+            if link_mode == "copy" and journal and size >= RESUMABLE_COPY_THRESHOLD:
+                # A retry picks up from the last checkpoint too.
+                digest = resumable_copy(source, destination, size, journal, cancel)
+                return {"size": size, "sha256": digest, "method": "buffered"}
+            if link_mode == "copy":
+                # Never write through a link left by an earlier hardlink run: that would modify the source.
+                destination.unlink(missing_ok=True)
+                return {"size": size, "sha256": stream_copy(source, destination, size), "method": "buffered"}
+            return link_copy(source, destination, size, allow_hardlink=link_mode == "hardlink")
+        except FileNotFoundError:
+            # The source was deleted (or its folder moved); waiting will not bring it back.
+            raise
+        except OSError as exc:
+            if attempt == COPY_RETRIES:
+                raise
+            if events:
+                events.emit("file_retry", source=str(source), attempt=attempt + 1, error=str(exc))
+            time.sleep(COPY_RETRY_WAIT)
+    raise AssertionError("unreachable")
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file.
+
+    Large files are memory-mapped and hashed in one call (hashlib releases the GIL,
+    so several threads can hash at disk speed); small ones are read in COPY_BUFFER_SIZE chunks.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size >= LARGE_FILE_THRESHOLD:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            for chunk in iter(lambda: handle.read(COPY_BUFFER_SIZE), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Content-addressed store shared between packages.
+
+    Every file is hashed before anything is written; a body is copied into
+    ``<root>/objects/<aa>/<sha256>`` only the first time it is seen, and the package
+    tree then references it by hardlink or, in "manifest" mode (or when linking is
+    not possible, e.g. across volumes), only through the manifest entry.
+    """
+
+    def __init__(self, root: Path, link_mode: str = "hardlink") -> None:
+        if link_mode not in BLOB_LINK_MODES:
+            raise ValueError(f"Unknown blob link mode '{link_mode}'. Expected one of: {', '.join(BLOB_LINK_MODES)}")
+        self.root = root.resolve()
+        self.link_mode = link_mode
+        self.blobs_written = 0
+        self.bytes_written = 0
+        self.duplicates = 0
+        self.bytes_deduplicated = 0
+        self._lock = threading.Lock()
+        self._digest_locks: Dict[str, threading.Lock] = {}
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def _digest_lock(self, digest: str) -> threading.Lock:
+        with self._lock:
+            return self._digest_locks.setdefault(digest, threading.Lock())
+
+    def store(self, source: Path, size: int) -> str:
+        """Ensure the contents of ``source`` are in the store and return their digest.
+
+        The copy is hashed as it is written and only published when that digest matches
+        the one the blob is named after; a file modified between the two reads is hashed
+        and copied again (up to COPY_RETRIES times) instead of poisoning the store.
+        """
+        for _attempt in range(COPY_RETRIES + 1):
+            digest = hash_file(source)
+            blob = self.blob_path(digest)
+            with self._digest_lock(digest):
+                if blob.exists():
+                    with self._lock:
+                        self.duplicates += 1
+                        self.bytes_deduplicated += size
+                    return digest
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                partial = blob.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.partial")
+                if stream_copy(source, partial, size) == digest:
+                    os.replace(partial, blob)
+                    break
+                partial.unlink(missing_ok=True)
+        else:
+            raise OSError(f"{source} kept changing while it was copied into the blob store")
+        with self._lock:
+            self.blobs_written += 1
+            self.bytes_written += size
+        return digest
+
+    def place(self, source: Path, destination: Path, size: int) -> Dict[str, Any]:
+        """Store ``source`` and make ``destination`` reference the blob. Returns the file record."""
+        digest = self.store(source, size)
+        link = self.link_mode
+        if link == "hardlink":
+            try:
+                if destination.exists():
+                    destination.unlink()
+                os.link(self.blob_path(digest), destination)
+            except OSError:
+                link = "manifest"
+        return {"size": size, "sha256": digest, "link": link, "method": "blob"}
+
+    def manifest_section(self) -> Dict[str, Any]:
+        """Store summary for manifest.json; per-file digests and link modes live in its "files" index."""
+        return {
+            "root": str(self.root),
+            "link_mode": self.link_mode,
+            "blobs_written": self.blobs_written,
+            "bytes_written": self.bytes_written,
+            "duplicates": self.duplicates,
+            "bytes_deduplicated": self.bytes_deduplicated,
+        }
+
+
+class PackageIndex:
+    """Per-file inventory of a package (size, source mtime, sha256) kept in manifest.json.
+
+    Keys are package-relative POSIX paths. ``previous`` holds the inventory of the
+    package being updated in incremental mode; files whose source size and mtime
+    still match it are reused instead of copied, and entries that are not seen
+    again are reported by ``stale()`` so they can be removed.
+    """
+
+    def __init__(self, output_dir: Path, previous: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.output_dir = output_dir
+        self.previous = previous or {}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.reused = 0
+        self.reused_bytes = 0
+        self.journal: Optional[PackagingJournal] = None
+        self._lock = threading.Lock()
+
+    def key(self, path: Path) -> str:
+        return path.relative_to(self.output_dir).as_posix()
+
+    def reuse(self, destination: Path, size: int, mtime_ns: int) -> bool:
+        """Return True (and carry the old entry over) when ``destination`` is up to date.
+
+        A tracked file that changed is unlinked so the new copy never writes through a
+        hardlink shared with the blob store.
+        """
+        key = self.key(destination)
+        old = self.previous.get(key)
+        if old is None:
+            return False
+        if old.get("link") == "manifest":
+            present = True
+        else:
+            try:
+                present = destination.stat().st_size == size
+            except OSError:
+                present = False
+        if present and old.get("size") == size and old.get("mtime_ns") == mtime_ns:
+            with self._lock:
+                self.entries[key] = old
+                self.reused += 1
+                self.reused_bytes += size
+            return True
+        if old.get("link") != "manifest":
+            destination.unlink(missing_ok=True)
+        return False
+
+    def record(self, destination: Path, entry: Dict[str, Any]) -> None:
+        key = self.key(destination)
+        with self._lock:
+            self.entries[key] = entry
+        if self.journal:
+            self.journal.file_done(key, entry)
+
+    def carry(self, entries: Dict[str, Dict[str, Any]], prefix: Optional[str]) -> int:
+        """Keep ``entries`` at or below ``prefix`` as they are (work a resumed run skips). Returns the count."""
+        if prefix is None:
+            return 0
+        if prefix in entries:
+            selected = {prefix: entries[prefix]}
+        else:
+            selected = {key: entry for key, entry in entries.items() if key.startswith(prefix + "/")}
+        with self._lock:
+            self.entries.update(selected)
+        return len(selected)
+
+    def matches(self, destination: Path, sha256: str) -> bool:
+        old = self.previous.get(self.key(destination))
+        return bool(old) and old.get("sha256") == sha256 and destination.exists()
+
+    def stale(self) -> List[str]:
+        return sorted(key for key in self.previous if key not in self.entries)
+
+
+def load_previous_index(output_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Read the per-file inventory from an existing package's manifest.json."""
+    manifest_path = output_dir / "manifest.json"
+    if not manifest_path.exists():
+        raise FileExistsError(
+            f"Output directory '{output_dir}' is not empty and has no manifest.json to update incrementally."
+        )
+    with manifest_path.open("r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    return manifest.get("files", {})
+
+
+class PackagingJournal:
+    """Write-ahead journal of finished packaging work, kept in the output directory until the package is complete.
+
+    Every finished file and capture is appended as one JSON line, as is every completed
+    step (a capture or a whole directory); large buffered copies also log a checkpoint
+    after each RESUME_CHUNK_SIZE piece. Re-running the same command after a crash replays
+    the journal: completed steps are skipped, journaled files whose source and copy still
+    match are reused, and an interrupted large copy continues from its last checkpoint.
+    A line torn by the crash ends the replay.
+    """
+
+    def __init__(self, output_dir: Path, fingerprint: str) -> None:
+        self.output_dir = output_dir
+        self.path = output_dir / JOURNAL_NAME
+        self.fingerprint = fingerprint
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.steps: Dict[str, Optional[str]] = {}
+        # Per directory step: what its include/exclude rules kept out (package_rules.PruneStats dict).
+        self.excluded: Dict[str, Dict[str, Any]] = {}
+        self.checkpoints: Dict[str, Dict[str, int]] = {}
+        self._handle: Optional[TextIO] = None
+        self._lock = threading.Lock()
+        self._synced = 0.0
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> None:
+        """Replay the journal left by an interrupted run of the same command."""
+        with self.path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                kind = record.get("type")
+                if kind == "start" and record.get("fingerprint") != self.fingerprint:
+                    raise RuntimeError(
+                        f"{self.path} was left by a run with a different configuration or options. "
+                        f"Re-run the original command to resume it, or empty '{self.output_dir}'."
+                    )
+                if kind == "file":
+                    self.files[record["key"]] = record["entry"]
+                    self.checkpoints.pop(record["key"], None)
+                elif kind == "checkpoint":
+                    self.checkpoints[record["key"]] = record
+                elif kind == "step":
+                    self.steps[record["name"]] = record.get("prefix")
+                    if "excluded" in record:
+                        self.excluded[record["name"]] = record["excluded"]
+
+    def open(self) -> None:
+        new = not self.path.exists()
+        self._handle = self.path.open("a", encoding="utf-8")
+        if new:
+            started = datetime.utcnow().isoformat() + "Z"
+            self._append({"type": "start", "fingerprint": self.fingerprint, "started_at": started}, sync=True)
+
+    def _append(self, record: Dict[str, Any], sync: bool = False) -> None:
+        if self._handle is None:
+            return
+        with self._lock:
+            self._handle.write(json.dumps(record) + "\n")
+            self._handle.flush()
+            now = time.monotonic()
+            if sync or now - self._synced >= JOURNAL_SYNC_INTERVAL:
+                os.fsync(self._handle.fileno())
+                self._synced = now
+
+    def key(self, path: Path) -> str:
+        return path.relative_to(self.output_dir).as_posix()
+
+    def file_done(self, key: str, entry: Dict[str, Any]) -> None:
+        self._append({"type": "file", "key": key, "entry": entry})
+
+    def checkpoint(self, destination: Path, offset: int, size: int, mtime_ns: int) -> None:
+        record = {"type": "checkpoint", "key": self.key(destination), "offset": offset, "size": size}
+        self._append({**record, "mtime_ns": mtime_ns}, sync=True)
+
+    def resume_offset(self, destination: Path, size: int, mtime_ns: int) -> int:
+        """Bytes of ``destination`` confirmed by a checkpoint for this exact source version (0 if none)."""
+        mark = self.checkpoints.get(self.key(destination))
+        if not mark or mark["size"] != size or mark["mtime_ns"] != mtime_ns:
+            return 0
+        try:
+            present = destination.stat().st_size
+        except OSError:
+            return 0
+        return mark["offset"] if present >= mark["offset"] else 0
+
+    def step_done(self, name: str, prefix: Optional[str] = None, excluded: Optional[Dict[str, Any]] = None) -> None:
+        """Mark ``name`` complete; ``prefix`` is the package path whose journaled files it produced."""
+        record: Dict[str, Any] = {"type": "step", "name": name, "prefix": prefix}
+        if excluded is not None:
+            record["excluded"] = excluded
+        self._append(record, sync=True)
+
+    def is_done(self, name: str) -> bool:
+        return name in self.steps
+
+    def run_step(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``func`` and mark ``name`` complete with the package file it returns, if any."""
+        result = func(*args, **kwargs)
+        self.step_done(name, self.key(result) if isinstance(result, Path) else None)
+        return result
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def finish(self) -> None:
+        """The package is complete: drop the journal."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def run_fingerprint(config_path: Path, options: Dict[str, Any]) -> str:
+    """Identify a packaging run by its config contents and output-affecting options."""
+    digest = hashlib.sha256(config_path.read_bytes())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def remove_files(output_dir: Path, keys: Iterable[str]) -> int:
+    """Delete package files by index key and prune the directories they leave empty."""
+    removed = 0
+    for key in keys:
+        target = output_dir / key
+        print(f"[remove] {target}")
+        target.unlink(missing_ok=True)
+        removed += 1
+        parent = target.parent
+        while parent != output_dir and parent.exists() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+    return removed
+
+
+def remove_stale(index: PackageIndex) -> int:
+    """Delete package files that are no longer produced."""
+    return remove_files(index.output_dir, index.stale())
+
+
+def make_copier(
+    blob_store: Optional[BlobStore] = None,
+    link_mode: str = "copy",
+    journal: Optional[PackagingJournal] = None,
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Callable[..., Dict[str, Any]]:
+    """Return the per-file copy function for the selected blob store / link mode.
+
+    With a ``journal``, large buffered copies are checkpointed so they can be resumed.
+    Once ``cancel`` is set, copies that have not started raise PackagingCancelled.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode '{link_mode}'. Expected one of: {', '.join(LINK_MODES)}")
+    if blob_store:
+        if link_mode != "copy":
+            raise ValueError("--link-mode cannot be combined with the blob store.")
+
+    def copy_one(source: Path, destination: Path, size: int) -> Dict[str, Any]:
+        check_cancelled(cancel)
+        if blob_store:
+            return blob_store.place(source, destination, size)
+        return _copy_with_retries(source, destination, size, link_mode, journal, events, cancel)
+
+    return copy_one
+
+
+def copy_entry(
+    copy_one: Any,
+    source: Path,
+    destination: Path,
+    size: int,
+    mtime_ns: int,
+    index: Optional[PackageIndex],
+    events: Optional[package_events.EventBus] = None,
+) -> Dict[str, Any]:
+    """Copy one file with a ``make_copier`` callable, emit its "file" event and record it in ``index``."""
+    started = time.perf_counter()
+    record = copy_one(source, destination, size)
+    if events and events.enabled:
+        duration = time.perf_counter() - started
+        events.emit(
+            "file",
+            source=str(source),
+            destination=str(destination),
+            bytes=size,
+            method=record["method"],
+            duration=round(duration, 6),
+        )
+    record["mtime_ns"] = mtime_ns
+    if index:
+        index.record(destination, record)
+    return record
+
+
+def copy_tree_parallel(
+    source: Path,
+    destination: Path,
+    workers: int = DEFAULT_COPY_WORKERS,
+    blob_store: Optional[BlobStore] = None,
+    index: Optional[PackageIndex] = None,
+    link_mode: str = "copy",
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+    rules: Optional[package_rules.PathRules] = None,
+) -> Dict[str, Any]:
+    """Copy a directory tree with a bounded thread pool.
+
+    Returns {"files": copied, "bytes": copied bytes, "methods": {method: count}}, plus
+    "excluded" (see package_rules.PruneStats) when ``rules`` are given.
+
+    Directories are created by the walking thread; file copies are handed to the pool
+    with at most ``workers * 4`` copies in flight so huge trees do not queue millions of futures.
+    Directory timestamps are applied last, deepest first, because copying into a directory
+    changes its mtime. ACLs are not copied; use the robocopy engine when they matter.
+    When ``blob_store`` is given, files are deduplicated through it instead of copied.
+    Files that ``index`` reports as unchanged are skipped and not counted.
+    Setting ``cancel`` stops the walk and the queued copies; copies already running finish.
+    ``rules`` are checked by the walking thread: excluded folders are not descended into
+    (only sized for the report) and excluded files are never submitted.
+    """
+    copy_one = make_copier(blob_store, link_mode, index.journal if index else None, events, cancel)
+    workers = max(1, workers)
+    max_pending = workers * 4
+    pending: Set[Future[Dict[str, Any]]] = set()
+    directories: List[Path] = []
+    failures: List[str] = []
+    methods: Counter[str] = Counter()
+    files = 0
+    total_bytes = 0
+    pruned = package_rules.PruneStats()
+
+    def skip_dir(relative: Path, entry: os.DirEntry) -> bool:
+        path = (relative / entry.name).as_posix()
+        if rules.directory_reason(path) is None:
+            return False
+        pruned.add_directory(path, *package_rules.tree_size(Path(entry.path)))
+        return True
+
+    def collect(done: Iterable[Future[Dict[str, Any]]]) -> None:
+        nonlocal files, total_bytes
+        for future in done:
+            try:
+                record = future.result()
+                total_bytes += record["size"]
+                methods[record["method"]] += 1
+                files += 1
+            except OSError as exc:
+                failures.append(str(exc))
+
+    destination.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for relative, entry in iter_tree(source, skip_dir if rules else None):
+            check_cancelled(cancel)
+            target = destination / relative / entry.name
+            if entry.is_dir(follow_symlinks=False):
+                target.mkdir(exist_ok=True)
+                directories.append(relative / entry.name)
+            elif entry.is_file():
+                stat = entry.stat()
+                if rules:
+                    reason = rules.file_reason((relative / entry.name).as_posix(), stat.st_size, stat.st_mtime)
+                    if reason:
+                        pruned.add(reason, stat.st_size)
+                        continue
+                if index and index.reuse(target, stat.st_size, stat.st_mtime_ns):
+                    if events:
+                        events.emit("file_skipped", destination=str(target), bytes=stat.st_size)
+                    continue
+                pending.add(
+                    pool.submit(
+                        copy_entry, copy_one, Path(entry.path), target, stat.st_size, stat.st_mtime_ns, index, events
+                    )
+                )
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            else:
+                print(f"[skip] {entry.path} (not a regular file or directory)")
+        collect(pending)
+
+    for relative in sorted(directories, key=lambda p: len(p.parts), reverse=True):
+        shutil.copystat(source / relative, destination / relative)
+    shutil.copystat(source, destination)
+    if failures:
+        joined = "\n".join(failures)
+        raise RuntimeError(f"{len(failures)} file(s) failed while copying {source} -> {destination}:\n{joined}")
+    stats: Dict[str, Any] = {"files": files, "bytes": total_bytes, "methods": dict(methods)}
+    if rules:
+        stats["excluded"] = pruned.to_dict()
+    return stats
+
+
+def index_tree(destination: Path, index: PackageIndex, workers: int = DEFAULT_COPY_WORKERS) -> int:
+    """Hash an already copied tree into ``index`` (used after robocopy, which reports no digests).
+
+    robocopy preserves timestamps, so the copy's mtime stands in for the source mtime.
+    """
+    records: List[Tuple[Path, os.stat_result, Future[str]]] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for relative, entry in iter_tree(destination):
+            if entry.is_file(follow_symlinks=False):
+                path = Path(entry.path)
+                records.append((path, entry.stat(), pool.submit(hash_file, path)))
+    for path, stat, future in records:
+        index.record(path, {"size": stat.st_size, "sha256": future.result(), "mtime_ns": stat.st_mtime_ns})
+    return len(records)
+
+
+def copy_directory(
+    source: Path,
+    destination: Path,
+    dry_run: bool = False,
+    engine: str = "python",
+    workers: int = DEFAULT_COPY_WORKERS,
+    blob_store: Optional[BlobStore] = None,
+    index: Optional[PackageIndex] = None,
+    link_mode: str = "copy",
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+    rules: Optional[package_rules.PathRules] = None,
+) -> Optional[Dict[str, Any]]:
+    """Copy directory recursively with the selected engine ("python" thread pool or "robocopy").
+
+    The python engine fills ``index`` while it copies and returns its copy stats.
+    robocopy /MIR is incremental on its own and reports no digests, so its output is
+    hashed afterwards instead.
+    """
+    events = events or package_events.EventBus()
+    if engine == "robocopy":
+        if blob_store or link_mode != "copy":
+            raise ValueError("The blob store and link modes require the python copy engine.")
+        if rules:
+            raise ValueError("Include/exclude rules require the python copy engine.")
+        with events.stage("robocopy", source=str(source), destination=str(destination)):
+            copy_directory_robocopy(source, destination, dry_run=dry_run)
+        if index and not dry_run:
+            with events.stage("hash", destination=str(destination)) as counters:
+                counters["files"] = index_tree(destination, index, workers=workers)
+        return None
+    if engine != "python":
+        raise ValueError(f"Unknown copy engine '{engine}'. Expected one of: {', '.join(COPY_ENGINES)}")
+    print(f"[copy dir] {source} -> {destination}")
+    if dry_run:
+        return None
+    started = time.perf_counter()
+    with events.stage("copy", source=str(source), destination=str(destination), workers=workers) as counters:
+        stats = copy_tree_parallel(
+            source,
+            destination,
+            workers=workers,
+            blob_store=blob_store,
+            index=index,
+            link_mode=link_mode,
+            events=events,
+            cancel=cancel,
+            rules=rules,
+        )
+        counters.update(stats)
+    elapsed = time.perf_counter() - started
+    methods = ", ".join(f"{name}={count}" for name, count in sorted(stats["methods"].items()))
+    print(
+        f"[copy dir] {stats['files']} files, {stats['bytes']} bytes in {elapsed:.2f}s "
+        f"({workers} workers{'; ' + methods if methods else ''})"
+    )
+    if stats.get("excluded", {}).get("files"):
+        print(f"[rules] {package_rules.describe(stats['excluded'])}")
+    return stats
+
+
+def copy_file(
+    source: Path,
+    destination: Path,
+    dry_run: bool = False,
+    blob_store: Optional[BlobStore] = None,
+    index: Optional[PackageIndex] = None,
+    link_mode: str = "copy",
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
     """Copy single file preserving metadata."""
     destination.parent.mkdir(parents=True, exist_ok=True)
-    print(f"[copy file] {source} -> {destination}")
     if dry_run:
+        print(f"[copy file] {source} -> {destination}")
+        return
+    stat = source.stat()
+    if index and index.reuse(destination, stat.st_size, stat.st_mtime_ns):
+        print(f"[unchanged] {destination}")
+        if events:
+            events.emit("file_skipped", destination=str(destination), bytes=stat.st_size)
         return
-    shutil.copy2(source, destination)
+    print(f"[copy file] {source} -> {destination}")
+    copy_one = make_copier(blob_store, link_mode, index.journal if index else None, events, cancel)
+    copy_entry(copy_one, source, destination, stat.st_size, stat.st_mtime_ns, index, events)
 
 
 def sanitize_name(value: str) -> str:
@@ -89,56 +928,183 @@ def sanitize_name(value: str) -> str:
     return "".join(keep)
 
 
-def export_registry(key: str, destination: Path, dry_run: bool = False) -> None:
-    """Export registry key using reg.exe."""
+def commit_capture(
+    data: bytes,
+    target: Path,
+    index: Optional[PackageIndex] = None,
+    log: LogFunc = print,
+) -> bool:
+    """Write a registry/service/task capture unless the package already holds identical bytes.
+
+    Returns True when the file was (re)written.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    unchanged = index.matches(target, sha256) if index else False
+    if unchanged:
+        log(f"[unchanged] {target}")
+    else:
+        target.write_bytes(data)
+    if index:
+        index.record(target, {"size": len(data), "sha256": sha256})
+    return not unchanged
+
+
+def export_registry(
+    key: str,
+    destination: Path,
+    dry_run: bool = False,
+    index: Optional[PackageIndex] = None,
+    runner: Optional[CommandRunner] = None,
+    log: LogFunc = print,
+) -> Optional[Path]:
+    """Export registry key using reg.exe. Returns the written file (None in dry-run mode)."""
     destination.parent.mkdir(parents=True, exist_ok=True)
-    cmd = ["reg", "export", key, str(destination), "/y"]
-    run_command(cmd, dry_run=dry_run)
+    scratch = destination.with_name(destination.name + ".tmp")
+    cmd = ["reg", "export", key, str(scratch), "/y"]
+    run_command(cmd, dry_run=dry_run, runner=runner, log=log)
+    if dry_run:
+        return None
+    try:
+        commit_capture(scratch.read_bytes(), destination, index, log=log)
+    finally:
+        scratch.unlink(missing_ok=True)
+    return destination
 
 
-def capture_service(service_name: str, destination_dir: Path, dry_run: bool = False) -> None:
-    """Capture service configuration via sc.exe."""
+def capture_service(
+    service_name: str,
+    destination_dir: Path,
+    dry_run: bool = False,
+    index: Optional[PackageIndex] = None,
+    runner: Optional[CommandRunner] = None,
+    log: LogFunc = print,
+) -> Optional[Path]:
+    """Capture service configuration via sc.exe. Returns the written file (None in dry-run mode)."""
     destination_dir.mkdir(parents=True, exist_ok=True)
     target = destination_dir / f"{sanitize_name(service_name)}.txt"
     cmd = ["sc.exe", "qc", service_name]
-    result = run_command(cmd, dry_run=dry_run)
+    result = run_command(cmd, dry_run=dry_run, runner=runner, log=log)
     description = None
     if not dry_run:
-        description_result = subprocess.run(
-            ["sc.exe", "qdescription", service_name],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
-        )
+        description_result = (runner or subprocess_runner)(["sc.exe", "qdescription", service_name])
         description = description_result.stdout if description_result.returncode == 0 else ""
     if dry_run:
-        return
-    with target.open("w", encoding="utf-8") as handle:
-        handle.write(result.stdout if result else "")
-        handle.write("\n")
-        if description:
-            handle.write(description)
+        return None
+    text = (result.stdout if result else "") + "\n" + (description or "")
+    commit_capture(text.replace("\n", os.linesep).encode("utf-8"), target, index, log=log)
+    return target
 
 
-def capture_scheduled_task(task_name: str, destination_dir: Path, dry_run: bool = False) -> None:
-    """Export scheduled task definition."""
+def capture_scheduled_task(
+    task_name: str,
+    destination_dir: Path,
+    dry_run: bool = False,
+    index: Optional[PackageIndex] = None,
+    runner: Optional[CommandRunner] = None,
+    log: LogFunc = print,
+) -> Optional[Path]:
+    """Export scheduled task definition. Returns the written file (None in dry-run mode)."""
     destination_dir.mkdir(parents=True, exist_ok=True)
     sanitized = sanitize_name(task_name.strip("\\/"))
     target = destination_dir / f"{sanitized}.xml"
     cmd = ["schtasks", "/query", "/tn", task_name, "/xml"]
-    result = run_command(cmd, dry_run=dry_run)
+    result = run_command(cmd, dry_run=dry_run, runner=runner, log=log)
     if dry_run:
-        return
-    with target.open("w", encoding="utf-8") as handle:
-        handle.write(result.stdout if result else "")
+        return None
+    text = result.stdout if result else ""
+    commit_capture(text.replace("\n", os.linesep).encode("utf-8"), target, index, log=log)
+    return target
+
+
+def timed_capture(
+    events: package_events.EventBus,
+    stage: str,
+    target: str,
+    cancel: Optional[threading.Event],
+    func: Callable[..., Optional[Path]],
+    *args: Any,
+    **kwargs: Any,
+) -> Optional[Path]:
+    """Run one capture inside a timed stage so slow reg/sc/schtasks calls show up in the event stream."""
+    check_cancelled(cancel)
+    with events.stage(stage, target=target):
+        return func(*args, **kwargs)
+
+
+class CaptureScheduler:
+    """Run independent capture jobs (registry/service/task exports) on a bounded thread pool.
+
+    Each job logs into its own buffer; buffers are replayed in submission order, one
+    job at a time, so output is never interleaved even though the jobs overlap with
+    each other and with the file copies running on the caller's thread.
+    """
+
+    def __init__(self, workers: int = DEFAULT_CAPTURE_WORKERS) -> None:
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capture")
+        self._jobs: List[Tuple[str, Future[None], List[str]]] = []
+        self._flushed = 0
 
+    def submit(self, description: str, func: Callable[..., None], *args: Any, **kwargs: Any) -> None:
+        """Queue ``func(*args, log=..., **kwargs)``; ``description`` names the job in error reports."""
+        lines: List[str] = []
+        future = self._pool.submit(func, *args, log=lines.append, **kwargs)
+        self._jobs.append((description, future, lines))
 
-def copy_shortcut(source: Path, destination_dir: Path, dry_run: bool = False) -> None:
+    def flush_ready(self) -> None:
+        """Print the logs of finished jobs, stopping at the first one still running."""
+        while self._flushed < len(self._jobs):
+            _description, future, lines = self._jobs[self._flushed]
+            if not future.done():
+                return
+            for line in lines:
+                print(line)
+            self._flushed += 1
+
+    def wait(self) -> None:
+        """Wait for every job, print remaining logs in order and raise if any job failed."""
+        failures: List[str] = []
+        cancelled: Optional[PackagingCancelled] = None
+        for description, future, _lines in self._jobs:
+            exc = future.exception()
+            if isinstance(exc, PackagingCancelled):
+                cancelled = exc
+            elif exc is not None:
+                failures.append(f"{description}: {exc}")
+        self.flush_ready()
+        if cancelled:
+            raise cancelled
+        if failures:
+            joined = "\n".join(failures)
+            raise RuntimeError(f"{len(failures)} capture job(s) failed:\n{joined}")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def copy_shortcut(
+    source: Path,
+    destination_dir: Path,
+    dry_run: bool = False,
+    blob_store: Optional[BlobStore] = None,
+    index: Optional[PackageIndex] = None,
+    link_mode: str = "copy",
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
     """Copy shortcut or auxiliary file."""
     destination_dir.mkdir(parents=True, exist_ok=True)
     destination = destination_dir / source.name
-    copy_file(source, destination, dry_run=dry_run)
+    copy_file(
+        source,
+        destination,
+        dry_run=dry_run,
+        blob_store=blob_store,
+        index=index,
+        link_mode=link_mode,
+        events=events,
+        cancel=cancel,
+    )
 
 
 def load_config(config_path: Path) -> Dict[str, Any]:
@@ -146,22 +1112,218 @@ def load_config(config_path: Path) -> Dict[str, Any]:
         return json.load(handle)
 
 
-def validate_paths(items: Iterable[str], what: str) -> None:
-    missing = []
-    for path in items:
-        p = expand_path(path)
-        if not p.exists():
-            missing.append(str(p))
+def validate_paths(items: Iterable[str], what: str, workers: int = DEFAULT_COPY_WORKERS) -> None:
+    paths = [expand_path(path) for path in items]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        exists = list(pool.map(Path.exists, paths))
+    missing = [str(p) for p, found in zip(paths, exists) if not found]
     if missing:
         joined = "\n".join(missing)
         raise FileNotFoundError(f"The following {what} were not found:\n{joined}")
 
 
-def create_manifest(output_dir: Path, payload: Dict[str, Any], dry_run: bool) -> None:
-    manifest = {
+ScanResult = Tuple[List[Tuple[str, int]], List[str], List[Tuple[str, str, int]], List[Tuple[str, int, int]]]
+
+
+def _scan_directory(root: Path, relative: str, rules: Optional[package_rules.PathRules] = None) -> ScanResult:
+    """List one directory: (kept files, subdirectories, excluded files, excluded subdirectories with their totals)."""
+    files: List[Tuple[str, int]] = []
+    subdirs: List[str] = []
+    dropped: List[Tuple[str, str, int]] = []
+    pruned: List[Tuple[str, int, int]] = []
+    prefix = f"{relative}/" if relative else ""
+    with os.scandir(root / relative) as entries:
+        for entry in entries:
+            path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if rules and rules.directory_reason(path):
+                    pruned.append((path, *package_rules.tree_size(Path(entry.path))))
+                else:
+                    subdirs.append(path)
+            elif entry.is_file():
+                stat = entry.stat()
+                reason = rules.file_reason(path, stat.st_size, stat.st_mtime) if rules else None
+                if reason:
+                    dropped.append((path, reason, stat.st_size))
+                else:
+                    files.append((path, stat.st_size))
+    return files, subdirs, dropped, pruned
+
+
+def scan_tree(
+    root: Path,
+    workers: int = DEFAULT_COPY_WORKERS,
+    rules: Optional[package_rules.PathRules] = None,
+    excluded: Optional[package_rules.PruneStats] = None,
+) -> Iterator[Tuple[str, int]]:
+    """Yield (relative posix path, size) for every file below ``root``, scanning directories in parallel.
+
+    Each directory listing is a pool task that hands its subdirectories back as new
+    tasks, so wide trees and slow network shares are stat'ed concurrently. Files and
+    folders dropped by ``rules`` are not yielded but counted into ``excluded``.
+    """
+    excluded = excluded if excluded is not None else package_rules.PruneStats()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending: Set[Future[ScanResult]] = {pool.submit(_scan_directory, root, "", rules)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs, dropped, pruned = future.result()
+                yield from files
+                for _path, reason, size in dropped:
+                    excluded.add(reason, size)
+                for path, count, size in pruned:
+                    excluded.add_directory(path, count, size)
+                for subdir in subdirs:
+                    pending.add(pool.submit(_scan_directory, root, subdir, rules))
+
+
+def _existing_anchor(path: Path) -> Path:
+    while not path.exists() and path.parent != path:
+        path = path.parent
+    return path
+
+
+def plan_package(
+    config: Dict[str, Any],
+    output_dir: Path,
+    workers: int = DEFAULT_COPY_WORKERS,
+    throughput_mib_s: float = PLAN_THROUGHPUT_MIB_S,
+) -> Dict[str, Any]:
+    """Build a JSON-serialisable size/time plan for packaging ``config`` into ``output_dir``.
+
+    Reports per-entry file counts and bytes, the largest files, groups of equally
+    sized files (likely duplicates, see --blob-store), an estimated copy time and
+    whether the target volume has room. Files and folders dropped by the config's
+    include/exclude rules are left out of the totals and reported under "excluded".
+    """
+    entries: List[Dict[str, Any]] = []
+    largest: List[Tuple[int, str]] = []
+    by_size: Dict[int, List[str]] = {}
+    total_files = 0
+    total_bytes = 0
+    excluded = package_rules.PruneStats()
+
+    def account(display: str, size: int) -> None:
+        nonlocal total_files, total_bytes
+        total_files += 1
+        total_bytes += size
+        if len(largest) < PLAN_TOP_N:
+            heapq.heappush(largest, (size, display))
+        elif size > largest[0][0]:
+            heapq.heapreplace(largest, (size, display))
+        if size >= PLAN_DUPLICATE_MIN_SIZE:
+            by_size.setdefault(size, []).append(display)
+
+    for entry in config.get("directories", []):
+        source = expand_path(entry["path"])
+        item: Dict[str, Any] = {"kind": "directory", "source": str(source), "files": 0, "bytes": 0}
+        rules = package_rules.PathRules.for_entry(config, entry)
+        dropped = package_rules.PruneStats()
+        try:
+            for relative, size in scan_tree(source, workers=workers, rules=rules, excluded=dropped):
+                item["files"] += 1
+                item["bytes"] += size
+                account(f"{source}{os.sep}{relative}", size)
+        except OSError as exc:
+            item["error"] = str(exc)
+        if rules:
+            item["excluded"] = dropped.to_dict()
+            excluded.merge(item["excluded"])
+        entries.append(item)
+
+    for kind, key in (("file", "files"), ("shortcut", "shortcuts")):
+        for raw in config.get(key, []):
+            source = expand_path(raw)
+            item = {"kind": kind, "source": str(source), "files": 0, "bytes": 0}
+            try:
+                size = source.stat().st_size
+                item.update(files=1, bytes=size)
+                account(str(source), size)
+            except OSError as exc:
+                item["error"] = str(exc)
+            entries.append(item)
+
+    duplicates = [
+        {"size": size, "count": len(paths), "reclaimable_bytes": size * (len(paths) - 1), "paths": paths[:5]}
+        for size, paths in by_size.items()
+        if len(paths) > 1
+    ]
+    duplicates.sort(key=lambda group: group["reclaimable_bytes"], reverse=True)
+    seconds = total_bytes / (throughput_mib_s * 1024 * 1024) + total_files * PLAN_PER_FILE_SECONDS
+    anchor = _existing_anchor(output_dir)
+    free_bytes = shutil.disk_usage(anchor).free
+    return {
+        "app_name": config.get("app_name", "PortableApp"),
+        "output_dir": str(output_dir),
+        "entries": entries,
+        "totals": {
+            "files": total_files,
+            "bytes": total_bytes,
+            "registry_keys": len(config.get("registry_keys", [])),
+            "services": len(config.get("services", [])),
+            "scheduled_tasks": len(config.get("scheduled_tasks", [])),
+            "excluded_files": excluded.files,
+            "excluded_bytes": excluded.bytes,
+        },
+        "excluded": excluded.to_dict(),
+        "largest_files": [{"path": path, "size": size} for size, path in sorted(largest, reverse=True)],
+        "duplicate_candidates": duplicates[:PLAN_TOP_N],
+        "estimate": {"throughput_mib_s": throughput_mib_s, "seconds": round(seconds, 1)},
+        "target": {"volume": str(anchor), "free_bytes": free_bytes, "fits": total_bytes <= free_bytes},
+    }
+
+
+def write_plan(plan: Dict[str, Any], plan_path: Union[Path, TextIO]) -> None:
+    """Write the plan as JSON to ``plan_path``: a file, an open text stream, or "-" for stdout."""
+    if str(plan_path) == "-":
+        plan_path = sys.stdout
+    if not isinstance(plan_path, Path):
+        json.dump(plan, plan_path, indent=2)
+        plan_path.write("\n")
+        plan_path.flush()
+        return
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    with plan_path.open("w", encoding="utf-8") as handle:
+        json.dump(plan, handle, indent=2)
+
+
+def print_plan(plan: Dict[str, Any]) -> None:
+    totals = plan["totals"]
+    print(f"[plan] {totals['files']} files, {totals['bytes']} bytes, estimated {plan['estimate']['seconds']}s")
+    for item in plan["entries"]:
+        status = f" ERROR: {item['error']}" if "error" in item else ""
+        print(f"[plan] {item['kind']} {item['source']}: {item['files']} files, {item['bytes']} bytes{status}")
+        if item.get("excluded", {}).get("files"):
+            print(f"[plan]   rules: {package_rules.describe(item['excluded'])}")
+    if totals.get("excluded_bytes"):
+        print(f"[plan] rules save {totals['excluded_bytes']} bytes ({totals['excluded_files']} files not copied)")
+    reclaimable = sum(group["reclaimable_bytes"] for group in plan["duplicate_candidates"])
+    if reclaimable:
+        print(f"[plan] duplicate candidates: up to {reclaimable} bytes reclaimable with --blob-store")
+    target = plan["target"]
+    verdict = "fits" if target["fits"] else "DOES NOT FIT"
+    print(f"[plan] target {target['volume']}: {target['free_bytes']} bytes free, package {verdict}")
+
+
+def create_manifest(
+    output_dir: Path,
+    payload: Dict[str, Any],
+    dry_run: bool,
+    blob_store: Optional[BlobStore] = None,
+    index: Optional[PackageIndex] = None,
+    excluded: Optional[Dict[str, Any]] = None,
+) -> None:
+    manifest: Dict[str, Any] = {
         "generated_at": datetime.utcnow().isoformat() + "Z",
         "payload": payload,
     }
+    if excluded:
+        manifest["excluded"] = excluded
+    if index:
+        manifest["files"] = dict(sorted(index.entries.items()))
+    if blob_store:
+        manifest["blob_store"] = blob_store.manifest_section()
     target = output_dir / "manifest.json"
     print(f"[manifest] {target}")
     if dry_run:
@@ -170,6 +1332,11 @@ def create_manifest(output_dir: Path, payload: Dict[str, Any], dry_run: bool) ->
         json.dump(manifest, handle, indent=2)
 
 
+def package_directory(entry: Dict[str, Any]) -> str:
+    """Top-level package folder a "directories" entry is copied into."""
+    return "ProgramData" if entry.get("type") == "data" else "ProgramFiles"
+
+
 def determine_destination_base(entry: Dict[str, Any]) -> str:
     target = entry.get("target") or Path(entry["path"]).name
     lower_target = target.lower()
@@ -189,9 +1356,9 @@ def restore_target_suffix(entry: Dict[str, Any]) -> str:
         parts = target.split("\\")
         if parts and parts[0].lower() == "localappdata":
             return "\\".join(parts[1:]) or "."
-    if lower_target.startswith("appdata\\local\\"):
+    if lower_target.startswith(("appdata\\local\\", "appdata\\roaming\\")):
         parts = target.split("\\")
-        # drop AppData and Local
+        # drop AppData and Local/Roaming
         return "\\".join(parts[2:]) or "."
     if ("\\appdata\\" in lower_target or lower_target.startswith("appdata\\")) and target.lower().startswith("appdata\\"):
         return target.split("\\", 1)[1]
@@ -205,6 +1372,7 @@ def write_restore_stub(output_dir: Path, payload: Dict[str, Any], dry_run: bool)
     lines.append("setlocal")
     lines.append(f"echo === Restore template for {payload.get('app_name', 'PortableApp')} ===")
     lines.append("echo Customize the commands below before running on the target machine.")
+    lines.append("REM Or restore everything in one step: python package_restore.py \"%~dp0.\"")
     lines.append("")
 
     directories: List[Dict[str, Any]] = payload.get("directories", [])
@@ -212,7 +1380,7 @@ def write_restore_stub(output_dir: Path, payload: Dict[str, Any], dry_run: bool)
         lines.append("REM === Copy directory trees ===")
         lines.append("REM Remove 'REM ' prefix once destinations look correct.")
         for entry in directories:
-            source_root = "ProgramFiles" if entry.get("type") == "program" else "ProgramData"
+            source_root = package_directory(entry)
             target_rel = entry.get("target") or Path(entry["path"]).name
             dest_base = determine_destination_base(entry)
             dest_suffix = restore_target_suffix(entry)
@@ -257,7 +1425,33 @@ def write_restore_stub(output_dir: Path, payload: Dict[str, Any], dry_run: bool)
     restore_cmd.write_text(contents, encoding="utf-8")
 
 
-def main(config_path: Path, output_dir: Path, dry_run: bool = False) -> None:
+def main(
+    config_path: Path,
+    output_dir: Path,
+    dry_run: bool = False,
+    copy_engine: str = "python",
+    copy_workers: int = DEFAULT_COPY_WORKERS,
+    blob_store_dir: Optional[Path] = None,
+    blob_link: str = "hardlink",
+    incremental: bool = False,
+    archive_path: Optional[Path] = None,
+    capture_workers: int = DEFAULT_CAPTURE_WORKERS,
+    runner: Optional[CommandRunner] = None,
+    plan_path: Optional[Union[Path, TextIO]] = None,
+    plan_throughput: float = PLAN_THROUGHPUT_MIB_S,
+    link_mode: str = "copy",
+    events: Optional[package_events.EventBus] = None,
+    cancel: Optional[threading.Event] = None,
+    catalog_path: Optional[Path] = None,
+) -> Optional[Dict[str, Any]]:
+    """Build the package. In dry-run mode nothing is written and the size/time plan is returned.
+
+    Progress is printed as before and, when ``events`` has sinks, also emitted as structured events.
+    Setting ``cancel`` (from another thread) stops the run with PackagingCancelled at the next
+    file, capture or step; re-running the same call resumes from the journal.
+    """
+    events = events or package_events.EventBus()
+    run_started = time.perf_counter()
     config = load_config(config_path)
     app_name = config.get("app_name", "PortableApp")
     directories = config.get("directories", [])
@@ -269,13 +1463,53 @@ def main(config_path: Path, output_dir: Path, dry_run: bool = False) -> None:
 
     output_dir = output_dir.resolve()
     print(f"[info] Packaging '{app_name}' into {output_dir}")
+    events.emit("run_start", app_name=app_name, output=str(output_dir), dry_run=dry_run)
+    plan: Optional[Dict[str, Any]] = None
+    if dry_run or plan_path:
+        with events.stage("plan") as counters:
+            plan = plan_package(config, output_dir, workers=copy_workers, throughput_mib_s=plan_throughput)
+            counters.update(files=plan["totals"]["files"], bytes=plan["totals"]["bytes"])
+        print_plan(plan)
+        if plan_path:
+            write_plan(plan, plan_path)
+    fingerprint = run_fingerprint(
+        config_path,
+        {
+            "copy_engine": copy_engine,
+            "link_mode": link_mode,
+            "blob_store": blob_store_dir,
+            "blob_link": blob_link,
+            "incremental": incremental,
+        },
+    )
+    journal = PackagingJournal(output_dir, fingerprint)
+    previous: Dict[str, Dict[str, Any]] = {}
     if not dry_run and output_dir.exists() and any(output_dir.iterdir()):
-        raise FileExistsError(f"Output directory '{output_dir}' is not empty. Provide an empty path or remove contents.")
+        if journal.exists():
+            journal.load()
+            if incremental:
+                previous = load_previous_index(output_dir)
+            previous.update(journal.files)
+            print(
+                f"[resume] {journal.path.name}: {len(journal.files)} files and {len(journal.steps)} steps "
+                "already done; continuing the interrupted run"
+            )
+        elif not incremental:
+            raise FileExistsError(
+                f"Output directory '{output_dir}' is not empty. Provide an empty path, remove contents "
+                "or use --incremental to update the existing package."
+            )
+        else:
+            previous = load_previous_index(output_dir)
+            print(f"[incremental] Comparing against {len(previous)} files recorded in manifest.json")
     output_dir.mkdir(parents=True, exist_ok=True)
+    index = PackageIndex(output_dir, previous)
 
-    validate_paths([item["path"] for item in directories if "path" in item], "directories")
-    validate_paths(files, "files")
-    validate_paths(shortcuts, "shortcuts")
+    with events.stage("validate"):
+        validate_paths([item["path"] for item in directories if "path" in item], "directories", workers=copy_workers)
+        validate_paths(files, "files", workers=copy_workers)
+        validate_paths(shortcuts, "shortcuts", workers=copy_workers)
+    blob_store = BlobStore(blob_store_dir, link_mode=blob_link) if blob_store_dir else None
 
     payload = {
         "app_name": app_name,
@@ -286,44 +1520,172 @@ def main(config_path: Path, output_dir: Path, dry_run: bool = False) -> None:
         "scheduled_tasks": tasks,
         "shortcuts": shortcuts,
     }
+    if config.get("rules"):
+        payload["rules"] = config["rules"]
+    # Compiled up front so a bad pattern fails before anything is copied.
+    directory_rules = [package_rules.PathRules.for_entry(config, entry) for entry in directories]
+    if copy_engine == "robocopy" and any(directory_rules):
+        raise ValueError("Include/exclude rules require the python copy engine.")
+    if copy_engine == "python" and os.name == "nt" and directories:
+        print(
+            "[warn] The python copy engine keeps contents, timestamps and permission bits only; "
+            "ACLs, owner and file attributes are lost. Use --copy-engine robocopy when they matter.",
+            file=sys.stderr,
+        )
+    excluded = package_rules.PruneStats()
 
     prog_files_dir = output_dir / "ProgramFiles"
-    data_dir = output_dir / "ProgramData"
     registry_dir = output_dir / "Registry"
     services_dir = output_dir / "Services"
     tasks_dir = output_dir / "Tasks"
     shortcuts_dir = output_dir / "Shortcuts"
 
-    for entry in directories:
-        source = expand_path(entry["path"])
-        target_rel = Path(entry.get("target", source.name))
-        target_root = data_dir if entry.get("type") == "data" else prog_files_dir
-        destination = (target_root / target_rel).resolve()
-        copy_directory(source, destination, dry_run=dry_run)
+    # Only now that the config has been validated: a run that fails before this leaves no journal
+    # behind, so fixing the config and re-running does not trip over a fingerprint mismatch.
+    if not dry_run:
+        journal.open()
+        index.journal = journal
+
+    # Captures only spawn reg/sc/schtasks and wait, so they run in the background while files copy.
+    scheduler = CaptureScheduler(capture_workers)
+    capture_options = {"dry_run": dry_run, "index": index, "runner": runner}
+
+    def submit_capture(stage: str, name: str, func: Callable[..., Optional[Path]], *args: Any) -> None:
+        description = f"{stage} {name}"
+        if journal.is_done(description):
+            index.carry(journal.files, journal.steps[description])
+            print(f"[resume] {description}: already captured")
+            return
+        scheduler.submit(
+            description,
+            journal.run_step,
+            description,
+            timed_capture,
+            events,
+            stage,
+            name,
+            cancel,
+            func,
+            *args,
+            **capture_options,
+        )
 
-    for file_path in files:
-        source = expand_path(file_path)
-        destination = prog_files_dir / source.name
-        copy_file(source, destination, dry_run=dry_run)
+    try:
+        for key in registry_keys:
+            check_cancelled(cancel)
+            safe_name = sanitize_name(key)
+            destination = registry_dir / f"{safe_name}.reg"
+            submit_capture("registry", key, export_registry, key, destination)
 
-    for key in registry_keys:
-        safe_name = sanitize_name(key)
-        destination = registry_dir / f"{safe_name}.reg"
-        export_registry(key, destination, dry_run=dry_run)
+        for service_name in services:
+            submit_capture("service", service_name, capture_service, service_name, services_dir)
 
-    for service_name in services:
-        capture_service(service_name, services_dir, dry_run=dry_run)
+        for task_name in tasks:
+            submit_capture("task", task_name, capture_scheduled_task, task_name, tasks_dir)
+
+        for entry, rules in zip(directories, directory_rules):
+            source = expand_path(entry["path"])
+            target_rel = Path(entry.get("target", source.name))
+            target_root = output_dir / package_directory(entry)
+            destination = (target_root / target_rel).resolve()
+            step = f"directory {index.key(destination)}"
+            check_cancelled(cancel)
+            if journal.is_done(step):
+                carried = index.carry(journal.files, journal.steps[step])
+                excluded.merge(journal.excluded.get(step, {}))
+                print(f"[resume] {destination}: already copied ({carried} files)")
+                continue
+            stats = copy_directory(
+                source,
+                destination,
+                dry_run=dry_run,
+                engine=copy_engine,
+                workers=copy_workers,
+                blob_store=blob_store,
+                index=index,
+                link_mode=link_mode,
+                events=events,
+                cancel=cancel,
+                rules=rules,
+            )
+            dropped = stats.get("excluded") if stats else None
+            if dropped:
+                excluded.merge(dropped)
+            journal.step_done(step, index.key(destination), dropped)
+            scheduler.flush_ready()
 
-    for task_name in tasks:
-        capture_scheduled_task(task_name, tasks_dir, dry_run=dry_run)
+        copy_options = {
+            "dry_run": dry_run,
+            "blob_store": blob_store,
+            "index": index,
+            "link_mode": link_mode,
+            "events": events,
+            "cancel": cancel,
+        }
+        with events.stage("files") as counters:
+            for file_path in files:
+                source = expand_path(file_path)
+                destination = prog_files_dir / source.name
+                check_cancelled(cancel)
+                copy_file(source, destination, **copy_options)
+            counters["files"] = len(files)
 
-    for shortcut_path in shortcuts:
-        source = expand_path(shortcut_path)
-        copy_shortcut(source, shortcuts_dir, dry_run=dry_run)
+        with events.stage("shortcuts") as counters:
+            for shortcut_path in shortcuts:
+                source = expand_path(shortcut_path)
+                check_cancelled(cancel)
+                copy_shortcut(source, shortcuts_dir, **copy_options)
+            counters["files"] = len(shortcuts)
 
-    create_manifest(output_dir, payload, dry_run=dry_run)
-    write_restore_stub(output_dir, payload, dry_run=dry_run)
+        # Time spent here is capture work that did not fit behind the copies.
+        check_cancelled(cancel)
+        with events.stage("capture_wait"):
+            scheduler.wait()
+    finally:
+        scheduler.close()
+        journal.close()
+
+    if previous:
+        with events.stage("remove_stale") as counters:
+            removed = remove_stale(index)
+            counters["files"] = removed
+        tag = "resume" if journal.files else "incremental"
+        print(f"[{tag}] {index.reused} files unchanged ({index.reused_bytes} bytes reused), {removed} removed")
+
+    if blob_store:
+        print(
+            f"[blob store] {blob_store.blobs_written} new blobs ({blob_store.bytes_written} bytes), "
+            f"{blob_store.duplicates} duplicates skipped ({blob_store.bytes_deduplicated} bytes)"
+        )
+    with events.stage("manifest") as counters:
+        create_manifest(
+            output_dir,
+            payload,
+            dry_run=dry_run,
+            blob_store=blob_store,
+            index=index,
+            excluded=excluded.to_dict() if any(directory_rules) else None,
+        )
+        write_restore_stub(output_dir, payload, dry_run=dry_run)
+        counters["files"] = len(index.entries)
+    if not dry_run:
+        journal.finish()
+    if archive_path:
+        print(f"[archive] {output_dir} -> {archive_path}")
+        if not dry_run:
+            with events.stage("archive", archive=str(archive_path)) as counters:
+                stats = package_archive.write_archive(output_dir, archive_path)
+                counters.update(files=stats["files"], bytes=stats["bytes"], archive_bytes=stats["archive_bytes"])
+            print(f"[archive] {stats['files']} files, {stats['bytes']} bytes -> {stats['archive_bytes']} bytes")
+    if catalog_path and not dry_run:
+        with events.stage("catalog", catalog=str(catalog_path)) as counters:
+            with package_catalog.PackageCatalog(catalog_path) as catalog:
+                result = catalog.add_package(output_dir)
+            counters["files"] = result.get("added", 0) + result.get("changed", 0) + result.get("removed", 0)
+        print(f"[catalog] {catalog_path}: package {result['status']}")
+    events.emit("run_end", app_name=app_name, duration=round(time.perf_counter() - run_started, 6))
     print("[done] Portable package created.")
+    return plan
 
 
 if __name__ == "__main__":
@@ -333,12 +1695,124 @@ if __name__ == "__main__":
         "--output",
         type=Path,
         required=True,
-        help="Destination folder for the portable package (must be empty).",
+        help="Destination folder for the portable package (must be empty unless --incremental).",
     )
     parser.add_argument("--dry-run", action="store_true", help="Print commands without copying/exporting.")
+    parser.add_argument(
+        "--copy-engine",
+        choices=COPY_ENGINES,
+        default="python",
+        help=(
+            "Directory copy backend: built-in parallel copier (default; does not copy ACLs, owner or "
+            "attributes) or robocopy /MIR /COPYALL."
+        ),
+    )
+    parser.add_argument(
+        "--copy-workers",
+        type=int,
+        default=DEFAULT_COPY_WORKERS,
+        help=f"Concurrent file copies for the python engine (default: {DEFAULT_COPY_WORKERS}).",
+    )
+    parser.add_argument(
+        "--blob-store",
+        type=Path,
+        help="Shared content-addressed store; identical files are written once and referenced from the package.",
+    )
+    parser.add_argument(
+        "--blob-link",
+        choices=BLOB_LINK_MODES,
+        default="hardlink",
+        help="How package files reference blobs: hardlink into the tree (default) or manifest entry only.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Update an existing package: copy only new/changed files and remove deleted ones.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=Path,
+        help="Also pack the finished package into this single compressed archive (.ppkg).",
+    )
+    parser.add_argument(
+        "--capture-workers",
+        type=int,
+        default=DEFAULT_CAPTURE_WORKERS,
+        help=f"Registry/service/task captures run at the same time (default: {DEFAULT_CAPTURE_WORKERS}).",
+    )
+    parser.add_argument(
+        "--plan-output",
+        type=Path,
+        help=(
+            "Write the size/time plan (always computed for --dry-run) as JSON to this file, or '-' for stdout "
+            "(progress then goes to stderr)."
+        ),
+    )
+    parser.add_argument(
+        "--plan-throughput",
+        type=float,
+        default=PLAN_THROUGHPUT_MIB_S,
+        help=f"Copy rate in MiB/s assumed by the plan's time estimate (default: {PLAN_THROUGHPUT_MIB_S:g}).",
+    )
+    parser.add_argument(
+        "--link-mode",
+        choices=LINK_MODES,
+        default="copy",
+        help=(
+            "copy: buffered copy with hashing (default); clone: reflink, else copy_file_range/sendfile; "
+            "hardlink: like clone but hardlinks files on the same volume (package shares them with the source)."
+        ),
+    )
+    parser.add_argument(
+        "--catalog",
+        type=Path,
+        help="Record the finished package in this SQLite catalog (see package_catalog.py).",
+    )
+    parser.add_argument(
+        "--events",
+        type=Path,
+        help="Write structured progress events (stages, files, retries) as JSON lines to this file, or '-' for stdout.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help="Run under cProfile, write the stats to this file and print a per-stage timing breakdown.",
+    )
     args = parser.parse_args()
-    try:
-        main(args.config, args.output, dry_run=args.dry_run)
-    except Exception as exc:  # pragma: no cover - utility script
-        print(f"[error] {exc}", file=sys.stderr)
-        sys.exit(1)
+    # With '-' the JSON owns stdout (the plan, events or both), so the human-readable progress goes
+    # to stderr and the output stays parseable. Both streams are picked before the redirect.
+    plan_output = sys.stdout if str(args.plan_output) == "-" else args.plan_output
+    bus = package_events.EventBus()
+    sink = package_events.JsonlSink(args.events) if args.events else None
+    if sink:
+        bus.add_sink(sink)
+    to_stdout = "-" in (str(args.plan_output), str(args.events))
+    with contextlib.redirect_stdout(sys.stderr) if to_stdout else contextlib.nullcontext():
+        try:
+            with package_events.profiled(args.profile):
+                main(
+                    args.config,
+                    args.output,
+                    dry_run=args.dry_run,
+                    copy_engine=args.copy_engine,
+                    copy_workers=args.copy_workers,
+                    blob_store_dir=args.blob_store,
+                    blob_link=args.blob_link,
+                    incremental=args.incremental,
+                    archive_path=args.archive,
+                    capture_workers=args.capture_workers,
+                    plan_path=plan_output,
+                    plan_throughput=args.plan_throughput,
+                    link_mode=args.link_mode,
+                    events=bus,
+                    catalog_path=args.catalog,
+                )
+        except Exception as exc:  # pragma: no cover - utility script
+            print(f"[error] {exc}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if sink:
+                sink.close()
+        if args.profile:
+            for line in bus.breakdown():
+                print(f"[timing] {line}")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Convert a Process Monitor log (File → Save… as CSV or XML) into a portable_packager
+configuration JSON, the same shape trace_xml_to_config.py produces.
+
+Usage:
+    python procmon_to_config.py Logfile.CSV --output config.json --process setup.exe --process msiexec.exe
+
+The log is streamed row by row (CSV) or event by event (XML), so multi-million
+event captures are converted in one pass without loading them into memory.
+Only successful write-like operations are kept by default; reads and failed
+operations are ignored unless requested.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+import xml.etree.ElementTree as ET
+
+import trace_xml_to_config
+
+FILE_OPERATIONS = {
+    "CreateFile",
+    "WriteFile",
+    "SetRenameInformationFile",
+    "SetEndOfFileInformationFile",
+    "SetAllocationInformationFile",
+}
+# RegSetInfoKey is left out: ProcMon logs it (KeySetHandleTagsInformation) on plain opens of existing keys.
+REGISTRY_OPERATIONS = {"RegCreateKey", "RegSetValue"}
+DEFAULT_OPERATIONS = FILE_OPERATIONS | REGISTRY_OPERATIONS
+# Operations whose Path ends with a value name rather than a key.
+VALUE_OPERATIONS = {"RegSetValue", "RegDeleteValue", "RegQueryValue"}
+CREATE_WRITE_MARKERS = (
+    "Generic Write",
+    "Write Data",
+    "Append Data",
+    "OpenResult: Created",
+    "OpenResult: Overwritten",
+    "OpenResult: Superseded",
+)
+# RegCreateKey also opens existing keys (Disposition: REG_OPENED_EXISTING_KEY); only new keys count as writes.
+CREATE_KEY_MARKERS = ("REG_CREATED_NEW_KEY",)
+DEFAULT_DEDUP_CAPACITY = 1 << 16
+SERVICE_KEY = re.compile(r"^HKLM\\SYSTEM\\(?:CurrentControlSet|ControlSet\d{3})\\Services\\([^\\]+)", re.IGNORECASE)
+TASKS_DIR = "\\windows\\system32\\tasks\\"
+CSV_COLUMNS = {
+    "process": "Process Name",
+    "pid": "PID",
+    "operation": "Operation",
+    "path": "Path",
+    "result": "Result",
+    "detail": "Detail",
+}
+XML_FIELDS = {
+    "Process_Name": "process",
+    "PID": "pid",
+    "Operation": "operation",
+    "Path": "path",
+    "Result": "result",
+    "Detail": "detail",
+}
+
+
+class ProcmonEvent(NamedTuple):
+    process: str
+    pid: str
+    operation: str
+    path: str
+    result: str
+    detail: str
+
+
+class RecentSet:
+    """Fixed-capacity set of recently seen keys (LRU eviction).
+
+    ProcMon repeats the same operation on the same path thousands of times; this
+    drops those repeats before any normalisation work while keeping memory bounded
+    no matter how many events the log holds.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_DEDUP_CAPACITY) -> None:
+        self.capacity = max(1, capacity)
+        self._keys: "OrderedDict[tuple, None]" = OrderedDict()
+
+    def seen(self, key: tuple) -> bool:
+        """Return True if ``key`` was seen recently; otherwise remember it and return False."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        self._keys[key] = None
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+        return False
+
+
+def iter_csv_events(log_path: Path) -> Iterator[ProcmonEvent]:
+    """Yield events from a ProcMon CSV export (UTF-8, optional BOM, header row)."""
+    with log_path.open("r", encoding="utf-8-sig", errors="replace", newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = {name: index for index, name in enumerate(header)}
+        missing = [column for column in ("Operation", "Path") if column not in positions]
+        if missing:
+            raise ValueError(f"{log_path} is not a Process Monitor CSV export (missing columns: {', '.join(missing)})")
+        columns = [positions.get(CSV_COLUMNS[field]) for field in ProcmonEvent._fields]
+        for row in reader:
+            yield ProcmonEvent(*(row[i] if i is not None and i < len(row) else "" for i in columns))
+
+
+def iter_xml_events(log_path: Path) -> Iterator[ProcmonEvent]:
+    """Yield events from a ProcMon XML export, detaching each <event> once it has been read."""
+    open_elements: List[ET.Element] = []
+    for event, elem in ET.iterparse(log_path, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if elem.tag == "event":
+            values = {field: "" for field in ProcmonEvent._fields}
+            for child in elem:
+                field = XML_FIELDS.get(child.tag)
+                if field:
+                    values[field] = child.text or ""
+            yield ProcmonEvent(**values)
+        # Fields stay attached until their <event> has been read; everything else goes as soon as it ends.
+        if open_elements and open_elements[-1].tag != "event":
+            elem.clear()
+            open_elements[-1].remove(elem)
+
+
+def iter_events(log_path: Path, log_format: Optional[str] = None) -> Iterator[ProcmonEvent]:
+    log_format = log_format or ("xml" if log_path.suffix.lower() == ".xml" else "csv")
+    if log_format == "xml":
+        return iter_xml_events(log_path)
+    return iter_csv_events(log_path)
+
+
+def make_event_filter(
+    processes: Optional[Iterable[str]] = None,
+    pids: Optional[Iterable[str]] = None,
+    operations: Optional[Iterable[str]] = None,
+    include_failures: bool = False,
+    include_reads: bool = False,
+) -> Callable[[ProcmonEvent], bool]:
+    """Compile the process/PID/operation/result selection into a single predicate."""
+    process_set = {name.lower() for name in processes or []}
+    pid_set = {str(pid) for pid in pids or []}
+    operation_set = set(operations or DEFAULT_OPERATIONS)
+
+    def matches(event: ProcmonEvent) -> bool:
+        if event.operation not in operation_set or not event.path:
+            return False
+        if process_set and event.process.lower() not in process_set:
+            return False
+        if pid_set and event.pid not in pid_set:
+            return False
+        if not include_failures and event.result and event.result != "SUCCESS":
+            return False
+        if event.operation == "CreateFile" and not include_reads and event.detail:
+            return any(marker in event.detail for marker in CREATE_WRITE_MARKERS)
+        if event.operation == "RegCreateKey" and not include_reads and event.detail:
+            return any(marker in event.detail for marker in CREATE_KEY_MARKERS)
+        return True
+
+    return matches
+
+
+def classify_event(event: ProcmonEvent, sets: trace_xml_to_config.PathSets) -> None:
+    """Add the event's path to the (files, registry keys, services, tasks) sets."""
+    file_paths, registry_keys, services, tasks = sets
+    path = trace_xml_to_config.normalize_path(event.path)
+    if path.upper().startswith("HK"):
+        if event.operation in VALUE_OPERATIONS and "\\" in path:
+            path = path.rsplit("\\", 1)[0]
+        registry_keys.add(path)
+        service = SERVICE_KEY.match(path)
+        if service:
+            services.add(service.group(1))
+        return
+    lower = path.lower()
+    task_at = lower.find(TASKS_DIR)
+    if task_at != -1:
+        tasks.add("\\" + path[task_at + len(TASKS_DIR):])
+        return
+    if ":" in path or path.startswith("\\\\"):
+        file_paths.add(path)
+
+
+def build_procmon_config(
+    log_path: Path,
+    app_name: Optional[str] = None,
+    processes: Optional[Iterable[str]] = None,
+    pids: Optional[Iterable[str]] = None,
+    operations: Optional[Iterable[str]] = None,
+    include_failures: bool = False,
+    include_reads: bool = False,
+    log_format: Optional[str] = None,
+    dedup_capacity: int = DEFAULT_DEDUP_CAPACITY,
+) -> Dict[str, object]:
+    matches = make_event_filter(processes, pids, operations, include_failures, include_reads)
+    recent = RecentSet(dedup_capacity)
+    sets: trace_xml_to_config.PathSets = (set(), set(), set(), set())
+    total = matched = duplicates = 0
+    started = time.perf_counter()
+    for event in iter_events(log_path, log_format):
+        total += 1
+        if not matches(event):
+            continue
+        if recent.seen((event.operation, event.path)):
+            duplicates += 1
+            continue
+        matched += 1
+        classify_event(event, sets)
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed > 0 else float(total)
+    print(
+        f"[procmon] {total} events in {elapsed:.2f}s ({rate:,.0f} events/s), "
+        f"{matched} kept, {duplicates} repeated events skipped"
+    )
+    return trace_xml_to_config.assemble_config(sets, app_name or log_path.stem)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a Process Monitor CSV/XML log to portable config.")
+    parser.add_argument("log", type=Path, help="Process Monitor log saved as CSV or XML.")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="Output JSON config path.")
+    parser.add_argument("--app-name", help="Override app name (defaults to log filename).")
+    parser.add_argument("--format", choices=("csv", "xml"), help="Log format (defaults to the file extension).")
+    parser.add_argument(
+        "--process",
+        action="append",
+        default=[],
+        help="Keep events from this process name (repeatable, case-insensitive). Default: all processes.",
+    )
+    parser.add_argument("--pid", action="append", default=[], help="Keep events from this PID (repeatable).")
+    parser.add_argument(
+        "--operation",
+        action="append",
+        help=f"Keep this operation (repeatable). Default: {', '.join(sorted(DEFAULT_OPERATIONS))}.",
+    )
+    parser.add_argument("--include-failures", action="store_true", help="Keep events whose Result is not SUCCESS.")
+    parser.add_argument(
+        "--include-reads",
+        action="store_true",
+        help="Keep CreateFile events that only open for reading and RegCreateKey events that open an existing key.",
+    )
+    parser.add_argument(
+        "--dedup-capacity",
+        type=int,
+        default=DEFAULT_DEDUP_CAPACITY,
+        help=f"Recently seen events remembered to skip repeats (default: {DEFAULT_DEDUP_CAPACITY}).",
+    )
+    args = parser.parse_args()
+    try:
+        config = build_procmon_config(
+            args.log,
+            args.app_name,
+            processes=args.process,
+            pids=args.pid,
+            operations=args.operation,
+            include_failures=args.include_failures,
+            include_reads=args.include_reads,
+            log_format=args.format,
+            dedup_capacity=args.dedup_capacity,
+        )
+    except (OSError, ValueError, ET.ParseError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(config, handle, indent=2)
+    print(f"[done] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,805 @@
+#!/usr/bin/env python3
+"""
+Read, index, filter, merge, diff and rewrite registry exports (.reg files).
+
+Usage:
+    python reg_snapshot.py index Registry/HKLM_SOFTWARE_Vendor.reg [--depth 3] [--top 20]
+    python reg_snapshot.py show Registry/HKCU_Software_Vendor.reg "HKCU\\Software\\Vendor\\Settings"
+    python reg_snapshot.py filter export.reg --output clean.reg [--exclude PATTERN ...] [--no-default-excludes]
+    python reg_snapshot.py merge base.reg overrides.reg --output merged.reg
+    python reg_snapshot.py diff before.reg after.reg [--output patch.reg] [--json report.json]
+    python reg_snapshot.py rewrite export.reg --output target.reg --map "C:\\Users\\alice=C:\\Users\\bob"
+
+Exports are read in 1 MiB blocks and split into lines before decoding, so
+memory is bounded by the largest single key rather than by the file; merge and
+diff work from an index that keeps only each key's byte range and re-read keys
+on demand. UTF-16 (regedit and reg.exe), UTF-8 and REGEDIT4 (ANSI) exports are
+accepted, including hex values continued over several lines. Output is always
+UTF-16 LE with a BOM and the "Version 5.00" header, like regedit writes it.
+
+Patterns (--exclude/--include) are matched case-insensitively against the
+whole key path, `*` matches any run of characters and `?` one character; a
+matching key excludes its whole subtree. HKLM/HKCU/HKCR/HKU/HKCC may be used
+instead of the full hive names.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+HEADER_V5 = "Windows Registry Editor Version 5.00"
+HEADER_V4 = "REGEDIT4"
+READ_SIZE = 1024 * 1024
+HEX_LINE_WIDTH = 80
+
+REG_NONE = 0
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+TYPE_NAMES = {
+    REG_NONE: "REG_NONE",
+    REG_SZ: "REG_SZ",
+    REG_EXPAND_SZ: "REG_EXPAND_SZ",
+    REG_BINARY: "REG_BINARY",
+    REG_DWORD: "REG_DWORD",
+    5: "REG_DWORD_BIG_ENDIAN",
+    6: "REG_LINK",
+    REG_MULTI_SZ: "REG_MULTI_SZ",
+    8: "REG_RESOURCE_LIST",
+    REG_QWORD: "REG_QWORD",
+}
+
+HIVES = {
+    "HKLM": "HKEY_LOCAL_MACHINE",
+    "HKCU": "HKEY_CURRENT_USER",
+    "HKCR": "HKEY_CLASSES_ROOT",
+    "HKU": "HKEY_USERS",
+    "HKCC": "HKEY_CURRENT_CONFIG",
+}
+
+# Keys Windows and common apps rewrite on every use (recent files, shell view state,
+# usage counters). They are machine/user history rather than app configuration.
+DEFAULT_EXCLUDES = (
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\RecentDocs",
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\RunMRU",
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\TypedPaths",
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\ComDlg32",
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\UserAssist",
+    r"*\Software\Microsoft\Windows\CurrentVersion\Explorer\FeatureUsage",
+    r"*\Software\Microsoft\Windows\Shell\BagMRU",
+    r"*\Software\Microsoft\Windows\Shell\Bags",
+    r"*\Local Settings\Software\Microsoft\Windows\Shell\MuiCache",
+    r"*\Local Settings\Software\Microsoft\Windows\Shell\BagMRU",
+    r"*\Local Settings\Software\Microsoft\Windows\Shell\Bags",
+    r"*MRU",
+    r"*\Recent File List",
+    r"*\Recent Folder List",
+)
+
+_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_ESCAPE = re.compile(r"\\(.)")
+_HEX_PREFIX = re.compile(r"hex(?:\(([0-9a-fA-F]+)\))?:", re.IGNORECASE)
+
+
+@dataclass
+class RegValue:
+    """One value line. ``kind`` is the REG_* type number, or None for a deletion ("name"=-).
+
+    ``data`` is decoded where the type allows it: str for REG_SZ/REG_EXPAND_SZ,
+    a list of str for REG_MULTI_SZ, int for REG_DWORD/REG_QWORD and bytes otherwise
+    (including string types whose bytes are not valid UTF-16).
+    """
+
+    name: str
+    kind: Optional[int]
+    data: Any = None
+
+    @property
+    def ident(self) -> str:
+        """Value names are case-insensitive; "" is the default value (@)."""
+        return self.name.upper()
+
+
+@dataclass
+class RegKey:
+    path: str
+    values: List[RegValue] = field(default_factory=list)
+    deleted: bool = False
+
+
+def normalize_key(path: str) -> str:
+    """Expand hive abbreviations and drop surrounding backslashes."""
+    path = path.strip().strip("\\")
+    hive, sep, rest = path.partition("\\")
+    return HIVES.get(hive.upper(), hive) + sep + rest
+
+
+def tree_order(path: str) -> Tuple[str, ...]:
+    """Sort key placing every key right before its own subkeys."""
+    return tuple(normalize_key(path).upper().split("\\"))
+
+
+# ------------------------------ Reading -------------------------------- #
+def detect_encoding(head: bytes) -> Tuple[str, int]:
+    """Return (codec, BOM length) for the first bytes of an export."""
+    if head.startswith(b"\xff\xfe"):
+        return "utf-16-le", 2
+    if head.startswith(b"\xfe\xff"):
+        return "utf-16-be", 2
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8", 3
+    if head.startswith(HEADER_V4.encode("ascii")):
+        return "cp1252", 0
+    return "utf-8", 0
+
+
+def _iter_lines(handle: BinaryIO, encoding: str, start: int, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yield (byte offset, text) for each line between ``start`` and ``end``.
+
+    Lines are split on the encoded newline before decoding; for UTF-16 only
+    newlines on a code-unit boundary count, so a 0x0A byte inside a character is
+    never taken for one.
+    """
+    newline = "\n".encode(encoding)
+    width = len(newline)
+    handle.seek(start)
+    remaining = None if end is None else end - start
+    buffer = b""
+    base = start
+    while remaining is None or remaining > 0:
+        chunk = handle.read(READ_SIZE if remaining is None else min(READ_SIZE, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        buffer = buffer + chunk if buffer else chunk
+        pos = 0
+        while True:
+            found = buffer.find(newline, pos)
+            while found != -1 and (found - pos) % width:
+                found = buffer.find(newline, found + 1)
+            if found == -1:
+                break
+            yield base + pos, buffer[pos:found].decode(encoding, errors="replace").rstrip("\r")
+            pos = found + width
+        buffer = buffer[pos:]
+        base += pos
+    if buffer:
+        yield base, buffer.decode(encoding, errors="replace").rstrip("\r")
+
+
+def _logical_lines(lines: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+    """Join hex data continued with a trailing backslash onto one line."""
+    pending: Optional[List[str]] = None
+    pending_offset = 0
+    for offset, text in lines:
+        if pending is None:
+            if not text.endswith("\\") or text.startswith("["):
+                yield offset, text
+                continue
+            pending, pending_offset = [], offset
+        else:
+            text = text.lstrip()
+        if text.endswith("\\"):
+            pending.append(text[:-1])
+        else:
+            pending.append(text)
+            yield pending_offset, "".join(pending)
+            pending = None
+    if pending is not None:
+        yield pending_offset, "".join(pending)
+
+
+def _unescape(text: str) -> str:
+    return _ESCAPE.sub(r"\1", text) if "\\" in text else text
+
+
+def _decode_raw(kind: int, raw: bytes) -> Any:
+    if kind in (REG_SZ, REG_EXPAND_SZ, REG_MULTI_SZ) and len(raw) % 2 == 0:
+        try:
+            text = raw.decode("utf-16-le")
+        except UnicodeDecodeError:
+            return raw
+        if kind != REG_MULTI_SZ:
+            return text.rstrip("\x00")
+        items = text.split("\x00")
+        while items and items[-1] == "":
+            items.pop()
+        return items
+    if kind == REG_DWORD and len(raw) == 4 or kind == REG_QWORD and len(raw) == 8:
+        return int.from_bytes(raw, "little")
+    return raw
+
+
+def _parse_data(text: str) -> Tuple[Optional[int], Any]:
+    if text == "-":
+        return None, None
+    if text.startswith('"'):
+        match = _QUOTED.match(text)
+        if not match or text[match.end():].strip():
+            raise ValueError(f"malformed string value {text[:60]!r}")
+        return REG_SZ, _unescape(match.group(1))
+    if text[:6].lower() == "dword:":
+        return REG_DWORD, int(text[6:], 16)
+    match = _HEX_PREFIX.match(text)
+    if match:
+        kind = int(match.group(1), 16) if match.group(1) else REG_BINARY
+        raw = bytes.fromhex(text[match.end():].replace(",", ""))
+        return kind, _decode_raw(kind, raw)
+    raise ValueError(f"unknown value data {text[:60]!r}")
+
+
+def parse_value(line: str) -> RegValue:
+    """Parse one logical value line ("name"=data or @=data)."""
+    if line.startswith("@"):
+        name, rest = "", line[1:].lstrip()
+    else:
+        match = _QUOTED.match(line)
+        if not match:
+            raise ValueError(f"malformed value name {line[:60]!r}")
+        name, rest = _unescape(match.group(1)), line[match.end():].lstrip()
+    if not rest.startswith("="):
+        raise ValueError(f"missing '=' in {line[:60]!r}")
+    try:
+        kind, data = _parse_data(rest[1:].strip())
+    except ValueError as exc:
+        raise ValueError(f"value '{name or '@'}': {exc}") from None
+    return RegValue(name, kind, data)
+
+
+def _parse_keys(
+    lines: Iterable[Tuple[int, str]],
+    source: Path,
+    end: int,
+    parse_values: bool = True,
+) -> Iterator[Tuple[RegKey, int, int, int]]:
+    """Yield (key, start offset, end offset, value count) for each key block.
+
+    With ``parse_values`` False the value lines are only counted, which is all
+    the index needs.
+    """
+    current: Optional[RegKey] = None
+    start = count = 0
+    for offset, text in _logical_lines(lines):
+        line = text.strip()
+        if not line or line.startswith(";"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            if current is not None:
+                yield current, start, offset, count
+            inner = line[1:-1]
+            deleted = inner.startswith("-")
+            current = RegKey(inner[1:] if deleted else inner, deleted=deleted)
+            start, count = offset, 0
+        elif current is None:
+            if line not in (HEADER_V5, HEADER_V4):
+                raise ValueError(f"{source}: not a registry export (unexpected {line[:60]!r} at byte {offset})")
+        else:
+            count += 1
+            if parse_values:
+                try:
+                    current.values.append(parse_value(line))
+                except ValueError as exc:
+                    raise ValueError(f"{source}: [{current.path}] {exc} at byte {offset}") from None
+    if current is not None:
+        yield current, start, end, count
+
+
+def _open(path: Path) -> Tuple[BinaryIO, str, int, int]:
+    handle = path.open("rb")
+    encoding, bom = detect_encoding(handle.read(16))
+    size = os.fstat(handle.fileno()).st_size
+    return handle, encoding, bom, size
+
+
+def iter_keys(path: Path) -> Iterator[RegKey]:
+    """Stream the keys of an export in file order, one parsed key at a time."""
+    handle, encoding, bom, size = _open(path)
+    with handle:
+        for key, _start, _end, _count in _parse_keys(_iter_lines(handle, encoding, bom), path, size):
+            yield key
+
+
+class RegIndex:
+    """Byte range of every key in an export, for reading single keys without a full parse.
+
+    Per key only the path, two offsets and a value count are kept (in arrays), so
+    the index of a multi-hundred-MB export is a small fraction of its size. A key
+    that appears more than once is read back from all of its blocks, later values
+    winning.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.paths: List[str] = []
+        self.size = 0
+        self.encoding = "utf-8"
+        self._starts = array("q")
+        self._ends = array("q")
+        self._counts = array("l")
+        self._positions: Dict[str, int] = {}
+        self._repeats: Dict[str, List[int]] = {}
+        self._handle: Optional[BinaryIO] = None
+
+    @classmethod
+    def build(cls, path: Path) -> "RegIndex":
+        index = cls(path)
+        handle, index.encoding, bom, index.size = _open(path)
+        index._handle = handle
+        lines = _iter_lines(handle, index.encoding, bom)
+        for key, start, end, count in _parse_keys(lines, path, index.size, parse_values=False):
+            position = len(index.paths)
+            index.paths.append(key.path)
+            index._starts.append(start)
+            index._ends.append(end)
+            index._counts.append(-1 if key.deleted else count)
+            ident = normalize_key(key.path).upper()
+            if ident in index._positions:
+                index._repeats.setdefault(ident, [index._positions[ident]]).append(position)
+            else:
+                index._positions[ident] = position
+        return index
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, path: str) -> bool:
+        return normalize_key(path).upper() in self._positions
+
+    def __enter__(self) -> "RegIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def keys(self) -> Iterator[str]:
+        """Distinct key paths in file order."""
+        for position in self._positions.values():
+            yield self.paths[position]
+
+    def value_count(self) -> int:
+        return sum(count for count in self._counts if count > 0)
+
+    def block_sizes(self) -> Iterator[Tuple[str, int]]:
+        for position, path in enumerate(self.paths):
+            yield path, self._ends[position] - self._starts[position]
+
+    def _read_block(self, position: int) -> RegKey:
+        if self._handle is None:
+            self._handle = self.path.open("rb")
+        lines = _iter_lines(self._handle, self.encoding, self._starts[position], self._ends[position])
+        for key, _start, _end, _count in _parse_keys(lines, self.path, self._ends[position]):
+            return key
+        raise ValueError(f"{self.path}: index out of date at byte {self._starts[position]}")
+
+    def read(self, path: str) -> Optional[RegKey]:
+        ident = normalize_key(path).upper()
+        position = self._positions.get(ident)
+        if position is None:
+            return None
+        if ident not in self._repeats:
+            return self._read_block(position)
+        merged = RegKey(self.paths[position])
+        values: Dict[str, RegValue] = {}
+        for block in map(self._read_block, self._repeats[ident]):
+            if block.deleted:
+                values.clear()
+            merged.deleted = block.deleted
+            values.update((value.ident, value) for value in block.values)
+        merged.values = list(values.values())
+        return merged
+
+
+# ------------------------------ Writing -------------------------------- #
+def _quote(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _hex_value(head: str, raw: bytes) -> str:
+    """regedit layout: comma-separated bytes wrapped before 80 columns, continued with a backslash."""
+    text = raw.hex(",")
+    first = max(1, (HEX_LINE_WIDTH - 1 - len(head)) // 3) * 3
+    if len(text) <= first:
+        return head + text
+    step = (HEX_LINE_WIDTH - 3) // 3 * 3
+    lines = [head + text[:first]]
+    lines.extend("  " + text[pos : pos + step] for pos in range(first, len(text), step))
+    return "\\\n".join(lines)
+
+
+def format_value(value: RegValue) -> str:
+    name = "@" if value.name == "" else _quote(value.name)
+    kind, data = value.kind, value.data
+    if kind is None:
+        return f"{name}=-"
+    prefix = f"{name}=hex:" if kind == REG_BINARY else f"{name}=hex({kind:x}):"
+    if isinstance(data, (bytes, bytearray)):
+        return _hex_value(prefix, bytes(data))
+    if kind == REG_SZ and not any(char in data for char in "\r\n\x00"):
+        return f"{name}={_quote(data)}"
+    if kind == REG_DWORD:
+        return f"{name}=dword:{data:08x}"
+    if kind in (REG_SZ, REG_EXPAND_SZ):
+        raw = (data + "\x00").encode("utf-16-le")
+    elif kind == REG_MULTI_SZ:
+        raw = ("".join(item + "\x00" for item in data) + "\x00").encode("utf-16-le")
+    elif kind == REG_QWORD:
+        raw = data.to_bytes(8, "little")
+    else:
+        raise ValueError(f"cannot encode {TYPE_NAMES.get(kind, kind)} value '{value.name}' from {type(data).__name__}")
+    return _hex_value(prefix, raw)
+
+
+def format_key(key: RegKey) -> str:
+    if key.deleted:
+        return f"[-{key.path}]\n\n"
+    body = "".join(format_value(value) + "\n" for value in key.values)
+    return f"[{key.path}]\n{body}\n"
+
+
+class RegWriter:
+    """Write keys to a .reg file as regedit does (UTF-16 LE, BOM, CRLF).
+
+    The file is written under a ``.partial`` name and only renamed into place
+    when the writer is closed without an error.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.keys = 0
+        self.values = 0
+        self._partial = path.with_name(path.name + ".partial")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = self._partial.open("w", encoding="utf-16-le", newline="\r\n")
+        self._handle.write("\ufeff" + HEADER_V5 + "\n\n")
+
+    def write(self, key: RegKey) -> None:
+        self._handle.write(format_key(key))
+        self.keys += 1
+        self.values += len(key.values)
+
+    def __enter__(self) -> "RegWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self._handle.close()
+        if exc_type is None:
+            os.replace(self._partial, self.path)
+        else:
+            self._partial.unlink(missing_ok=True)
+
+
+# ------------------------------ Operations ----------------------------- #
+def compile_patterns(patterns: Sequence[str]) -> Optional["re.Pattern[str]"]:
+    """One regex matching any key covered by ``patterns`` (the key itself or a subkey)."""
+    if not patterns:
+        return None
+    alternatives = []
+    for pattern in patterns:
+        escaped = re.escape(normalize_key(pattern))
+        alternatives.append(escaped.replace(r"\*", ".*").replace(r"\?", "."))
+    return re.compile(r"(?:" + "|".join(alternatives) + r")(?:\\.*)?", re.IGNORECASE | re.DOTALL)
+
+
+def profile_rewriter(mapping: Sequence[Tuple[str, str]]) -> Callable[[str], str]:
+    """Return a function replacing each old profile path with its new one.
+
+    Paths are matched case-insensitively and only as whole path components, in
+    their plain, forward-slash and JSON-escaped (doubled backslash) spellings.
+    """
+    variants: Dict[str, str] = {}
+    for old, new in mapping:
+        old, new = old.rstrip("\\/"), new.rstrip("\\/")
+        variants[old.upper()] = new
+        variants[old.replace("\\", "/").upper()] = new.replace("\\", "/")
+        variants[old.replace("\\", "\\\\").upper()] = new.replace("\\", "\\\\")
+    if not variants:
+        return lambda text: text
+    alternatives = "|".join(re.escape(variant) for variant in sorted(variants, key=len, reverse=True))
+    pattern = re.compile(rf"(?:{alternatives})(?=$|[\\/;,\"'\s\x00])", re.IGNORECASE)
+
+    def rewrite(text: str) -> str:
+        return pattern.sub(lambda match: variants[match.group(0).upper()], text) if text else text
+
+    return rewrite
+
+
+def rewrite_key(key: RegKey, rewrite: Callable[[str], str]) -> int:
+    """Apply ``rewrite`` to the key path, value names and string data. Returns how many values changed.
+
+    A REG_SZ value that ends up containing %VARIABLES% becomes REG_EXPAND_SZ so
+    they are expanded on the target machine.
+    """
+    key.path = rewrite(key.path)
+    changed = 0
+    for value in key.values:
+        name, data = rewrite(value.name), value.data
+        if isinstance(data, str):
+            data = rewrite(data)
+        elif isinstance(data, list):
+            data = [rewrite(item) for item in data]
+        if name != value.name or data != value.data:
+            if value.kind == REG_SZ and isinstance(data, str) and "%" in data and "%" not in value.data:
+                value.kind = REG_EXPAND_SZ
+            value.name, value.data = name, data
+            changed += 1
+    return changed
+
+
+def transform_snapshot(
+    source: Path,
+    destination: Path,
+    exclude: Sequence[str] = DEFAULT_EXCLUDES,
+    include: Sequence[str] = (),
+    rewrite: Optional[Callable[[str], str]] = None,
+) -> Dict[str, int]:
+    """Stream ``source`` to ``destination``, dropping excluded subtrees and rewriting paths."""
+    excluded = compile_patterns(exclude)
+    included = compile_patterns(include)
+    stats = {"keys": 0, "values": 0, "dropped_keys": 0, "dropped_values": 0, "rewritten_values": 0}
+    with RegWriter(destination) as writer:
+        for key in iter_keys(source):
+            path = normalize_key(key.path)
+            if (excluded and excluded.fullmatch(path)) or (included and not included.fullmatch(path)):
+                stats["dropped_keys"] += 1
+                stats["dropped_values"] += len(key.values)
+                continue
+            if rewrite:
+                stats["rewritten_values"] += rewrite_key(key, rewrite)
+            writer.write(key)
+        stats["keys"], stats["values"] = writer.keys, writer.values
+    return stats
+
+
+def _union_keys(indexes: Sequence[RegIndex]) -> List[str]:
+    seen: Dict[str, str] = {}
+    for index in indexes:
+        for path in index.keys():
+            seen.setdefault(normalize_key(path).upper(), path)
+    return sorted(seen.values(), key=tree_order)
+
+
+def merge_snapshots(sources: Sequence[Path], destination: Path) -> Dict[str, int]:
+    """Merge exports in order; later files win per value, as if imported one after another.
+
+    Deletions ([-key] and "name"=-) in a later file discard what earlier files
+    had for that key (and its subtree) and are kept in the output, so the merged
+    file has the same effect when imported.
+    """
+    indexes = [RegIndex.build(path) for path in sources]
+    try:
+        # (subtree, first source still visible inside it) for deleted ancestors of the current key
+        floors: List[Tuple[Tuple[str, ...], int]] = []
+        with RegWriter(destination) as writer:
+            for path in _union_keys(indexes):
+                order = tree_order(path)
+                while floors and order[: len(floors[-1][0])] != floors[-1][0]:
+                    floors.pop()
+                floor = floors[-1][1] if floors else 0
+                values: Dict[str, RegValue] = {}
+                deleted_in: Optional[int] = None
+                present = False
+                for position in range(floor, len(indexes)):
+                    key = indexes[position].read(path)
+                    if key is None:
+                        continue
+                    if key.deleted:
+                        values.clear()
+                        deleted_in, present = position, False
+                    else:
+                        present = True
+                        values.update((value.ident, value) for value in key.values)
+                if deleted_in is not None:
+                    writer.write(RegKey(path, deleted=True))
+                    floors.append((order, deleted_in))
+                if present:
+                    writer.write(RegKey(path, list(values.values())))
+            return {"sources": len(indexes), "keys": writer.keys, "values": writer.values}
+    finally:
+        for index in indexes:
+            index.close()
+
+
+@dataclass
+class KeyDiff:
+    """Change of one key between two snapshots. A removed key stands for its whole subtree."""
+
+    path: str
+    status: str  # "added", "removed" or "changed"
+    added: List[RegValue] = field(default_factory=list)
+    removed: List[RegValue] = field(default_factory=list)
+    changed: List[Tuple[RegValue, RegValue]] = field(default_factory=list)
+
+
+def diff_snapshots(before: Path, after: Path) -> Iterator[KeyDiff]:
+    """Yield the keys that differ between two exports, parents before children."""
+    with RegIndex.build(before) as old_index, RegIndex.build(after) as new_index:
+        removed_root: Optional[Tuple[str, ...]] = None
+        for path in _union_keys([old_index, new_index]):
+            order = tree_order(path)
+            if removed_root and order[: len(removed_root)] == removed_root:
+                continue
+            removed_root = None
+            old, new = old_index.read(path), new_index.read(path)
+            old = None if old is None or old.deleted else old
+            new = None if new is None or new.deleted else new
+            if new is None:
+                if old is not None:
+                    removed_root = order
+                    yield KeyDiff(path, "removed", removed=old.values)
+                continue
+            if old is None:
+                yield KeyDiff(path, "added", added=new.values)
+                continue
+            old_values = {value.ident: value for value in old.values}
+            diff = KeyDiff(path, "changed")
+            for value in new.values:
+                previous = old_values.pop(value.ident, None)
+                if previous is None:
+                    diff.added.append(value)
+                elif (previous.kind, previous.data) != (value.kind, value.data):
+                    diff.changed.append((previous, value))
+            diff.removed = list(old_values.values())
+            if diff.added or diff.removed or diff.changed:
+                yield diff
+
+
+def diff_to_key(diff: KeyDiff) -> RegKey:
+    """The .reg block that turns the "before" state of this key into the "after" state."""
+    if diff.status == "removed":
+        return RegKey(diff.path, deleted=True)
+    values = diff.added + [new for _old, new in diff.changed]
+    values += [RegValue(value.name, None) for value in diff.removed]
+    return RegKey(diff.path, values)
+
+
+def _describe(value: RegValue) -> Dict[str, Any]:
+    data = value.data
+    if isinstance(data, (bytes, bytearray)):
+        data = bytes(data).hex()
+    return {"name": value.name, "type": TYPE_NAMES.get(value.kind, value.kind), "data": data}
+
+
+def _record(report: Dict[str, Any], diff: KeyDiff) -> None:
+    if diff.status != "changed":
+        report[f"{diff.status}_keys"].append(diff.path)
+        return
+    report["changed_keys"][diff.path] = {
+        "added": [_describe(value) for value in diff.added],
+        "removed": [value.name for value in diff.removed],
+        "changed": [{"before": _describe(old), "after": _describe(new)} for old, new in diff.changed],
+    }
+
+
+def diff_report(diffs: Iterable[KeyDiff], patch: Optional[Path] = None) -> Dict[str, Any]:
+    """Summarise ``diffs`` as JSON-friendly data, optionally writing them as a .reg patch too."""
+    report: Dict[str, Any] = {"added_keys": [], "removed_keys": [], "changed_keys": {}}
+    if patch is None:
+        for diff in diffs:
+            _record(report, diff)
+        return report
+    with RegWriter(patch) as writer:
+        for diff in diffs:
+            writer.write(diff_to_key(diff))
+            _record(report, diff)
+    return report
+
+
+# --------------------------------- CLI --------------------------------- #
+def parse_mapping(values: Sequence[str]) -> List[Tuple[str, str]]:
+    mapping = []
+    for value in values:
+        old, sep, new = value.partition("=")
+        if not sep or not old or not new:
+            raise ValueError(f"Invalid --map '{value}' (expected OLD=NEW, e.g. C:\\Users\\alice=C:\\Users\\bob)")
+        mapping.append((old, new))
+    return mapping
+
+
+def print_index(index: RegIndex, depth: int, top: int) -> None:
+    print(f"[index] {index.path}: {len(index)} keys, {index.value_count()} values, {index.size} bytes ({index.encoding})")
+    subtrees: Dict[str, int] = {}
+    for path, size in index.block_sizes():
+        prefix = "\\".join(path.split("\\")[:depth])
+        subtrees[prefix] = subtrees.get(prefix, 0) + size
+    for prefix, size in sorted(subtrees.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"[index] {size / 1048576:>10.2f} MiB  {prefix}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream, index, filter, merge, diff and rewrite .reg exports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    index_cmd = sub.add_parser("index", help="Count keys/values and show the largest subtrees.")
+    index_cmd.add_argument("source", type=Path)
+    index_cmd.add_argument("--depth", type=int, default=3, help="Key depth to group sizes by (default: 3).")
+    index_cmd.add_argument("--top", type=int, default=20)
+    show_cmd = sub.add_parser("show", help="Print one key.")
+    show_cmd.add_argument("source", type=Path)
+    show_cmd.add_argument("key")
+    for name, help_text in (("filter", "Drop volatile/excluded subtrees."), ("rewrite", "Rewrite user-profile paths.")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("source", type=Path)
+        cmd.add_argument("--output", type=Path, required=True)
+        cmd.add_argument("--exclude", action="append", default=[], help="Key pattern to drop (repeatable).")
+        cmd.add_argument("--include", action="append", default=[], help="Keep only keys matching these patterns.")
+        cmd.add_argument("--map", action="append", default=[], help="OLD=NEW path replacement (repeatable).")
+        if name == "filter":
+            cmd.add_argument(
+                "--no-default-excludes",
+                action="store_true",
+                help="Do not drop the built-in MRU/shell-state keys.",
+            )
+    merge_cmd = sub.add_parser("merge", help="Merge exports; later files win.")
+    merge_cmd.add_argument("sources", type=Path, nargs="+")
+    merge_cmd.add_argument("--output", type=Path, required=True)
+    diff_cmd = sub.add_parser("diff", help="Compare two exports.")
+    diff_cmd.add_argument("before", type=Path)
+    diff_cmd.add_argument("after", type=Path)
+    diff_cmd.add_argument("--output", type=Path, help="Write a .reg patch turning BEFORE into AFTER.")
+    diff_cmd.add_argument("--json", type=Path, help="Write the detailed report as JSON.")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "index":
+            with RegIndex.build(args.source) as index:
+                print_index(index, args.depth, args.top)
+        elif args.command == "show":
+            with RegIndex.build(args.source) as index:
+                key = index.read(args.key)
+            if key is None:
+                raise ValueError(f"Key not found: {args.key}")
+            sys.stdout.write(format_key(key))
+        elif args.command in ("filter", "rewrite"):
+            mapping = parse_mapping(args.map)
+            defaults = args.command == "filter" and not args.no_default_excludes
+            exclude = list(args.exclude) + (list(DEFAULT_EXCLUDES) if defaults else [])
+            stats = transform_snapshot(
+                args.source,
+                args.output,
+                exclude=exclude,
+                include=args.include,
+                rewrite=profile_rewriter(mapping) if mapping else None,
+            )
+            print(
+                f"[{args.command}] {stats['keys']} keys / {stats['values']} values kept, "
+                f"{stats['dropped_keys']} keys / {stats['dropped_values']} values dropped, "
+                f"{stats['rewritten_values']} values rewritten -> {args.output}"
+            )
+        elif args.command == "merge":
+            stats = merge_snapshots(args.sources, args.output)
+            print(f"[merge] {stats['sources']} files -> {stats['keys']} keys, {stats['values']} values in {args.output}")
+        else:
+            report = diff_report(diff_snapshots(args.before, args.after), args.output)
+            print(
+                f"[diff] {len(report['added_keys'])} keys added, {len(report['removed_keys'])} removed, "
+                f"{len(report['changed_keys'])} changed"
+            )
+            if args.output:
+                print(f"[diff] Patch written to {args.output}")
+            if args.json:
+                with args.json.open("w", encoding="utf-8") as handle:
+                    json.dump(report, handle, indent=2, ensure_ascii=False)
+                print(f"[diff] Report written to {args.json}")
+    except (OSError, ValueError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Trace an installation with before/after filesystem snapshots and turn the
+difference into a portable_packager configuration JSON, the same shape
+trace_xml_to_config.py produces.
+
+Usage:
+    python snapshot_to_config.py scan before.snap --root "C:\\Program Files" --root %AppData% --root %LocalAppData%
+    (install and run the app)
+    python snapshot_to_config.py diff before.snap --output config.json --app-name ProtonPass
+    python snapshot_to_config.py diff before.snap after.snap --output config.json --changes changes.txt
+    python snapshot_to_config.py show before.snap
+
+scan inventories every root (path, size, mtime, inode) on a process pool: the
+top levels of each root are split into subtrees, each worker walks its subtree
+depth first in name order and returns it as zlib-compressed record blocks, and
+the blocks are written in path order. The snapshot is therefore compact on
+disk and sorted, and diff compares two snapshots as a streaming merge without
+loading either one. diff without a second snapshot rescans the roots recorded
+in the first one (--save keeps that scan).
+
+Added files and folders and modified files (size, mtime or inode changed)
+become the config; folders keep only their topmost new ancestor, exactly as
+trace_xml_to_config reduces traced paths, and new files under
+Windows\\System32\\Tasks become scheduled tasks. Deleted entries are only
+reported. --root PATH=AS records PATH but reports it as AS, e.g.
+--root /tmp/scratch/pf="C:\\Program Files" to try the whole flow on Linux.
+--exclude/--preset prune noisy folders (package_rules syntax) during the scan.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path, PureWindowsPath
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import package_rules
+import procmon_to_config
+import trace_xml_to_config
+
+SNAPSHOT_MAGIC = b"PPSNAP1\n"
+SNAPSHOT_FORMAT = 1
+BLOCK = struct.Struct("<I")
+BLOCK_RECORDS = 16384
+COMPRESS_LEVEL = 1
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Split the top of each root until there are this many subtrees per worker (or MAX_SPLIT_DEPTH is reached).
+UNITS_PER_WORKER = 4
+MAX_SPLIT_DEPTH = 3
+_WINDOWS_ROOT = re.compile(r"^(?:[A-Za-z]:|\\\\|%[^%]+%)")
+
+# (root index, kind "d"/"f"/"l", size, mtime_ns, inode, "/"-separated path relative to the root)
+Record = Tuple[int, str, int, int, int, str]
+# A scan item in output order: an encoded record, or a subtree to walk (root index, relative path).
+Item = Union[bytes, Tuple[int, str]]
+
+
+# -------------------------------- Scan --------------------------------- #
+def _encode(index: int, kind: str, stat: os.stat_result, relative: str) -> bytes:
+    size = 0 if kind == "d" else stat.st_size
+    return f"{index}\t{kind}\t{size}\t{stat.st_mtime_ns}\t{stat.st_ino}\t{relative}\0".encode("utf-8", "surrogateescape")
+
+
+def _kind(entry: os.DirEntry) -> str:
+    if entry.is_symlink():
+        return "l"
+    return "d" if entry.is_dir(follow_symlinks=False) else "f"
+
+
+def _listing(path: str) -> List[os.DirEntry]:
+    """Entries of ``path`` in name order; unreadable folders are recorded but not walked."""
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+
+def _record(index: int, parent: str, entry: os.DirEntry, rules: Optional[package_rules.PathRules]) -> Optional[Tuple[str, bytes]]:
+    """(kind, encoded record) for one entry, or None when it vanished or the rules drop it."""
+    path = f"{parent}/{entry.name}" if parent else entry.name
+    kind = _kind(entry)
+    try:
+        stat = entry.stat(follow_symlinks=False)
+    except OSError:
+        return None
+    if rules:
+        if kind == "d" and rules.directory_reason(path):
+            return None
+        if kind != "d" and rules.file_reason(path, stat.st_size, stat.st_mtime):
+            return None
+    return kind, _encode(index, kind, stat, path)
+
+
+def walk_subtree(index: int, root: str, relative: str, rules_spec: Optional[Dict[str, Any]]) -> Tuple[List[bytes], int]:
+    """Records of everything below ``relative``, depth first in name order. Runs in a worker process.
+
+    Returns the compressed record blocks and the record count.
+    """
+    rules = package_rules.PathRules(rules_spec) if rules_spec else None
+    lines: List[bytes] = []
+    blocks: List[bytes] = []
+    count = 0
+    parents = [relative]
+    stack = [iter(_listing(os.path.join(root, relative)))]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            parents.pop()
+            continue
+        record = _record(index, parents[-1], entry, rules)
+        if record is None:
+            continue
+        lines.append(record[1])
+        count += 1
+        if len(lines) >= BLOCK_RECORDS:
+            blocks.append(zlib.compress(b"".join(lines), COMPRESS_LEVEL))
+            lines.clear()
+        if record[0] == "d":
+            # A folder's contents follow the folder itself, before its next sibling.
+            path = f"{parents[-1]}/{entry.name}" if parents[-1] else entry.name
+            parents.append(path)
+            stack.append(iter(_listing(entry.path)))
+    if lines:
+        blocks.append(zlib.compress(b"".join(lines), COMPRESS_LEVEL))
+    return blocks, count
+
+
+def plan_units(roots: List[Dict[str, str]], workers: int, rules: Optional[package_rules.PathRules]) -> List[Item]:
+    """Records for the top of each root plus the subtrees below, in output order.
+
+    Folders are expanded one level at a time, largest level first, until there are
+    enough subtrees to keep ``workers`` processes busy.
+    """
+    items: List[Item] = [(index, "") for index in range(len(roots))]
+    for _depth in range(MAX_SPLIT_DEPTH + 1):
+        if sum(1 for item in items if isinstance(item, tuple)) >= workers * UNITS_PER_WORKER:
+            break
+        expanded: List[Item] = []
+        for item in items:
+            if isinstance(item, bytes):
+                expanded.append(item)
+                continue
+            index, relative = item
+            for entry in _listing(os.path.join(roots[index]["path"], relative)):
+                record = _record(index, relative, entry, rules)
+                if record is None:
+                    continue
+                expanded.append(record[1])
+                if record[0] == "d":
+                    expanded.append((index, f"{relative}/{entry.name}" if relative else entry.name))
+        items = expanded
+    return items
+
+
+def parse_root(value: str) -> Dict[str, str]:
+    """--root PATH or PATH=AS: the folder to scan and how its paths appear in the config."""
+    path, sep, reported = value.partition("=")
+    expanded = os.path.abspath(os.path.expanduser(os.path.expandvars(path.strip().strip('"'))))
+    return {"path": expanded, "as": reported.strip().strip('"') if sep else expanded}
+
+
+def scan(
+    snapshot: Path,
+    roots: List[Dict[str, str]],
+    rules_spec: Optional[Dict[str, Any]] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> Dict[str, Any]:
+    """Write a snapshot of ``roots`` to ``snapshot``. Returns its header (with the record count)."""
+    roots = sorted(roots, key=lambda root: root["path"])
+    for root in roots:
+        if not os.path.isdir(root["path"]):
+            raise ValueError(f"Root '{root['path']}' is not a folder")
+    rules = package_rules.PathRules(rules_spec) if rules_spec else None
+    started = time.perf_counter()
+    items = plan_units(roots, max(1, workers), rules)
+    header: Dict[str, Any] = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "roots": roots,
+        "rules": rules_spec or {},
+    }
+    count = 0
+    partial = snapshot.with_name(snapshot.name + ".partial")
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    with partial.open("wb") as out, ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        out.write(SNAPSHOT_MAGIC)
+        out.write(json.dumps(header).encode("utf-8") + b"\n")
+        futures: List[Union[bytes, Future[Tuple[List[bytes], int]]]] = [
+            item if isinstance(item, bytes) else pool.submit(walk_subtree, item[0], roots[item[0]]["path"], item[1], rules_spec)
+            for item in items
+        ]
+        lines: List[bytes] = []
+        # Blocks are written in item order, whichever worker finishes first.
+        for item in futures:
+            if isinstance(item, bytes):
+                lines.append(item)
+                count += 1
+                continue
+            if lines:
+                _write_block(out, zlib.compress(b"".join(lines), COMPRESS_LEVEL))
+                lines.clear()
+            blocks, subtree_count = item.result()
+            for block in blocks:
+                _write_block(out, block)
+            count += subtree_count
+        if lines:
+            _write_block(out, zlib.compress(b"".join(lines), COMPRESS_LEVEL))
+        out.write(BLOCK.pack(0))
+        out.write(json.dumps({"records": count, "seconds": round(time.perf_counter() - started, 3)}).encode("utf-8") + b"\n")
+    os.replace(partial, snapshot)
+    header["records"] = count
+    return header
+
+
+def _write_block(out: BinaryIO, block: bytes) -> None:
+    out.write(BLOCK.pack(len(block)))
+    out.write(block)
+
+
+# -------------------------------- Read --------------------------------- #
+class Snapshot:
+    """Streaming reader: the header is read on open, records are decompressed block by block."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._handle: BinaryIO = path.open("rb")
+        try:
+            if self._handle.readline() != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a snapshot")
+            self.header: Dict[str, Any] = json.loads(self._handle.readline())
+        except Exception:
+            self._handle.close()
+            raise
+        if self.header.get("format") != SNAPSHOT_FORMAT:
+            self._handle.close()
+            raise ValueError(f"Unsupported snapshot format {self.header.get('format')} in {path}")
+        self.roots: List[Dict[str, str]] = self.header["roots"]
+        self.footer: Dict[str, Any] = {}
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def records(self) -> Iterator[Record]:
+        while True:
+            (length,) = BLOCK.unpack(self._handle.read(BLOCK.size))
+            if not length:
+                break
+            for raw in zlib.decompress(self._handle.read(length)).split(b"\0")[:-1]:
+                index, kind, size, mtime_ns, inode, relative = raw.decode("utf-8", "surrogateescape").split("\t", 5)
+                yield int(index), kind, int(size), int(mtime_ns), int(inode), relative
+        self.footer = json.loads(self._handle.readline() or b"{}")
+
+
+# -------------------------------- Diff --------------------------------- #
+def _keyed(snapshot: Snapshot) -> Iterator[Tuple[Tuple[str, str], Record]]:
+    """Records keyed so that the snapshot's own order is ascending: (root path, path with "/" sorting first)."""
+    roots = [root["path"] for root in snapshot.roots]
+    for record in snapshot.records():
+        yield (roots[record[0]], record[5].replace("/", "\0")), record
+
+
+def diff_records(before: Snapshot, after: Snapshot) -> Iterator[Tuple[str, Record]]:
+    """Merge two snapshots and yield ("added" | "modified" | "removed", record) for every change.
+
+    Folders whose mtime changed are not reported; their changed contents are.
+    """
+    old_iter, new_iter = _keyed(before), _keyed(after)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield "removed", old[1]
+            old = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            yield "added", new[1]
+            new = next(new_iter, None)
+        else:
+            _, _, old_size, old_mtime, old_inode, _ = old[1]
+            _, kind, size, mtime, inode, _ = new[1]
+            if kind != old[1][1]:
+                yield "added", new[1]
+            elif kind != "d" and (size, mtime, inode) != (old_size, old_mtime, old_inode):
+                yield "modified", new[1]
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+
+def reported_path(root: Dict[str, str], relative: str, directory: bool = False) -> str:
+    """Path of a record as it should appear in the config, in the root's "as" form."""
+    base = root["as"]
+    if _WINDOWS_ROOT.match(base) or "\\" in base:
+        path = base.rstrip("\\") + "\\" + relative.replace("/", "\\")
+        # A trailing backslash tells pick_directories_and_files this is a folder, even with a dot in its name.
+        return path + "\\" if directory else path
+    return base.rstrip("/") + "/" + relative
+
+
+def config_file_path(path: str) -> str:
+    """What to put in the config for a changed file at ``path``.
+
+    pick_directories_and_files only knows paths, and takes a name without an
+    extension under a known root for a folder. The snapshot knows it is a file, so
+    such a file is replaced by its folder (as a file with an extension would be);
+    outside known roots it stays a loose file either way.
+    """
+    head, separator, name = path.rpartition("\\")
+    dot = name.rfind(".")
+    if not separator or 0 < dot < len(name) - 1:
+        return path
+    folder = head + "\\"
+    return folder if trace_xml_to_config.is_within_known_root(PureWindowsPath(folder)) else path
+
+
+def build_snapshot_config(
+    before_path: Path,
+    after_path: Path,
+    app_name: Optional[str] = None,
+    changes: Optional[Path] = None,
+) -> Dict[str, object]:
+    """Diff two snapshots into the config shape build_config produces."""
+    sets: trace_xml_to_config.PathSets = (set(), set(), set(), set())
+    file_paths, _registry_keys, _services, tasks = sets
+    counts = {"added": 0, "modified": 0, "removed": 0}
+    started = time.perf_counter()
+    with Snapshot(before_path) as before, Snapshot(after_path) as after:
+        log = changes.open("w", encoding="utf-8") if changes else None
+        try:
+            for change, record in diff_records(before, after):
+                counts[change] += 1
+                roots = before.roots if change == "removed" else after.roots
+                path = reported_path(roots[record[0]], record[5], directory=record[1] == "d")
+                if log:
+                    log.write(f"{change[0].upper()} {path}\n")
+                if change == "removed":
+                    continue
+                lower = path.replace("/", "\\").lower()
+                task_at = lower.find(procmon_to_config.TASKS_DIR)
+                if task_at != -1:
+                    if record[1] != "d":
+                        tasks.add("\\" + path.replace("/", "\\")[task_at + len(procmon_to_config.TASKS_DIR) :])
+                    continue
+                file_paths.add(path if record[1] == "d" else config_file_path(path))
+        finally:
+            if log:
+                log.close()
+        records = (before.footer.get("records"), after.footer.get("records"))
+    elapsed = time.perf_counter() - started
+    print(
+        f"[snapshot] {records[0]} -> {records[1]} entries compared in {elapsed:.2f}s: "
+        f"{counts['added']} added, {counts['modified']} modified, {counts['removed']} removed"
+    )
+    return trace_xml_to_config.assemble_config(sets, app_name or "PortableApp")
+
+
+def rules_from_args(presets: List[str], excludes: List[str]) -> Optional[Dict[str, Any]]:
+    spec: Dict[str, Any] = {}
+    if presets:
+        spec["presets"] = presets
+    if excludes:
+        spec["exclude"] = excludes
+    if spec:
+        package_rules.PathRules(spec)
+    return spec or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Before/after filesystem snapshots to portable config.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan_parser = sub.add_parser("scan", help="Snapshot the given roots.")
+    scan_parser.add_argument("snapshot", type=Path, help="Snapshot file to write.")
+    scan_parser.add_argument("--root", action="append", required=True, help="Folder to scan, optionally PATH=AS (repeatable).")
+    scan_parser.add_argument("--exclude", action="append", default=[], help="Glob of entries not to record (repeatable).")
+    scan_parser.add_argument(
+        "--preset", action="append", default=[], choices=sorted(package_rules.PRESETS), help="package_rules preset to exclude."
+    )
+    scan_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Scan processes (default: {DEFAULT_WORKERS}).")
+    diff_parser = sub.add_parser("diff", help="Compare a snapshot with a later one (or with the roots as they are now).")
+    diff_parser.add_argument("before", type=Path)
+    diff_parser.add_argument("after", type=Path, nargs="?", help="Later snapshot (default: rescan the roots of BEFORE).")
+    diff_parser.add_argument("--output", "-o", type=Path, required=True, help="Output JSON config path.")
+    diff_parser.add_argument("--app-name", help="App name for the config (default: the output file name).")
+    diff_parser.add_argument("--changes", type=Path, help="Also list every change (A/M/R path) in this text file.")
+    diff_parser.add_argument("--save", type=Path, help="Keep the rescan as this snapshot file.")
+    diff_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Scan processes (default: {DEFAULT_WORKERS}).")
+    show_parser = sub.add_parser("show", help="Print a snapshot's roots and size.")
+    show_parser.add_argument("snapshot", type=Path)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "scan":
+            rules_spec = rules_from_args(args.preset, args.exclude)
+            header = scan(args.snapshot, [parse_root(value) for value in args.root], rules_spec, args.workers)
+            size = args.snapshot.stat().st_size
+            print(f"[scan] {header['records']} entries in {len(header['roots'])} roots -> {args.snapshot} ({size} bytes)")
+        elif args.command == "diff":
+            after = args.after
+            temporary = None
+            if after is None:
+                with Snapshot(args.before) as before:
+                    roots, rules_spec = before.roots, before.header.get("rules") or None
+                if args.save:
+                    after = args.save
+                else:
+                    temporary = tempfile.TemporaryDirectory(prefix="ppkg-snapshot-")
+                    after = Path(temporary.name) / "after.snap"
+                header = scan(after, roots, rules_spec, args.workers)
+                print(f"[scan] {header['records']} entries rescanned")
+            try:
+                config = build_snapshot_config(args.before, after, args.app_name or args.output.stem, args.changes)
+            finally:
+                if temporary:
+                    temporary.cleanup()
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            with args.output.open("w", encoding="utf-8") as handle:
+                json.dump(config, handle, indent=2)
+            print(f"[done] Wrote {args.output}")
+        else:
+            with Snapshot(args.snapshot) as snapshot:
+                kinds: Dict[str, int] = {}
+                total = 0
+                for record in snapshot.records():
+                    kinds[record[1]] = kinds.get(record[1], 0) + 1
+                    total += record[2]
+                print(f"[snapshot] created {snapshot.header['created_at']}, {snapshot.footer.get('seconds')}s to scan")
+                for root in snapshot.roots:
+                    print(f"  root {root['path']}" + (f" (as {root['as']})" if root["as"] != root["path"] else ""))
+                print(f"  {kinds.get('f', 0)} files, {kinds.get('d', 0)} folders, {kinds.get('l', 0)} links, {total} bytes")
+    except (OSError, ValueError) as exc:
+        print(f"[error] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Shared fixtures: the modules live at the repository root, next to this folder."""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import portable_packager  # noqa: E402
+
+REG_HEADER = "Windows Registry Editor Version 5.00\r\n\r\n"
+
+
+class StubRunner:
+    """CommandRunner standing in for reg/sc/schtasks: records every command and fakes its output.
+
+    ``failing`` holds arguments (key, service or task names) whose command exits with 1.
+    """
+
+    def __init__(self, failing: tuple = ()) -> None:
+        self.failing = set(failing)
+        self.commands: List[List[str]] = []
+
+    def __call__(self, cmd: List[str]) -> "subprocess.CompletedProcess[str]":
+        self.commands.append(cmd)
+        if any(arg in self.failing for arg in cmd):
+            return subprocess.CompletedProcess(cmd, 1, "", f"cannot find {cmd[-1]}")
+        if cmd[:2] == ["reg", "export"]:
+            body = f"{REG_HEADER}[{cmd[2]}]\r\n\"Value\"=\"{cmd[2]}\"\r\n\r\n"
+            Path(cmd[3]).write_bytes(body.encode("utf-16"))
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+        if cmd[:2] == ["sc.exe", "qc"]:
+            stdout = (
+                f"SERVICE_NAME: {cmd[2]}\n"
+                "        TYPE               : 10  WIN32_OWN_PROCESS\n"
+                "        START_TYPE         : 2   AUTO_START\n"
+                f"        BINARY_PATH_NAME   : C:\\Program Files\\{cmd[2]}\\service.exe\n"
+            )
+            return subprocess.CompletedProcess(cmd, 0, stdout, "")
+        if cmd[:2] == ["sc.exe", "qdescription"]:
+            return subprocess.CompletedProcess(cmd, 0, f"DESCRIPTION:  {cmd[2]}\n", "")
+        if cmd[0] == "schtasks":
+            return subprocess.CompletedProcess(cmd, 0, f"<Task><!-- {cmd[3]} --></Task>\n", "")
+        raise AssertionError(f"unexpected command {cmd}")
+
+
+@pytest.fixture
+def stub_runner() -> StubRunner:
+    return StubRunner()
+
+
+@pytest.fixture
+def build_package(tmp_path: Path, stub_runner: StubRunner) -> Callable[..., Path]:
+    """Package a small source tree (plus stubbed captures) and return the package folder."""
+
+    def build(**config: Any) -> Path:
+        source = tmp_path / "source"
+        (source / "bin").mkdir(parents=True, exist_ok=True)
+        (source / "app.exe").write_bytes(b"MZ" + bytes(range(256)) * 16)
+        (source / "bin" / "lib.dll").write_bytes(b"library" * 100)
+        (source / "readme.txt").write_text("hello\n", encoding="utf-8")
+        settings: Dict[str, Any] = {
+            "app_name": "Sample",
+            "directories": [{"path": str(source), "target": "Sample", "type": "program"}],
+        }
+        settings.update(config)
+        config_path = tmp_path / "config.json"
+        config_path.write_text(json.dumps(settings), encoding="utf-8")
+        output = tmp_path / "package"
+        portable_packager.main(config_path, output, runner=stub_runner)
+        return output
+
+    return build
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+import package_archive
+
+
+def test_member_path_keeps_names_below_destination(tmp_path):
+    assert package_archive.member_path(tmp_path, "ProgramFiles/App/x.dll") == tmp_path / "ProgramFiles" / "App" / "x.dll"
+    assert package_archive.member_path(tmp_path, "a\\b.txt") == tmp_path / "a" / "b.txt"
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["../escaped.txt", "a/../../escaped.txt", "..\\escaped.txt", "/etc/passwd", "\\Windows\\x", "C:/x", "C:x", "", "a/.."],
+)
+def test_member_path_rejects_escaping_names(tmp_path, name):
+    with pytest.raises(ValueError):
+        package_archive.member_path(tmp_path, name)
+
+
+def test_member_path_rejects_symlink_out_of_destination(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    destination = tmp_path / "dest"
+    destination.mkdir()
+    (destination / "link").symlink_to(outside, target_is_directory=True)
+    with pytest.raises(ValueError):
+        package_archive.member_path(destination, "link/file.txt")
+
+
+def test_extract_all_rejects_crafted_index_before_writing(tmp_path):
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "sub" / "a.txt").write_text("a", encoding="utf-8")
+    archive_path = tmp_path / "pkg.ppkg"
+    package_archive.write_archive(package, archive_path)
+    with package_archive.PackageArchive(archive_path) as archive:
+        archive.members["../escaped.txt"] = archive.members["sub/a.txt"]
+        with pytest.raises(ValueError):
+            archive.extract_all(tmp_path / "out")
+    assert not (tmp_path / "escaped.txt").exists()
+    assert not (tmp_path / "out" / "sub" / "a.txt").exists()
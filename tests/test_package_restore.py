@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import package_restore
+
+
+def _restore(package: Path, root: Path) -> dict:
+    handlers = package_restore.RecordingHandlers(root / package_restore.ACTIONS_LOG)
+    return package_restore.restore_package(package, package_restore.Locations(root=root), handlers, workers=4)
+
+
+def test_restore_into_scratch_root_is_idempotent(tmp_path, build_package):
+    package = build_package(registry_keys=["HKCU\\Software\\Sample"], services=["SampleSvc"])
+    root = tmp_path / "target"
+
+    first = _restore(package, root)
+    restored = root / "Program Files" / "Sample"
+    assert first["written"] == 3 and first["unchanged"] == 0 and not first["failed"]
+    assert (restored / "bin" / "lib.dll").read_bytes() == b"library" * 100
+    assert [step["status"] for step in first["steps"]] == ["ok", "ok"]
+
+    second = _restore(package, root)
+    assert second["written"] == 0 and second["unchanged"] == 3 and not second["failed"]
+    actions = [json.loads(line) for line in (root / package_restore.ACTIONS_LOG).read_text().splitlines()]
+    assert [(action["kind"], action["name"]) for action in actions] == [
+        ("registry", "HKCU\\Software\\Sample"),
+        ("service", "SampleSvc"),
+    ] * 2
+
+
+def test_digest_mismatch_leaves_no_partial(tmp_path, build_package):
+    package = build_package()
+    packaged = package / "ProgramFiles" / "Sample" / "readme.txt"
+    packaged.write_text("HELLO\n", encoding="utf-8")  # same size, different bytes
+    root = tmp_path / "target"
+
+    report = _restore(package, root)
+
+    assert [failure["file"] for failure in report["failed"]] == ["ProgramFiles/Sample/readme.txt"]
+    assert "SHA-256 mismatch" in report["failed"][0]["error"]
+    restored = root / "Program Files" / "Sample"
+    assert not (restored / "readme.txt").exists()
+    assert not list(root.rglob("*.partial"))
+    assert (restored / "app.exe").exists()
+
+
+def test_dry_run_shells_out_nothing_and_logs_both_service_commands(tmp_path, build_package, stub_runner, capsys):
+    package = build_package(registry_keys=["HKCU\\Software\\Sample"], services=["SampleSvc"])
+    stub_runner.commands.clear()
+    capsys.readouterr()
+    root = tmp_path / "target"
+    handlers = package_restore.WindowsHandlers(runner=stub_runner, dry_run=True)
+
+    report = package_restore.restore_package(package, package_restore.Locations(root=root), handlers, dry_run=True)
+
+    assert stub_runner.commands == []
+    assert [step["status"] for step in report["steps"]] == ["ok", "ok"]
+    commands = [line for line in capsys.readouterr().out.splitlines() if line.startswith("[cmd] sc.exe")]
+    settings = "SampleSvc binPath= C:\\Program Files\\SampleSvc\\service.exe type= own start= auto"
+    assert commands == [
+        f"[cmd] sc.exe config {settings}",
+        f"[cmd] sc.exe create {settings}",
+        "[cmd] sc.exe description SampleSvc SampleSvc",
+    ]
+    assert not (root / "Program Files").exists()
+
+
+def test_recording_handlers_dry_run_writes_no_log(tmp_path, build_package):
+    package = build_package(services=["SampleSvc"])
+    root = tmp_path / "target"
+    handlers = package_restore.RecordingHandlers(root / package_restore.ACTIONS_LOG, dry_run=True)
+
+    package_restore.restore_package(package, package_restore.Locations(root=root), handlers, dry_run=True)
+
+    assert [(action["kind"], action["name"]) for action in handlers.actions] == [("service", "SampleSvc")]
+    assert not root.exists()
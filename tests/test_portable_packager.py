@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+import portable_packager
+
+
+def test_capture_scheduler_replays_logs_in_submission_order(tmp_path, stub_runner, capsys):
+    delays = {"HKCU\\Software\\Slow": 0.2, "HKCU\\Software\\Medium": 0.1}
+
+    def runner(cmd):
+        time.sleep(delays.get(cmd[2], 0))
+        return stub_runner(cmd)
+
+    def capture(key, destination, log):
+        log(f"begin {key}")
+        portable_packager.export_registry(key, destination, runner=runner, log=log)
+        log(f"end {key}")
+
+    keys = ["HKCU\\Software\\Slow", "HKCU\\Software\\Medium", "HKCU\\Software\\Fast"]
+    scheduler = portable_packager.CaptureScheduler(workers=3)
+    try:
+        for number, key in enumerate(keys):
+            scheduler.submit(key, capture, key, tmp_path / f"{number}.reg")
+        time.sleep(0.05)
+        scheduler.flush_ready()
+        assert capsys.readouterr().out == ""  # the first job is still running, so nothing may be printed yet
+        scheduler.wait()
+    finally:
+        scheduler.close()
+
+    lines = capsys.readouterr().out.splitlines()
+    expected = []
+    for number, key in enumerate(keys):
+        expected += [f"begin {key}", f"[cmd] reg export {key} {tmp_path / f'{number}.reg.tmp'} /y", f"end {key}"]
+    assert lines == expected
+    # The jobs really overlapped: the fast one finished while the slow one was still running.
+    assert [cmd[2] for cmd in stub_runner.commands] == list(reversed(keys))
+
+
+def test_capture_scheduler_failure_does_not_abort_other_jobs(tmp_path, stub_runner, capsys):
+    stub_runner.failing.add("HKCU\\Software\\Missing")
+    keys = ["HKCU\\Software\\First", "HKCU\\Software\\Missing", "HKCU\\Software\\Last"]
+    scheduler = portable_packager.CaptureScheduler(workers=2)
+    try:
+        for number, key in enumerate(keys):
+            scheduler.submit(key, portable_packager.export_registry, key, tmp_path / f"{number}.reg", runner=stub_runner)
+        with pytest.raises(RuntimeError) as failure:
+            scheduler.wait()
+    finally:
+        scheduler.close()
+
+    assert str(failure.value).startswith("1 capture job(s) failed:\nHKCU\\Software\\Missing: Command failed")
+    assert (tmp_path / "0.reg").exists() and (tmp_path / "2.reg").exists()
+    assert not (tmp_path / "1.reg").exists()
+    assert len(capsys.readouterr().out.splitlines()) == 3
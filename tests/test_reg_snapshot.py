@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import reg_snapshot
+
+SAMPLE = Path(__file__).resolve().parents[1] / "samples" / "registry_sample.reg"
+APP = "HKEY_CURRENT_USER\\Software\\ExampleVendor\\ExampleApp"
+
+
+def _values(key):
+    return {value.name: (value.kind, value.data) for value in key.values}
+
+
+def test_utf16_lines_split_only_on_code_unit_newlines(monkeypatch):
+    # U+0A41 followed by U+0100 encodes as 41 0A 00 01: a "\n\0" pair, but across two code units.
+    lines = ["first", "\u0a41\u0100 stays whole", "", "last"]
+    data = "\ufeff" + "\r\n".join(lines)
+    raw = data.encode("utf-16-le")
+    monkeypatch.setattr(reg_snapshot, "READ_SIZE", 3)  # odd-sized blocks cut code units in half
+    encoding, bom = reg_snapshot.detect_encoding(raw)
+    found = list(reg_snapshot._iter_lines(io.BytesIO(raw), encoding, bom))
+    assert [text for _offset, text in found] == lines
+    offsets = [offset for offset, _text in found]
+    assert [raw[offset:].decode("utf-16-le").split("\r\n")[0] for offset in offsets] == lines
+
+
+def test_hex_continuation_lines_are_joined():
+    lines = [(0, '"Data"=hex:01,02,\\'), (40, "  03,04,\\"), (60, "  05"), (70, "[HKEY_CURRENT_USER\\x\\]")]
+    assert list(reg_snapshot._logical_lines(lines)) == [(0, '"Data"=hex:01,02,03,04,05'), (70, "[HKEY_CURRENT_USER\\x\\]")]
+
+
+def test_sample_parses_continued_hex_values():
+    key = next(reg_snapshot.iter_keys(SAMPLE))
+    values = _values(key)
+    assert key.path == APP
+    assert values["DataPath"] == (reg_snapshot.REG_EXPAND_SZ, "C:\\Users\\alice\\Documents")
+    assert values["Profiles"] == (reg_snapshot.REG_MULTI_SZ, ["Default", "Work"])
+    assert values["LaunchCount"] == (reg_snapshot.REG_DWORD, 42)
+    kind, placement = values["WindowPlacement"]
+    assert kind == reg_snapshot.REG_BINARY and len(placement) == 44
+
+
+def test_diff_patch_merge_round_trip(tmp_path):
+    after = tmp_path / "after.reg"
+    rewrite = reg_snapshot.profile_rewriter([("C:\\Users\\alice", "C:\\Users\\bob")])
+    reg_snapshot.transform_snapshot(SAMPLE, after, exclude=[APP + "\\OpenSaveMRU"], rewrite=rewrite)
+    patch = tmp_path / "patch.reg"
+
+    report = reg_snapshot.diff_report(reg_snapshot.diff_snapshots(SAMPLE, after), patch)
+    assert report["removed_keys"] == [APP + "\\OpenSaveMRU"]
+    assert set(report["changed_keys"]) == {APP, APP + "\\Recent File List"}
+
+    merged = tmp_path / "merged.reg"
+    reg_snapshot.merge_snapshots([SAMPLE, patch], merged)
+    assert list(reg_snapshot.diff_snapshots(merged, after)) == []
+
+
+def test_profile_rewriter_matches_whole_components_only():
+    rewrite = reg_snapshot.profile_rewriter([("C:\\Users\\alice\\", "C:\\Users\\bob")])
+    assert rewrite("C:\\Users\\alice") == "C:\\Users\\bob"
+    assert rewrite("c:\\users\\ALICE\\Documents") == "C:\\Users\\bob\\Documents"
+    assert rewrite("C:/Users/alice/x;C:\\\\Users\\\\alice\\\\y") == "C:/Users/bob/x;C:\\\\Users\\\\bob\\\\y"
+    assert rewrite("C:\\Users\\alice2\\x") == "C:\\Users\\alice2\\x"
+    assert rewrite("C:\\Users\\alicex") == "C:\\Users\\alicex"
+
+
+def test_rewrite_promotes_reg_sz_with_variables():
+    key = next(reg_snapshot.iter_keys(SAMPLE))
+    rewrite = reg_snapshot.profile_rewriter([("C:\\Users\\alice", "%USERPROFILE%")])
+    changed = reg_snapshot.rewrite_key(key, rewrite)
+    values = _values(key)
+    assert changed == 2
+    assert values["InstallDir"] == (reg_snapshot.REG_EXPAND_SZ, "%USERPROFILE%\\AppData\\Local\\ExampleApp")
+    assert values["DataPath"] == (reg_snapshot.REG_EXPAND_SZ, "%USERPROFILE%\\Documents")
+    assert values["Version"] == (reg_snapshot.REG_SZ, "2.4.1")
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import snapshot_to_config
+
+
+def test_root_mapping_round_trip(tmp_path):
+    program_files = tmp_path / "pf"
+    (program_files / "a").mkdir(parents=True)
+    (program_files / "a" / "keep").write_text("v1", encoding="utf-8")
+    (program_files / "Old").mkdir()
+    (program_files / "Old" / "gone.txt").write_text("x", encoding="utf-8")
+    tasks = tmp_path / "tasks"
+    tasks.mkdir()
+    roots = [
+        snapshot_to_config.parse_root(f"{program_files}=C:\\Program Files"),
+        snapshot_to_config.parse_root(f"{tasks}=C:\\Windows\\System32\\Tasks"),
+    ]
+    before = tmp_path / "before.snap"
+    snapshot_to_config.scan(before, roots, workers=2)
+
+    (program_files / "a" / "keep").write_text("version 2", encoding="utf-8")  # modified file, no extension
+    (program_files / "NewApp" / "bin").mkdir(parents=True)
+    (program_files / "NewApp" / "bin" / "app.exe").write_bytes(b"MZ")
+    (program_files / "Old" / "gone.txt").unlink()
+    (tasks / "Vendor").mkdir()
+    (tasks / "Vendor" / "Updater").write_text("<Task/>", encoding="utf-8")
+    after = tmp_path / "after.snap"
+    snapshot_to_config.scan(after, roots, workers=2)
+
+    changes = tmp_path / "changes.txt"
+    config = snapshot_to_config.build_snapshot_config(before, after, "Sample", changes)
+
+    assert config["directories"] == [
+        {"path": "C:\\Program Files\\a", "target": "a", "type": "program"},
+        {"path": "C:\\Program Files\\NewApp", "target": "NewApp", "type": "program"},
+    ]
+    assert config["files"] == []
+    assert config["scheduled_tasks"] == ["\\Vendor\\Updater"]
+    lines = changes.read_text(encoding="utf-8").splitlines()
+    assert "M C:\\Program Files\\a\\keep" in lines
+    assert "R C:\\Program Files\\Old\\gone.txt" in lines
+    assert not any(str(tmp_path) in line for line in lines)
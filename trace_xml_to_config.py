@@ -5,10 +5,17 @@ into a portable_packager configuration JSON.
 
 Usage:
     python trace_xml_to_config.py traced.xml --output config.json
+    python trace_xml_to_config.py install.xml first_run.xml update.xml --output config.json --app-name MyApp
 
 The script attempts to infer which entries should become directories vs.
 single files and labels directories as "program" (under Program Files) or
  "data" (AppData/ProgramData).
+
+Several traces of the same app are parsed in parallel processes (largest
+first, so the run takes about as long as the largest trace), their path,
+registry, service and task sets are merged and reduced in one pass, and the
+config gets a "trace_sources" section naming, for every entry that not all
+traces contain, the traces it came from.
 """
 
 from __future__ import annotations
@@ -16,8 +23,10 @@ from __future__ import annotations
 import argparse
 import json
 import os
-from pathlib import Path
-from typing import Dict, Iterable, List, Set, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PureWindowsPath
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
 import xml.etree.ElementTree as ET
 
 
@@ -28,6 +37,9 @@ DATA_ROOTS = [
     Path(os.environ.get("LOCALAPPDATA", "")) if os.environ.get("LOCALAPPDATA") else None,
 ]
 DATA_ROOTS = [p for p in DATA_ROOTS if p]
+PROGRAM_PREFIXES = tuple(str(root).lower() for root in PROGRAM_ROOTS)
+KNOWN_PREFIXES = tuple(str(root).lower() for root in PROGRAM_ROOTS + DATA_ROOTS)
+DATA_TOKENS = ("\\appdata\\", "\\programdata\\")
 
 
 def normalize_path(value: str) -> str:
@@ -37,29 +49,61 @@ def normalize_path(value: str) -> str:
     return value
 
 
-def collect_paths(root: ET.Element) -> Tuple[Set[str], Set[str], Set[str], Set[str]]:
-    file_paths: Set[str] = set()
-    registry_keys: Set[str] = set()
-    services: Set[str] = set()
-    tasks: Set[str] = set()
+PathSets = Tuple[Set[str], Set[str], Set[str], Set[str]]
+# Config keys of the four PathSets members, in order.
+SET_KEYS = ("files", "registry_keys", "services", "scheduled_tasks")
+
+
+def classify_element(tag: str, attrib: Mapping[str, str], sets: PathSets) -> None:
+    """Sort the path-like attributes of one element into (files, registry keys, services, tasks)."""
+    file_paths, registry_keys, services, tasks = sets
+    for attr in ("Path", "path", "Location", "location", "Target", "target"):
+        value = attrib.get(attr)
+        if not value:
+            continue
+        norm = normalize_path(value)
+        if norm.upper().startswith("HK"):
+            registry_keys.add(norm)
+        elif norm.startswith("\\") and not norm[1:].startswith("\\"):
+            tasks.add(norm)
+        elif ":" in norm or norm.startswith("\\\\"):
+            file_paths.add(norm)
+    name_value = attrib.get("Name") or attrib.get("name")
+    if name_value and tag.lower().startswith("service"):
+        services.add(name_value.strip())
+    if tag.lower().startswith("task") and name_value:
+        tasks.add(name_value.strip())
+
+
+def collect_paths(root: ET.Element) -> PathSets:
+    sets: PathSets = (set(), set(), set(), set())
     for elem in root.iter():
-        for attr in ("Path", "path", "Location", "location", "Target", "target"):
-            value = elem.attrib.get(attr)
-            if not value:
-                continue
-            norm = normalize_path(value)
-            if norm.upper().startswith("HK"):
-                registry_keys.add(norm)
-            elif norm.startswith("\\") and not norm[1:].startswith("\\"):
-                tasks.add(norm)
-            elif ":" in norm or norm.startswith("\\\\"):
-                file_paths.add(norm)
-        name_value = elem.attrib.get("Name") or elem.attrib.get("name")
-        if name_value and elem.tag.lower().startswith("service"):
-            services.add(name_value.strip())
-        if elem.tag.lower().startswith("task") and name_value:
-            tasks.add(name_value.strip())
-    return file_paths, registry_keys, services, tasks
+        classify_element(elem.tag, elem.attrib, sets)
+    return sets
+
+
+def stream_paths(xml_path: Path) -> Tuple[PathSets, int]:
+    """Classify every element of ``xml_path`` with iterparse, in memory independent of the file size.
+
+    Attributes are complete at the "start" event, so each element is classified there
+    and detached from its parent at "end". Siblings are removed as they finish, so an
+    open element never holds more than one child and the partial tree stays as deep as
+    the document, not as large. Returns the path sets and the number of elements seen.
+    """
+    sets: PathSets = (set(), set(), set(), set())
+    open_elements: List[ET.Element] = []
+    count = 0
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            classify_element(elem.tag, elem.attrib, sets)
+            open_elements.append(elem)
+            count += 1
+            continue
+        open_elements.pop()
+        elem.clear()
+        if open_elements:
+            open_elements[-1].remove(elem)
+    return sets, count
 
 
 def is_subpath(child: str, parent: str) -> bool:
@@ -69,66 +113,123 @@ def is_subpath(child: str, parent: str) -> bool:
 
 
 def reduce_paths(paths: Iterable[str]) -> List[str]:
+    """Drop every path that is equal to or below another one, returned shortest first.
+
+    Paths are compared case-insensitively by component, and the shortest spelling of
+    equal paths is kept. Keys sort with the separator mapped to "\\0", which puts every
+    path directly after all of its ancestors, so one sorted sweep that remembers the
+    last kept key finds the covered ones (no trie, no pairwise scans).
+    """
+    spellings: Dict[str, str] = {}
+    for path in paths:
+        key = path.rstrip("\\").lower().replace("\\", "\0")
+        kept = spellings.setdefault(key, path)
+        if kept is not path and (len(path), path) < (len(kept), kept):
+            spellings[key] = path
     result: List[str] = []
-    for path in sorted(set(paths), key=lambda p: len(p)):
-        if not any(is_subpath(path, existing) for existing in result):
-            result.append(path)
+    cover = None
+    for key in sorted(spellings):
+        if cover is not None and key.startswith(cover):
+            continue
+        cover = key + "\0"
+        result.append(spellings[key])
+    # Two stable sorts give (length, text) order without building a tuple per path.
+    result.sort()
+    result.sort(key=len)
     return result
 
 
 def categorize_directory(path: str) -> str:
     lower = path.lower()
-    for root in PROGRAM_ROOTS:
-        if lower.startswith(str(root).lower()):
-            return "program"
-    if "\\appdata\\" in lower or "\\programdata\\" in lower:
-        return "data"
+    if lower.startswith(PROGRAM_PREFIXES):
+        return "program"
     return "data"
 
 
-def is_within_known_root(path: Path) -> bool:
-    lower = str(path).lower()
-    for root in PROGRAM_ROOTS + DATA_ROOTS:
-        if lower.startswith(str(root).lower()):
-            return True
-    for token in ("\\appdata\\", "\\programdata\\"):
+def _is_known(lower: str) -> bool:
+    if lower.startswith(KNOWN_PREFIXES):
+        return True
+    for token in DATA_TOKENS:
         if token in lower:
             return True
     return False
 
 
+def _folder_is_known(lower_with_separator: str) -> Optional[bool]:
+    """Whether every path directly inside a folder is within a known root, or None if it depends on the name.
+
+    DATA_TOKENS end with a separator, so they can only match inside the folder part; a
+    prefix can still be completed by the name when the folder is shorter than it.
+    """
+    if _is_known(lower_with_separator):
+        return True
+    if any(prefix.startswith(lower_with_separator) for prefix in KNOWN_PREFIXES):
+        return None
+    return False
+
+
+def is_within_known_root(path: PureWindowsPath) -> bool:
+    return _is_known(str(path).lower())
+
+
 def pick_directories_and_files(paths: Iterable[str]) -> Tuple[List[Dict[str, str]], List[str]]:
+    """Reduce ``paths`` and split them into directory entries (known roots) and loose files.
+
+    Traced paths are always Windows paths, so they are handled as PureWindowsPath and
+    classify the same way when the converter runs on another OS. Most paths are plain
+    "folder\\name" strings: their folder is parsed once and shared by its siblings;
+    anything else (no separator, "." components, forward slashes) is parsed in full.
+    """
     directory_map: Dict[str, Dict[str, str]] = {}
     files: List[str] = []
+    # raw folder text -> (normalized folder, its name, same ending in a separator, _folder_is_known)
+    folders: Dict[str, Tuple[str, str, str, Optional[bool]]] = {}
 
     for raw_path in reduce_paths(paths):
-        path_obj = Path(raw_path)
-        if is_within_known_root(path_obj):
-            if path_obj.suffix and not raw_path.endswith("\\"):
-                candidate = path_obj.parent
-            else:
-                candidate = path_obj
-            candidate_str = str(candidate)
-            if candidate_str not in directory_map:
-                directory_map[candidate_str] = {
-                    "path": candidate_str,
-                    "target": candidate.name or candidate_str.replace(":", ""),
-                    "type": categorize_directory(candidate_str),
-                }
+        head, separator, name = raw_path.rpartition("\\")
+        if not separator or name in ("", ".", "..") or "/" in raw_path:
+            path_obj = PureWindowsPath(raw_path)
+            if not is_within_known_root(path_obj):
+                files.append(raw_path)
+                continue
+            candidate = path_obj.parent if path_obj.suffix and not raw_path.endswith("\\") else path_obj
+            candidate_str, candidate_name = str(candidate), candidate.name
         else:
-            files.append(raw_path)
+            folder = folders.get(head)
+            if folder is None:
+                # "C:" alone is drive-relative; the folder of "C:\\x" is the drive root.
+                folder_obj = PureWindowsPath(head + "\\" if not head or head.endswith(":") else head)
+                folder_str = str(folder_obj)
+                with_separator = folder_str if folder_str.endswith("\\") else folder_str + "\\"
+                folder = (folder_str, folder_obj.name, with_separator, _folder_is_known(with_separator.lower()))
+                folders[head] = folder
+            full = folder[2] + name
+            known = folder[3]
+            if not (known or known is None and _is_known(full.lower())):
+                files.append(raw_path)
+                continue
+            dot = name.rfind(".")
+            if 0 < dot < len(name) - 1:  # PureWindowsPath.suffix
+                candidate_str, candidate_name = folder[0], folder[1]
+            else:
+                candidate_str, candidate_name = full, name
+        if candidate_str not in directory_map:
+            directory_map[candidate_str] = {
+                "path": candidate_str,
+                "target": candidate_name or candidate_str.replace(":", ""),
+                "type": categorize_directory(candidate_str),
+            }
 
     directories = [directory_map[key] for key in sorted(directory_map.keys(), key=len)]
     return directories, files
 
 
-def build_config(xml_path: Path, app_name: str | None) -> Dict[str, object]:
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    file_paths, registry_keys, services, tasks = collect_paths(root)
+def assemble_config(sets: PathSets, app_name: str) -> Dict[str, object]:
+    """Turn collected (files, registry keys, services, tasks) sets into a portable_packager config."""
+    file_paths, registry_keys, services, tasks = sets
     directories, files = pick_directories_and_files(file_paths)
     config = {
-        "app_name": app_name or xml_path.stem,
+        "app_name": app_name,
         "directories": directories,
         "files": files,
         "registry_keys": sorted(registry_keys),
@@ -139,13 +240,150 @@ def build_config(xml_path: Path, app_name: str | None) -> Dict[str, object]:
     return config
 
 
+def parse_trace(xml_path: Path) -> Tuple[PathSets, int, float]:
+    """Process pool worker: stream one trace. Returns its path sets, element count and parse seconds."""
+    started = time.perf_counter()
+    sets, elements = stream_paths(xml_path)
+    return sets, elements, time.perf_counter() - started
+
+
+def parse_traces(xml_paths: Sequence[Path], workers: Optional[int] = None) -> List[Tuple[PathSets, int, float]]:
+    """Parse several traces on a process pool; results follow the order of ``xml_paths``.
+
+    The largest traces are submitted first, so the longest parse starts at once and the
+    wall time tends to that of the largest trace instead of the sum of all of them.
+    """
+    workers = min(len(xml_paths), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [parse_trace(path) for path in xml_paths]
+    order = sorted(range(len(xml_paths)), key=lambda index: xml_paths[index].stat().st_size, reverse=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {index: pool.submit(parse_trace, xml_paths[index]) for index in order}
+        return [futures[index].result() for index in range(len(xml_paths))]
+
+
+def merge_sets(parsed: Sequence[PathSets]) -> Tuple[PathSets, List[Dict[str, int]]]:
+    """Union the sets of several traces.
+
+    Also returns, per member, value -> bitmask of the traces (bit i = ``parsed[i]``) that
+    contain it. Values every trace contains are left out of the masks, which keeps the
+    per-value work to what actually differs between traces.
+    """
+    merged: List[Set[str]] = []
+    masks: List[Dict[str, int]] = []
+    for member in range(len(SET_KEYS)):
+        per_trace = [sets[member] for sets in parsed]
+        merged.append(set().union(*per_trace))
+        common = set.intersection(*per_trace)
+        member_masks: Dict[str, int] = {}
+        for bit, values in enumerate(per_trace):
+            for value in values - common:
+                member_masks[value] = member_masks.get(value, 0) | 1 << bit
+        masks.append(member_masks)
+    return (merged[0], merged[1], merged[2], merged[3]), masks
+
+
+def trace_sources(
+    config: Dict[str, Any], file_paths: Iterable[str], masks: List[Dict[str, int]], names: List[str]
+) -> Dict[str, Any]:
+    """Name the traces behind each config entry that not every trace contributed to.
+
+    A directory or file entry is credited with every trace that saw a path at or below it
+    (the deepest entry covering the path wins); registry keys, services and tasks map directly.
+    """
+    everything = (1 << len(names)) - 1
+    owners: Dict[str, str] = {path.lower(): path for path in config["files"]}
+    for entry in config["directories"]:
+        owners.setdefault(entry["path"].rstrip("\\").lower(), entry["path"])
+    # Lowercase folder -> entry covering it (None when no entry does), shared by the paths inside it.
+    folder_owners: Dict[str, Optional[str]] = {}
+
+    def owner_of(key: str) -> Optional[str]:
+        while key not in owners:
+            cut = key.rfind("\\")
+            if cut < 0:
+                return None
+            key = key[:cut]
+        return owners[key]
+
+    found: Dict[str, int] = {}
+    file_masks = masks[0]
+    for path in file_paths:
+        key = path.rstrip("\\").lower()
+        owner = owners.get(key)
+        if owner is None:
+            folder = key.rpartition("\\")[0]
+            if folder in folder_owners:
+                owner = folder_owners[folder]
+            else:
+                owner = folder_owners[folder] = owner_of(folder)
+            if owner is None:
+                continue
+        found[owner] = found.get(owner, 0) | file_masks.get(path, everything)
+
+    labels: Dict[int, List[str]] = {}
+
+    def partial(values: Iterable[str], value_masks: Mapping[str, int]) -> Dict[str, List[str]]:
+        result: Dict[str, List[str]] = {}
+        for value in values:
+            mask = value_masks.get(value, everything)
+            if mask != everything:
+                if mask not in labels:
+                    labels[mask] = [name for bit, name in enumerate(names) if mask >> bit & 1]
+                result[value] = labels[mask]
+        return result
+
+    entries = {
+        "directories": partial((entry["path"] for entry in config["directories"]), found),
+        "files": partial(config["files"], found),
+    }
+    for member, config_key in enumerate(SET_KEYS[1:], start=1):
+        entries[config_key] = partial(config[config_key], masks[member])
+    return {"traces": names, "entries": entries}
+
+
+def build_config(
+    xml_path: Path | Sequence[Path], app_name: str | None, workers: Optional[int] = None
+) -> Dict[str, object]:
+    """Convert one trace, or merge several (parsed on up to ``workers`` processes) into one config."""
+    xml_paths = [xml_path] if isinstance(xml_path, Path) else list(xml_path)
+    if not xml_paths:
+        raise ValueError("At least one traced XML is required.")
+    started = time.perf_counter()
+    parsed = parse_traces(xml_paths, workers)
+    for path, (_sets, elements, elapsed) in zip(xml_paths, parsed):
+        rate = elements / elapsed if elapsed > 0 else float(elements)
+        label = f"{path.name}: " if len(xml_paths) > 1 else ""
+        print(f"[parse] {label}{elements} elements in {elapsed:.2f}s ({rate:,.0f} elements/s)")
+    app_name = app_name or xml_paths[0].stem
+    if len(xml_paths) == 1:
+        return assemble_config(parsed[0][0], app_name)
+
+    sets, masks = merge_sets([item[0] for item in parsed])
+    config: Dict[str, Any] = assemble_config(sets, app_name)
+    names = [str(path) for path in xml_paths]
+    config["trace_sources"] = trace_sources(config, sets[0], masks, names)
+    partial = sum(len(values) for values in config["trace_sources"]["entries"].values())
+    print(
+        f"[merge] {len(xml_paths)} traces in {time.perf_counter() - started:.2f}s: "
+        f"{len(sets[0])} paths, {len(sets[1])} registry keys, {len(sets[2])} services, {len(sets[3])} tasks; "
+        f"{partial} entries not in every trace"
+    )
+    return config
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert traced XML to portable config.")
-    parser.add_argument("xml", type=Path, help="XML exported from Uninstall Tool (Traced Data).")
+    parser.add_argument(
+        "xml", type=Path, nargs="+", help="XML exported from Uninstall Tool (Traced Data); several are merged."
+    )
     parser.add_argument("--output", "-o", type=Path, required=True, help="Output JSON config path.")
-    parser.add_argument("--app-name", help="Override app name (defaults to XML filename).")
+    parser.add_argument("--app-name", help="Override app name (defaults to the first XML filename).")
+    parser.add_argument(
+        "--workers", type=int, help="Processes parsing traces at once (default: one per CPU, at most one per trace)."
+    )
     args = parser.parse_args()
-    config = build_config(args.xml, args.app_name)
+    config = build_config(args.xml, args.app_name, workers=args.workers)
     args.output.parent.mkdir(parents=True, exist_ok=True)
     with args.output.open("w", encoding="utf-8") as handle:
         json.dump(config, handle, indent=2)